@@ -1,22 +1,68 @@
+import functools
 import os
 import re
 import time
-from threading import Thread
+from typing import Callable
 
 import click
-import numpy as np
 import pandas as pd
-import tqdm
 
-from src.generator.data import generate_problem
+from src.cli.batch import submit_jobs, collect_jobs
+from src.cli.engine import EvaluationCell, evaluate_cells
+from src.generator.benchmark import benchmark_context
+from src.generator.sampling import format_stats
+from src.generator.shard import plan_cell, run_shards, merge_shards
+from src.generator.sink import clear_cell, write_cell
+from src.models.benchmark import benchmark_ollama
 from src.models.choose import choose_model
+from src.models.instrument import read_calls, summarize_calls
+from src.models.rate_limit import get_provider
+from src.utils.cache import SqliteLRUCache
+from src.utils.metrics import UNANSWERED, aggregate_evaluations
 from src.utils.file import RESULT_FOLDER_PATH, DATA_FOLDER_PATH, get_evaluation_file_path, EVALUATION_FOLDER_PATH, \
-    get_data_file_path
+    get_data_file_path, VERDICT_CACHE_PATH, RESPONSE_CACHE_PATH, SPOOL_FOLDER_PATH, DATA_FORMATS, find_data_file_path, read_data_file, \
+    SUMMARY_FILE_PATH
 from src.strategies.direct import direct_prompt
 from src.strategies.zero_shot_cot import cot_prompt
 from src.strategies.few_shot_cot import few_shot_cot_prompt
 from src.strategies.self_consistency import self_consistency_prompt
-from src.strategies.least_to_most import least_to_most_prompt
+from src.strategies.least_to_most import least_to_most_prompt, least_to_most_breakdown, least_to_most_solve
+
+STRATEGIES = {
+    'direct': direct_prompt,
+    'zero_shot_cot': cot_prompt,
+    'few_shot_cot': few_shot_cot_prompt,
+    'self_consistency': self_consistency_prompt,
+    'least_to_most': least_to_most_prompt
+}
+# the stages of the strategies with several dependent requests, evaluated one stage at a time (see `evaluate_cells`)
+STAGES = {
+    'least_to_most': (least_to_most_breakdown, least_to_most_solve),
+}
+# default number of samples of the self-consistency strategy
+NUM_SAMPLES = 3
+
+
+def _get_strategy(strategy: str, num_samples: int = NUM_SAMPLES, early_stop: bool = False,
+                  staged: bool = False) -> tuple[Callable | tuple[Callable], str]:
+    """
+    :param staged: the stages of the strategy if it has several, see `STAGES`
+    :return: the strategy function (or its stages) and its name in the evaluation files (with the number of
+        samples, if it is not the default, and with early stopping)
+    """
+    if early_stop:
+        if strategy == 'self_consistency':
+            raise click.BadParameter('the self-consistency strategy does not support early stopping',
+                                     param_hint='--early_stop')
+        if staged and strategy in STAGES:
+            *first, last = STAGES[strategy]
+            return (*first, functools.partial(last, early_stop=True)), f'{strategy}_early_stop'
+        return functools.partial(STRATEGIES[strategy], early_stop=True), f'{strategy}_early_stop'
+    if staged and strategy in STAGES:
+        return STAGES[strategy], strategy
+    if strategy == 'self_consistency' and num_samples != NUM_SAMPLES:
+        return functools.partial(self_consistency_prompt, num_samples=num_samples), f'{strategy}_{num_samples}'
+    return STRATEGIES[strategy], strategy
 
 
 @click.group()
@@ -36,44 +82,67 @@ def app():
 @click.option('--number_of_events', '-e', help='Number of events', type=int)
 @click.option('--number_of_operators', '-l', help='Number of operators', type=int)
 @click.option('--random_seed', '-s', help='Random seed', type=int, default=1)
+@click.option('--checker', help='Model checker used to compute answers', type=click.Choice(['nusmv', 'native']),
+              default='nusmv')
+@click.option('--formulas_per_graph', '-k', help='Number of candidate formulas checked per generated graph',
+              type=int, default=1)
+@click.option('--sampling', help='Balancing strategy: reject surplus problems, or keep per-class reservoirs and '
+                                'reuse graphs', type=click.Choice(['rejection', 'balanced']), default='rejection')
+@click.option('--max_reuse', help='Maximum number of formula batches per graph with balanced sampling', type=int,
+              default=8)
+@click.option('--verdict_cache', help='Path of the persistent NuSMV verdict cache, empty to disable', type=str,
+              default=VERDICT_CACHE_PATH)
+@click.option('--deduplicate', help='Drop problems that are renamings of the events of another problem',
+              is_flag=True, default=False)
+@click.option('--shards', help='Number of seed-deterministic shards the problems are split into', type=int,
+              default=1)
+@click.option('--workers', '-w', help='Number of worker processes', type=int, default=1)
+@click.option('--resume', help='Resume an interrupted generation with the same options', is_flag=True, default=False)
+@click.option('--data_format', help='Format of the generated datasets', type=click.Choice(DATA_FORMATS),
+              default='csv')
 def generate(count_of_problem: int, number_of_events: int,
-             number_of_operators: int, random_seed: int):
-    _generate(count_of_problem, number_of_events, number_of_operators, random_seed)
+             number_of_operators: int, random_seed: int, checker: str, formulas_per_graph: int, sampling: str,
+             max_reuse: int, verdict_cache: str, deduplicate: bool, shards: int, workers: int, resume: bool,
+             data_format: str):
+    _configure_verdict_cache(verdict_cache)
+    stats = _generate(count_of_problem, number_of_events, number_of_operators, random_seed, checker,
+                      formulas_per_graph, sampling, max_reuse, shards, workers, deduplicate, resume, data_format)
+    print(f'Verdict cache: {stats["cache_hits"]} hits, {stats["cache_misses"]} misses.')
 
 
-def _generate(count_of_problem: int, number_of_events: int,
-              number_of_operators: int, random_seed: int):
+def _configure_verdict_cache(path: str):
     """
-    Generate LTL problems
+    Configure the verdict cache through the environment, so that worker processes use it too
     """
-    if count_of_problem % 2 != 0:
-        raise ValueError('Count of problems must be even to ensure balanced data.')
+    os.environ['VERDICT_CACHE_PATH'] = path or ''
 
-    rng = np.random.default_rng(random_seed)
-    problems = []
-    problems_true = []
-    problems_false = []
 
+def _generate(count_of_problem: int, number_of_events: int,
+              number_of_operators: int, random_seed: int, checker: str = 'nusmv', formulas_per_graph: int = 1,
+              sampling: str = 'rejection', max_reuse: int = 8, shards: int = 1, workers: int = 1,
+              deduplicate: bool = False, resume: bool = False, data_format: str = 'csv'):
+    """
+    Generate LTL problems
+    """
     # Generate problems while ensuring that there are equal number of true and false problems
-    while (len(problems_false) + len(problems_true)) < count_of_problem:
-        problem = generate_problem(rng=rng, number_of_events=number_of_events, formula_length=number_of_operators)
-        if problem['answer'] and len(problems_true) < count_of_problem // 2:
-            problems_true.append(problem)
-        elif (not problem['answer']) and len(problems_false) < count_of_problem // 2:
-            problems_false.append(problem)
-
-    problems.extend(problems_true)
-    problems.extend(problems_false)
-
-    # Create DataFrame and add ID column
-    df = pd.DataFrame(problems)
-    df['id'] = range(len(df))
-    # Reorder columns to put id first
-    cols = ['id'] + [col for col in df.columns if col != 'id']
-    df = df[cols]
-
-    path = get_data_file_path(event_n=number_of_events, formula_n=number_of_operators, count=count_of_problem)
-    df.to_csv(path, index=False)
+    cell = plan_cell(count_of_problem, number_of_events, number_of_operators, random_seed, shards, checker,
+                     formulas_per_graph, sampling, max_reuse, deduplicate)
+    if not resume:
+        clear_cell(SPOOL_FOLDER_PATH, number_of_events, number_of_operators)
+    _, stats = merge_shards(run_shards(cell, workers, SPOOL_FOLDER_PATH))
+    _save_problems(cell, number_of_events, number_of_operators, count_of_problem, data_format)
+    print(f'Sampling: {format_stats(stats)}.')
+    return stats
+
+
+def _save_problems(cell: list, number_of_events: int, number_of_operators: int, count_of_problem: int,
+                   data_format: str = 'csv'):
+    """
+    Save generated problems of a cell from the spool files of its shards
+    """
+    path = get_data_file_path(event_n=number_of_events, formula_n=number_of_operators, count=count_of_problem,
+                              data_format=data_format)
+    write_cell(SPOOL_FOLDER_PATH, cell, path)
     print(f'Generated {count_of_problem} problems to {path}.')
 
 
@@ -82,23 +151,77 @@ def _generate(count_of_problem: int, number_of_events: int,
 @click.option('--list_of_numbers_of_events', '-e', help='List of numbers of events', type=str)
 @click.option('--list_of_numbers_of_operators', '-l', help='List of numbers of operators', type=str)
 @click.option('--random_seed', '-s', help='Random seed', type=int, default=1)
+@click.option('--checker', help='Model checker used to compute answers', type=click.Choice(['nusmv', 'native']),
+              default='nusmv')
+@click.option('--formulas_per_graph', '-k', help='Number of candidate formulas checked per generated graph',
+              type=int, default=1)
+@click.option('--sampling', help='Balancing strategy: reject surplus problems, or keep per-class reservoirs and '
+                                'reuse graphs', type=click.Choice(['rejection', 'balanced']), default='rejection')
+@click.option('--max_reuse', help='Maximum number of formula batches per graph with balanced sampling', type=int,
+              default=8)
+@click.option('--verdict_cache', help='Path of the persistent NuSMV verdict cache, empty to disable', type=str,
+              default=VERDICT_CACHE_PATH)
+@click.option('--deduplicate', help='Drop problems that are renamings of the events of another problem',
+              is_flag=True, default=False)
+@click.option('--shards', help='Number of seed-deterministic shards each cell is split into', type=int, default=1)
+@click.option('--workers', '-w', help='Number of worker processes', type=int, default=os.cpu_count())
+@click.option('--resume', help='Resume an interrupted generation with the same options', is_flag=True, default=False)
+@click.option('--data_format', help='Format of the generated datasets', type=click.Choice(DATA_FORMATS),
+              default='csv')
 def batch_generate(count_of_problem: int, list_of_numbers_of_events: str,
-                   list_of_numbers_of_operators: str, random_seed: int):
+                   list_of_numbers_of_operators: str, random_seed: int, checker: str, formulas_per_graph: int,
+                   sampling: str, max_reuse: int, verdict_cache: str, deduplicate: bool, shards: int, workers: int,
+                   resume: bool, data_format: str):
+    _configure_verdict_cache(verdict_cache)
     # Parse
     list_of_numbers_of_events = [int(x) for x in list_of_numbers_of_events.split(',')]
     list_of_numbers_of_operators = [int(x) for x in list_of_numbers_of_operators.split(',')]
-    # Generate problems in parallel
-    threads = []
+    # Split every cell into shards, all shards of the grid share one pool of worker processes
+    cells = []
     for number_of_events in list_of_numbers_of_events:
         for formula_length in list_of_numbers_of_operators:
-            thread = Thread(target=_generate, args=(count_of_problem, number_of_events, formula_length, random_seed))
-            threads.append(thread)
-            thread.start()
+            cells.append((number_of_events, formula_length,
+                          plan_cell(count_of_problem, number_of_events, formula_length, random_seed, shards, checker,
+                                    formulas_per_graph, sampling, max_reuse, deduplicate)))
 
     print("Batch generation started (it should take time).")
-    for thread in threads:
-        thread.join()
+    if not resume:
+        for number_of_events, formula_length, _ in cells:
+            clear_cell(SPOOL_FOLDER_PATH, number_of_events, formula_length)
+    results = run_shards([shard for _, _, cell in cells for shard in cell], workers, SPOOL_FOLDER_PATH)
+    cache_hits = cache_misses = 0
+    for number_of_events, formula_length, cell in cells:
+        _, stats = merge_shards(results[:len(cell)])
+        results = results[len(cell):]
+        _save_problems(cell, number_of_events, formula_length, count_of_problem, data_format)
+        print(f'Sampling ({number_of_events} events, {formula_length} operators): {format_stats(stats)}.')
+        cache_hits += stats['cache_hits']
+        cache_misses += stats['cache_misses']
     print("Batch generation completed.")
+    print(f'Verdict cache: {cache_hits} hits, {cache_misses} misses.')
+
+
+@app.command()
+@click.option('--list_of_numbers_of_events', '-e', help='List of numbers of events', type=str,
+              default='1000,2000,5000,10000')
+@click.option('--degree', help='Number of random successors per event', type=int, default=8)
+@click.option('--repeat', help='Number of runs per size, the fastest is reported', type=int, default=3)
+def benchmark(list_of_numbers_of_events: str, degree: int, repeat: int):
+    list_of_numbers_of_events = [int(n) for n in list_of_numbers_of_events.split(',')]
+    rows = benchmark_context(list_of_numbers_of_events, degree, repeat)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+@app.command()
+@click.option('--list_of_concurrency', help='List of numbers of requests in flight', type=str, default='1,2,4,8,16')
+@click.option('--requests', help='Number of requests per run', type=int, default=64)
+@click.option('--latency', help='Seconds the stand-in server takes per request', type=float, default=0.05)
+@click.option('--num_parallel', help='Number of requests the stand-in server processes in parallel', type=int,
+              default=4)
+def benchmark_ollama_backend(list_of_concurrency: str, requests: int, latency: float, num_parallel: int):
+    list_of_concurrency = [int(n) for n in list_of_concurrency.split(',')]
+    rows = benchmark_ollama(list_of_concurrency, requests, latency, num_parallel)
+    print(pd.DataFrame(rows).to_string(index=False))
 
 
 @app.command()
@@ -109,27 +232,47 @@ def batch_generate(count_of_problem: int, list_of_numbers_of_events: str,
 @click.option('--strategy', '-s', help='Prompt strategy to use',
               type=click.Choice(['direct', 'zero_shot_cot', 'few_shot_cot', 'self_consistency', 'least_to_most']),
               default='direct')
+@click.option('--num_samples', help='Number of samples of the self-consistency strategy', type=int,
+              default=NUM_SAMPLES)
+@click.option('--concurrency', help='Number of problems evaluated concurrently', type=int, default=1)
+@click.option('--requests_per_minute', help='Request limit of the provider of the model (default from the environment)',
+              type=float, default=None)
+@click.option('--tokens_per_minute', help='Token limit of the provider of the model (default from the environment)',
+              type=float, default=None)
+@click.option('--model_concurrency', help='Number of problems evaluated concurrently per model, default the '
+                                        'concurrency', type=int, default=None)
+@click.option('--response_cache', help='Path of the persistent cache of model responses, empty to disable', type=str,
+              default=RESPONSE_CACHE_PATH)
+@click.option('--cache_sampled', help='Also cache sampled responses (e.g. of self-consistency)', is_flag=True,
+              default=False)
+@click.option('--early_stop', help='Stream the responses and stop them at the answer (not for self-consistency)',
+              is_flag=True, default=False)
 def evaluate(count_of_problem: int, number_of_events: int,
-             number_of_operators: int, model: str, strategy: str):
-    _evaluate(count_of_problem, number_of_events, number_of_operators, model, strategy)
+             number_of_operators: int, model: str, strategy: str, num_samples: int, concurrency: int,
+             requests_per_minute: float, tokens_per_minute: float, model_concurrency: int, response_cache: str,
+             cache_sampled: bool, early_stop: bool):
+    _configure_rate_limits(model, requests_per_minute, tokens_per_minute)
+    _evaluate([(count_of_problem, number_of_events, number_of_operators)], model, strategy, concurrency,
+              response_cache, cache_sampled, num_samples, model_concurrency, early_stop)
 
 
-def _evaluate(count_of_problem: int, number_of_events: int,
-              number_of_operators: int, model: str, strategy: str = 'direct'):
+def _configure_rate_limits(model: str, requests_per_minute: float = None, tokens_per_minute: float = None):
     """
-    Evaluate models
+    Configure the rate limits of the provider of a model through the environment (see `get_bucket`)
     """
-    # Choose the strategy function
-    strategy_map = {
-        'direct': direct_prompt,
-        'zero_shot_cot': cot_prompt,
-        'few_shot_cot': few_shot_cot_prompt,
-        'self_consistency': self_consistency_prompt,
-        'least_to_most': least_to_most_prompt
-    }
+    if requests_per_minute is None and tokens_per_minute is None:
+        return
+    provider = get_provider(choose_model(model))
+    for unit, limit in (('REQUESTS', requests_per_minute), ('TOKENS', tokens_per_minute)):
+        if limit is not None:
+            os.environ[f'{provider}_{unit}_PER_MINUTE'] = str(limit)
 
-    strategy_func = strategy_map[strategy]
 
+def _load_evaluation(count_of_problem: int, number_of_events: int, number_of_operators: int, model: str,
+                     strategy: str) -> EvaluationCell:
+    """
+    Load the evaluation of a dataset, resuming from existing results if available
+    """
     eval_path = get_evaluation_file_path(event_n=number_of_events, formula_n=number_of_operators,
                                          count=count_of_problem, model=model, strategy=strategy)
 
@@ -137,47 +280,65 @@ def _evaluate(count_of_problem: int, number_of_events: int,
     if os.path.exists(eval_path):
         print(f'Resuming from existing results at {eval_path}')
         data = pd.read_csv(eval_path)
-        # Count already completed problems
-        completed = data['prediction'].notna().sum() if 'prediction' in data.columns else 0
+    else:
+        data_path = find_data_file_path(event_n=number_of_events, formula_n=number_of_operators,
+                                        count=count_of_problem)
+        data = read_data_file(data_path)
+    # Initialize result columns if they don't exist
+    if 'prediction' not in data.columns:
+        data['prediction'] = pd.NA
+    if 'prediction_raw' not in data.columns:
+        data['prediction_raw'] = pd.NA
+    # (predictions of an interrupted run are replayed from its journal)
+    evaluation = EvaluationCell(data, eval_path)
+    # Count already completed problems
+    completed = evaluation.data['prediction'].notna().sum()
+    if completed:
         print(f'Already completed: {completed}/{len(data)} problems')
     else:
         print(f'Starting fresh evaluation')
-        data_path = get_data_file_path(event_n=number_of_events, formula_n=number_of_operators, count=count_of_problem)
-        data = pd.read_csv(data_path)
-        # Initialize result columns if they don't exist
-        if 'prediction' not in data.columns:
-            data['prediction'] = pd.NA
-        if 'prediction_raw' not in data.columns:
-            data['prediction_raw'] = pd.NA
-
-    for index, row in tqdm.tqdm(data.iterrows(), total=len(data)):
-        # Skip already evaluated problems
-        if pd.notna(row.get('prediction')):
-            continue
-
-        question = row['question']
-
-        # Initialize fresh LLM for each problem
-        llm = choose_model(model)
-
-        # Use the selected strategy
-        response, answer = strategy_func(question, llm)
-
-        # Convert answer to numeric format
-        if answer is None:
-            result = -1
-        else:
-            answer = answer.lower()
-            result = 1 if answer == 'true' else 0
+    if evaluation.intermediate:
+        print(f'Resuming {len(evaluation.intermediate)} problems from their last finished stage')
+    return evaluation
 
-        data.at[index, 'prediction'] = result
-        data.at[index, 'prediction_raw'] = str(response)
 
-        # Save progress incrementally after each problem
-        data.to_csv(eval_path, index=False)
-
-    print(f'Evaluation result of {model} with {strategy} strategy saved to {eval_path}.')
+def _evaluate(cells: list[tuple[int, int, int]], model: str, strategy: str = 'direct', concurrency: int = 1,
+              response_cache: str = None, cache_sampled: bool = False, num_samples: int = NUM_SAMPLES,
+              model_concurrency: int = None, early_stop: bool = False):
+    """
+    Evaluate models
 
+    :param cells: (count of problems, number of events, number of operators) of the datasets to evaluate
+    :param response_cache: path of the persistent cache of model responses, None or empty to disable
+    :param cache_sampled: also cache sampled responses
+    :param num_samples: number of samples of the self-consistency strategy
+    :param model_concurrency: number of problems evaluated concurrently per model, `concurrency` by default
+    :param early_stop: stream the responses and stop them at the answer
+    """
+    # Choose the strategy function
+    strategy_func, strategy = _get_strategy(strategy, num_samples, early_stop, staged=True)
+
+    evaluations = [_load_evaluation(*cell, model, strategy) for cell in cells]
+    cache = None
+    if response_cache:
+        cache = SqliteLRUCache(response_cache, max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '100000')),
+                               table='responses')
+    try:
+        interrupted = evaluate_cells(evaluations, strategy_func, lambda: choose_model(model), concurrency, cache,
+                                     cache_sampled, model_concurrency, strategy)
+    finally:
+        if cache is not None:
+            counters = cache.counters()
+            requests = counters['cache_hits'] + counters['cache_misses']
+            print(f'Response cache: {counters["cache_hits"]} hits, {counters["cache_misses"]} misses '
+                  f'({counters["cache_hits"] / requests if requests else 0:.0%} hit rate).')
+            cache.close()
+    for evaluation in evaluations:
+        if interrupted:
+            print(f'Evaluation of {model} with {strategy} strategy interrupted, progress saved to '
+                  f'{evaluation.eval_path}.')
+        else:
+            print(f'Evaluation result of {model} with {strategy} strategy saved to {evaluation.eval_path}.')
 
 
 @app.command()
@@ -188,21 +349,123 @@ def _evaluate(count_of_problem: int, number_of_events: int,
 @click.option('--strategy', '-s', help='Prompt strategy to use',
               type=click.Choice(['direct', 'zero_shot_cot', 'few_shot_cot', 'self_consistency', 'least_to_most']),
               default='direct')
+@click.option('--num_samples', help='Number of samples of the self-consistency strategy', type=int,
+              default=NUM_SAMPLES)
+@click.option('--concurrency', help='Number of problems evaluated concurrently, default one per dataset', type=int,
+              default=None)
+@click.option('--requests_per_minute', help='Request limit of the provider of the model (default from the environment)',
+              type=float, default=None)
+@click.option('--tokens_per_minute', help='Token limit of the provider of the model (default from the environment)',
+              type=float, default=None)
+@click.option('--model_concurrency', help='Number of problems evaluated concurrently per model, default the '
+                                        'concurrency', type=int, default=None)
+@click.option('--response_cache', help='Path of the persistent cache of model responses, empty to disable', type=str,
+              default=RESPONSE_CACHE_PATH)
+@click.option('--cache_sampled', help='Also cache sampled responses (e.g. of self-consistency)', is_flag=True,
+              default=False)
+@click.option('--early_stop', help='Stream the responses and stop them at the answer (not for self-consistency)',
+              is_flag=True, default=False)
 def batch_evaluate(count_of_problem: int, list_of_numbers_of_events: str,
-                   list_of_numbers_of_operators: str, model: str, strategy: str):
+                   list_of_numbers_of_operators: str, model: str, strategy: str, num_samples: int, concurrency: int,
+                   requests_per_minute: float, tokens_per_minute: float, model_concurrency: int, response_cache: str,
+                   cache_sampled: bool, early_stop: bool):
     # Parse
     list_of_numbers_of_events = [int(x) for x in list_of_numbers_of_events.split(',')]
     list_of_numbers_of_operators = [int(x) for x in list_of_numbers_of_operators.split(',')]
+    _configure_rate_limits(model, requests_per_minute, tokens_per_minute)
 
-    # Evaluate problems in parallel
-    threads = []
-    for number_of_events in list_of_numbers_of_events:
-        for formula_length in list_of_numbers_of_operators:
-            thread = Thread(target=_evaluate, args=(count_of_problem, number_of_events, formula_length, model, strategy))
-            threads.append(thread)
-            thread.start()
-
+    # Evaluate problems concurrently
+    cells = [(count_of_problem, number_of_events, formula_length)
+             for number_of_events in list_of_numbers_of_events for formula_length in list_of_numbers_of_operators]
     print("Batch evaluation started (it should take time).")
-    for thread in threads:
-        thread.join()
+    _evaluate(cells, model, strategy, concurrency or len(cells), response_cache, cache_sampled, num_samples,
+              model_concurrency, early_stop)
     print("Batch evaluation completed.")
+
+
+def _parse_grid(count_of_problem: int, list_of_numbers_of_events: str,
+                list_of_numbers_of_operators: str) -> list[tuple[int, int, int]]:
+    return [(count_of_problem, int(number_of_events), int(formula_length))
+            for number_of_events in list_of_numbers_of_events.split(',')
+            for formula_length in list_of_numbers_of_operators.split(',')]
+
+
+@app.command()
+@click.option('--count_of_problem', '-c', help='Count of problems to generate', type=int)
+@click.option('--list_of_numbers_of_events', '-e', help='List of numbers of events', type=str)
+@click.option('--list_of_numbers_of_operators', '-l', help='List of numbers of operators', type=str)
+@click.option('--model', '-m', help='Model name', default='gpt-4o-mini')
+@click.option('--strategy', '-s', help='Prompt strategy to use',
+              type=click.Choice(list(STRATEGIES)), default='direct')
+@click.option('--num_samples', help='Number of samples of the self-consistency strategy', type=int,
+              default=NUM_SAMPLES)
+def submit_batch(count_of_problem: int, list_of_numbers_of_events: str, list_of_numbers_of_operators: str,
+                 model: str, strategy: str, num_samples: int):
+    """
+    Submit the pending problems of datasets to the batch API of the provider of the model
+    """
+    strategy_func, strategy = _get_strategy(strategy, num_samples)
+    for cell in _parse_grid(count_of_problem, list_of_numbers_of_events, list_of_numbers_of_operators):
+        evaluation = _load_evaluation(*cell, model, strategy)
+        submitted = submit_jobs(evaluation, strategy_func, lambda: choose_model(model))
+        print(f'Submitted {submitted} requests for {evaluation.eval_path}.')
+
+
+@app.command()
+@click.option('--count_of_problem', '-c', help='Count of problems to generate', type=int)
+@click.option('--list_of_numbers_of_events', '-e', help='List of numbers of events', type=str)
+@click.option('--list_of_numbers_of_operators', '-l', help='List of numbers of operators', type=str)
+@click.option('--model', '-m', help='Model name', default='gpt-4o-mini')
+@click.option('--strategy', '-s', help='Prompt strategy to use',
+              type=click.Choice(list(STRATEGIES)), default='direct')
+@click.option('--num_samples', help='Number of samples of the self-consistency strategy', type=int,
+              default=NUM_SAMPLES)
+def collect_batch(count_of_problem: int, list_of_numbers_of_events: str, list_of_numbers_of_operators: str,
+                  model: str, strategy: str, num_samples: int):
+    """
+    Collect the finished batch jobs of datasets into their evaluation files
+    """
+    strategy_func, strategy = _get_strategy(strategy, num_samples)
+    for cell in _parse_grid(count_of_problem, list_of_numbers_of_events, list_of_numbers_of_operators):
+        evaluation = _load_evaluation(*cell, model, strategy)
+        counters = collect_jobs(evaluation, strategy_func, lambda: choose_model(model))
+        print(f'{evaluation.eval_path}: {counters["collected"]} responses collected ({counters["failed"]} failed), '
+              f'{counters["running"]} jobs running, {counters["pending"]} problems pending'
+              + (f', submit again for {counters["requests"]} requests.' if counters['requests'] and
+                 not counters['running'] else '.'))
+
+
+@app.command()
+@click.option('--path', '-p', help='Call records, or folders searched for them', type=str, multiple=True,
+              default=[EVALUATION_FOLDER_PATH])
+def stats(path: tuple[str]):
+    """
+    Summarize the recorded model calls per model and strategy
+    """
+    calls = read_calls(path)
+    if calls.empty:
+        print('No call records found.')
+        return
+    print(summarize_calls(calls).to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+
+
+@app.command()
+@click.option('--path', '-p', help='Evaluation files, or folders searched for them', type=str, multiple=True,
+              default=[EVALUATION_FOLDER_PATH])
+@click.option('--output', '-o', help='Path of the summary table', type=str, default=SUMMARY_FILE_PATH)
+@click.option('--unanswered', '-u', help='How unanswered problems count: as False predictions, as wrong ones or '
+                                         'not at all', type=click.Choice(UNANSWERED), default='false')
+@click.option('--bootstrap', '-b', help='Bootstrap resamples of the confidence intervals of the metrics, 0 for none',
+              type=int, default=1000)
+@click.option('--confidence', help='Confidence level of the intervals', type=float, default=0.95)
+def aggregate(path: tuple[str], output: str, unanswered: str, bootstrap: int, confidence: float):
+    """
+    Calculate the metrics of all evaluations (datasets, models and strategies) into one summary table
+    """
+    summary = aggregate_evaluations(path, STRATEGIES, unanswered, bootstrap, confidence)
+    if summary.empty:
+        print('No evaluation files found.')
+        return
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    summary.to_csv(output, index=False)
+    print(f'Metrics of {len(summary)} evaluations saved to {output}.')
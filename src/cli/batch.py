@@ -0,0 +1,210 @@
+import json
+import os
+from collections import Counter
+from typing import Callable, Dict
+
+from openai import OpenAI
+
+from src.cli.engine import EvaluationCell
+from src.models.base_model import BaseModel
+from src.models.rate_limit import get_provider
+from src.models.response_cache import response_key
+
+# statuses of a batch job after which it produces no more results
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchModel(BaseModel):
+    """
+    A model answering from the responses collected from batch jobs.
+    A prompt without a collected response is recorded as a request and answered with a placeholder; the
+    prompts containing a placeholder depend on a pending response and are not recorded.
+    """
+
+    def __init__(self, llm: BaseModel, responses: Dict[str, str]):
+        super().__init__()
+        self.llm = llm
+        self.responses = responses
+        self.provider = get_provider(llm)
+        self.requests: Dict[str, dict] = {}
+        self.placeholders = []
+        self._samples = Counter()
+
+    @property
+    def config(self) -> Dict[str, any]:
+        return self.llm.config
+
+    @property
+    def pending(self) -> bool:
+        return len(self.placeholders) > 0
+
+    def chat(self, message: str) -> str:
+        sample = 0
+        if self.config.get('temperature', 0):
+            # (every sample of a prompt is a request of its own)
+            self._samples[message] += 1
+            sample = self._samples[message]
+        key = response_key(self.provider, self.config, message, sample)
+        if key in self.responses:
+            return self.responses[key]
+        if not any(placeholder in message for placeholder in self.placeholders):
+            self.requests[key] = {'custom_id': key, 'method': 'POST', 'url': self.llm.batch_endpoint,
+                                  'body': self.llm.build_request(message)}
+        placeholder = f'<pending response {key}>'
+        self.placeholders.append(placeholder)
+        return placeholder
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        return [self.chat(message) for _ in range(n)]
+
+    def reconfig(self, config: Dict[str, any]):
+        self.llm.reconfig(config)
+
+    def get_model_name(self) -> str:
+        return self.llm.get_model_name()
+
+
+def get_batch_folder(eval_path: str) -> str:
+    """
+    :return: folder of the batch jobs of an evaluation, next to its evaluation file
+    """
+    return os.path.splitext(eval_path)[0] + '.batch'
+
+
+class BatchState:
+    """
+    The batch jobs of an evaluation and the responses collected from them, stored in its batch folder
+    """
+
+    def __init__(self, eval_path: str):
+        self.folder = get_batch_folder(eval_path)
+        self.state_path = os.path.join(self.folder, 'state.json')
+        self.responses_path = os.path.join(self.folder, 'responses.jsonl')
+        self.jobs = []
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.jobs = json.load(f)['jobs']
+        self.responses: Dict[str, str] = {}
+        if os.path.exists(self.responses_path):
+            with open(self.responses_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.responses[entry['custom_id']] = entry['response']
+
+    def running(self) -> list[dict]:
+        return [job for job in self.jobs if not job['collected']]
+
+    def save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        temporary_path = self.state_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({'jobs': self.jobs}, f, indent=2)
+        os.replace(temporary_path, self.state_path)
+
+    def add_responses(self, responses: Dict[str, str]):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.responses_path, 'a') as f:
+            for custom_id, response in responses.items():
+                f.write(json.dumps({'custom_id': custom_id, 'response': response}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.responses.update(responses)
+
+
+def _replay(cell: EvaluationCell, strategy_func: Callable, choose_model: Callable[[], BaseModel],
+            responses: Dict[str, str]) -> Dict[str, dict]:
+    # run the strategies on the collected responses: record the problems they answer, return the requests
+    # of the others
+    requests = {}
+    for index in cell.pending():
+        llm = BatchModel(choose_model(), responses)
+        response, answer = strategy_func(cell.data.at[index, 'question'], llm)
+        if llm.pending:
+            requests.update(llm.requests)
+        else:
+            cell.record(index, response, answer)
+    cell.compact()
+    return requests
+
+
+def _get_model(choose_model: Callable[[], BaseModel]) -> BaseModel:
+    llm = choose_model()
+    if not isinstance(getattr(llm, 'client', None), OpenAI) or not hasattr(llm, 'batch_endpoint'):
+        raise ValueError(f'{llm.get_model_name()} has no OpenAI-compatible batch API')
+    return llm
+
+
+def submit_jobs(cell: EvaluationCell, strategy_func: Callable, choose_model: Callable[[], BaseModel]) -> int:
+    """
+    Submit the requests of the pending problems of a dataset as a batch job.
+    Problems whose strategy needs several rounds of requests (e.g. least to most) are answered by submitting
+    again after collecting the previous job.
+
+    :param cell: dataset to evaluate
+    :param strategy_func: prompt strategy, from a question and a model to the response and the answer
+    :param choose_model: function creating the model, with an OpenAI-compatible client
+    :return: number of submitted requests
+    """
+    state = BatchState(cell.eval_path)
+    if state.running():
+        raise RuntimeError(f'Batch jobs of {cell.eval_path} are still running, collect them first')
+    llm = _get_model(choose_model)
+    requests = _replay(cell, strategy_func, choose_model, state.responses)
+    if not requests:
+        return 0
+    client = llm.client
+    os.makedirs(state.folder, exist_ok=True)
+    input_path = os.path.join(state.folder, f'requests-{len(state.jobs) + 1}.jsonl')
+    with open(input_path, 'w') as f:
+        for request in requests.values():
+            f.write(json.dumps(request) + '\n')
+    with open(input_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=llm.batch_endpoint,
+                                  completion_window='24h')
+    state.jobs.append({'id': batch.id, 'input_file_id': input_file.id, 'requests': len(requests),
+                       'status': batch.status, 'collected': False})
+    state.save()
+    return len(requests)
+
+
+def collect_jobs(cell: EvaluationCell, strategy_func: Callable, choose_model: Callable[[], BaseModel]) -> dict:
+    """
+    Collect the responses of the finished batch jobs of a dataset and record the problems they answer in its
+    evaluation file. Failed requests are submitted again by the next `submit_jobs`.
+
+    :param cell: dataset to evaluate
+    :param strategy_func: prompt strategy, the same as for `submit_jobs`
+    :param choose_model: function creating the model, with an OpenAI-compatible client
+    :return: numbers of 'running' jobs, 'collected' responses, 'failed' requests, 'pending' problems and
+        'requests' for the next `submit_jobs`
+    """
+    state = BatchState(cell.eval_path)
+    counters = {'running': 0, 'collected': 0, 'failed': 0}
+    running = state.running()
+    client = _get_model(choose_model).client if running else None
+    for job in running:
+        batch = client.batches.retrieve(job['id'])
+        job['status'] = batch.status
+        if batch.status not in FINAL_STATUSES:
+            counters['running'] += 1
+            continue
+        responses = {}
+        if batch.output_file_id:
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get('response') or {}
+                if item.get('error') or response.get('status_code') != 200:
+                    continue
+                responses[item['custom_id']] = response['body']['choices'][0]['message']['content'] or ''
+        state.add_responses(responses)
+        counters['collected'] += len(responses)
+        counters['failed'] += job['requests'] - len(responses)
+        job['collected'] = True
+        state.save()
+    requests = _replay(cell, strategy_func, choose_model, state.responses)
+    counters['pending'] = len(cell.pending())
+    counters['requests'] = len(requests)
+    return counters
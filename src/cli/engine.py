@@ -0,0 +1,332 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import pandas as pd
+import tqdm
+
+from src.models.base_model import BaseModel
+from src.models.clients import close_async_clients
+from src.models.instrument import CallLog, InstrumentedModel, get_calls_path
+from src.models.rate_limit import RateLimitedModel, is_overload
+from src.models.response_cache import CachedModel
+from src.utils.cache import SqliteLRUCache
+
+
+# seconds between two syncs of a journal to the disk
+SYNC_INTERVAL = 1.0
+# seconds before the first retry of a problem whose provider is overloaded, doubled for every further retry
+RETRY_DELAY = 1.0
+# retries of a problem whose provider stays overloaded
+MAX_RETRIES = 8
+
+
+class EvaluationCell:
+    """
+    The evaluation of one dataset: its problems with the prediction columns and where progress is saved.
+    Every prediction is appended to a journal next to the evaluation file, which is replayed when the
+    evaluation is resumed and compacted into the evaluation file by `compact`. So are the intermediate results of
+    the strategies with several stages, kept in the journal until their problem is finished.
+    """
+
+    def __init__(self, data: pd.DataFrame, eval_path: str):
+        self.data = data
+        self.eval_path = eval_path
+        self.journal_path = os.path.splitext(eval_path)[0] + '.journal.jsonl'
+        # row -> (number of finished stages, result of the last one)
+        self.intermediate: dict[any, tuple[int, str]] = {}
+        self._journal = None
+        self._synced = 0.0
+        self._replay()
+
+    def _key(self, index):
+        return int(self.data.at[index, 'id']) if 'id' in self.data.columns else int(index)
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        indices = {self._key(index): index for index in self.data.index}
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a crashed run may be incomplete
+                    continue
+                index = indices[entry['id']]
+                if 'stage' in entry:
+                    self.intermediate[index] = (entry['stage'], entry['result'])
+                    continue
+                self.data.at[index, 'prediction'] = entry['prediction']
+                self.data.at[index, 'prediction_raw'] = entry['prediction_raw']
+
+    def pending(self) -> list:
+        return [index for index in self.data.index if pd.isna(self.data.at[index, 'prediction'])]
+
+    def record(self, index, response: str, answer: str):
+        # Convert answer to numeric format
+        if answer is None:
+            result = -1
+        else:
+            answer = answer.lower()
+            result = 1 if answer == 'true' else 0
+
+        self.data.at[index, 'prediction'] = result
+        self.data.at[index, 'prediction_raw'] = str(response)
+        self.intermediate.pop(index, None)
+
+        # Save progress incrementally after each problem
+        self._write({'id': self._key(index), 'prediction': result, 'prediction_raw': str(response)})
+
+    def record_stage(self, index, stage: int, result: str):
+        """
+        Record the result of a stage of a problem, the input of its next stage
+
+        :param index: row of the problem
+        :param stage: number of finished stages
+        :param result: result of the last finished stage
+        """
+        self.intermediate[index] = (stage, result)
+        self._write({'id': self._key(index), 'stage': stage, 'result': result})
+
+    def _write(self, entry: dict):
+        # append to the journal, syncing to the disk at most every SYNC_INTERVAL
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a')
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        if time.monotonic() - self._synced >= SYNC_INTERVAL:
+            os.fsync(self._journal.fileno())
+            self._synced = time.monotonic()
+
+    def compact(self):
+        """
+        Save the evaluation file with all predictions and remove the journal, except the intermediate results of
+        the unfinished problems
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not os.path.exists(self.journal_path):
+            return
+        # (the journal is only removed once the evaluation file is replaced)
+        temporary_path = self.eval_path + '.tmp'
+        self.data.to_csv(temporary_path, index=False)
+        with open(temporary_path) as f:
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.eval_path)
+        unfinished = {index: intermediate for index, intermediate in self.intermediate.items()
+                      if pd.isna(self.data.at[index, 'prediction'])}
+        if unfinished:
+            temporary_path = self.journal_path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                for index, (stage, result) in unfinished.items():
+                    f.write(json.dumps({'id': self._key(index), 'stage': stage, 'result': result}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, self.journal_path)
+        elif os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+
+class AdaptiveLimit:
+    """
+    A limit on the concurrent requests to a model that halves when its provider is overloaded and grows back by one
+    after as many successes as the current limit (additive increase, multiplicative decrease)
+    """
+
+    def __init__(self, maximum: int):
+        self.maximum = maximum
+        self.limit = maximum
+        self.active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *args):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self.limit += 1
+            self._successes = 0
+
+    def overload(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+
+async def _evaluate_cells(cells: list[EvaluationCell], stages: list[Callable], choose_model: Callable[[], BaseModel],
+                          concurrency: int, cache: SqliteLRUCache | None, cache_sampled: bool,
+                          model_concurrency: int | None, strategy: str) -> bool:
+    stop = asyncio.Event()
+    # (set whenever a stage in flight finishes, so that idle workers look at the queue again)
+    changed = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    # strategies block a thread for as long as their requests are in flight, so every stage in flight has its own,
+    # and the models running blocking calls on the loop (e.g. `BaseModel.achat`) as many in the default executor
+    stage_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='stage')
+    default_executor = ThreadPoolExecutor(max_workers=concurrency)
+    loop.set_default_executor(default_executor)
+    try:
+        # the first Ctrl-C stops starting new problems, the second one interrupts
+        loop.add_signal_handler(signal.SIGINT,
+                                lambda: (stop.set(), changed.set(), loop.remove_signal_handler(signal.SIGINT)))
+    except (NotImplementedError, RuntimeError, ValueError):
+        pass
+    # one queue for the stages of the problems of all datasets, interleaved so that every dataset progresses at the
+    # same pace, and the next stage of a problem goes before the problems after it:
+    # (rank of the problem in its dataset, dataset, row, retries)
+    queue = [(rank, c, index, 0) for c, cell in enumerate(cells) for rank, index in enumerate(cell.pending())]
+    heapq.heapify(queue)
+    limits: dict[str, AdaptiveLimit] = {}
+    logs = [CallLog(get_calls_path(cell.eval_path)) for cell in cells]
+    remaining = [len(cell.pending()) for cell in cells]
+    counters = {'retries': 0, 'in_flight': 0}
+    errors = []
+    progress = tqdm.tqdm(total=len(queue))
+
+    def update_progress():
+        progress.set_postfix(datasets=f'{sum(n == 0 for n in remaining)}/{len(cells)}', retries=counters['retries'],
+                             limit=','.join(str(limit.limit) for limit in limits.values()))
+
+    def settle(follow_up: tuple | None = None):
+        # a stage in flight is finished, and queues its next stage or retry if any
+        if follow_up is not None:
+            heapq.heappush(queue, follow_up)
+        counters['in_flight'] -= 1
+        changed.set()
+
+    async def worker():
+        while not stop.is_set():
+            if not queue:
+                if not counters['in_flight']:
+                    return
+                # (the stages in flight may still queue their next stages or retries)
+                changed.clear()
+                await changed.wait()
+                continue
+            rank, c, index, retries = heapq.heappop(queue)
+            counters['in_flight'] += 1
+            cell = cells[c]
+            question = cell.data.at[index, 'question']
+            # (resumed from the result of its last finished stage)
+            stage, result = cell.intermediate.get(index, (0, None))
+            # Initialize fresh LLM for each problem (models share their clients)
+            model = choose_model()
+            name = model.get_model_name()
+            if name not in limits:
+                limits[name] = AdaptiveLimit(model_concurrency or concurrency)
+            # (calls are recorded once they are allowed by the rate limits)
+            llm = InstrumentedModel(model, logs[c], strategy=strategy, problem_id=cell._key(index), stage=stage)
+            llm = RateLimitedModel(llm, loop=loop)
+            if cache is not None:
+                # (cached responses do not count against the rate limits)
+                llm = CachedModel(llm, cache, cache_sampled)
+            overloaded = False
+            async with limits[name]:
+                try:
+                    # (strategies are blocking, they run in their threads and send their requests on this loop)
+                    arguments = (question, llm) if stage == 0 else (question, llm, result)
+                    context = contextvars.copy_context()
+                    result = await loop.run_in_executor(
+                        stage_executor, functools.partial(context.run, stages[stage], *arguments))
+                    limits[name].success()
+                except Exception as e:
+                    if not is_overload(e) or retries >= MAX_RETRIES:
+                        # a failure lets the requests in flight finish before it is raised
+                        stop.set()
+                        errors.append(e)
+                        settle()
+                        return
+                    # back off: fewer requests to this model, and the problem is retried later
+                    limits[name].overload()
+                    overloaded = True
+            if overloaded:
+                counters['retries'] += 1
+                update_progress()
+                await asyncio.sleep(RETRY_DELAY * 2 ** retries)
+                settle((rank, c, index, retries + 1))
+                continue
+            if stage + 1 < len(stages):
+                # (checkpointed, only the next stages run again if the evaluation is resumed)
+                cell.record_stage(index, stage + 1, result)
+                settle((rank, c, index, 0))
+                continue
+            response, answer = result
+            cell.record(index, response, answer)
+            settle()
+            remaining[c] -= 1
+            progress.update()
+            update_progress()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if errors:
+            raise errors[0]
+    finally:
+        progress.close()
+        # (the stages in flight have finished, except after an interrupt, whose threads are not waited for)
+        stage_executor.shutdown(wait=False)
+        await close_async_clients()
+        for cell in cells:
+            cell.compact()
+        for log in logs:
+            log.close()
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+    return stop.is_set()
+
+
+def evaluate_cells(cells: list[EvaluationCell], strategy_func: Callable | list[Callable],
+                   choose_model: Callable[[], BaseModel], concurrency: int = 1, cache: SqliteLRUCache = None,
+                   cache_sampled: bool = False, model_concurrency: int = None, strategy: str = None) -> bool:
+    """
+    Evaluate the pending problems of several datasets with up to `concurrency` problems in flight.
+    Strategies with several dependent requests can be given as stages, which are scheduled one at a time: the
+    first stages of the next problems run while the last stages of the previous ones are in flight, a retry only
+    repeats the stage of the overloaded request, and the result of every stage is saved to the journal, so a
+    resumed evaluation only runs the stages that are missing.
+    The problems of all datasets are scheduled from one queue, interleaved so that the datasets progress at the
+    same pace. Problems whose provider is rate limited or times out are retried later, and the number of problems
+    in flight for their model is halved, then grows back as requests succeed.
+    Predictions are stored at the row of their problem, so the order of the results does not depend on
+    the order in which requests complete, and every finished problem is saved at once to the journal of its
+    dataset. The evaluation files are written when the evaluation ends, also if it fails or is interrupted.
+    Ctrl-C stops starting new problems and waits for the requests in flight.
+
+    :param cells: datasets to evaluate
+    :param strategy_func: prompt strategy, from a question and a model to the response and the answer, or its
+        stages: the first from a question and a model to its result (a string), the next ones from a question,
+        a model and the result of the previous stage, the last one to the response and the answer
+    :param choose_model: function creating the model, called once per problem and stage
+    :param concurrency: maximum number of problems (or stages) evaluated at the same time
+    :param model_concurrency: maximum number of problems (or stages) evaluated at the same time per model,
+        `concurrency` by default
+    :param cache: cache of the responses, None to always send the requests
+    :param cache_sampled: also cache sampled responses (temperature above 0), see `CachedModel`
+    :param strategy: name of the strategy in the call records written next to the evaluation files (see
+        `InstrumentedModel`), by default the name of the strategy function
+    :return: whether the evaluation was interrupted
+    """
+    stages = list(strategy_func) if isinstance(strategy_func, (list, tuple)) else [strategy_func]
+    if strategy is None:
+        strategy = getattr(stages[0], '__name__', None) or stages[0].func.__name__
+    return asyncio.run(_evaluate_cells(cells, stages, choose_model, concurrency, cache, cache_sampled,
+                                       model_concurrency, strategy))
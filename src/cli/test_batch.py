@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.cli.batch import submit_jobs, collect_jobs, get_batch_folder
+from src.cli.engine import EvaluationCell
+from src.models.batch_server import LocalBatchServer
+from src.models.deepseek_model import DeepSeekModel
+from src.models.openai_model import OpenAIModel
+from src.strategies.direct import direct_prompt
+from src.strategies.least_to_most import least_to_most_prompt
+from src.strategies.self_consistency import self_consistency_prompt
+
+
+def respond(body: dict) -> str:
+    # the questions are numbers, even ones are true
+    question = body['messages'][0]['content'].split('\n')[0]
+    return 'True' if int(question) % 2 == 0 else 'False'
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.server = LocalBatchServer(respond, polls=1).__enter__()
+        environment = patch.dict('os.environ', {'OPENAI_API_KEY': 'batch-test', 'OPENAI_BASE_URL': self.server.base_url})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.folder.cleanup()
+
+    def _cell(self, count: int) -> EvaluationCell:
+        data = pd.DataFrame({'id': range(count), 'question': [str(i) for i in range(count)]})
+        data['prediction'] = pd.NA
+        data['prediction_raw'] = pd.NA
+        return EvaluationCell(data, os.path.join(self.folder.name, 'a.csv'))
+
+    def test_direct(self):
+        cell = self._cell(6)
+        self.assertEqual(submit_jobs(cell, direct_prompt, OpenAIModel), 6)
+        with self.assertRaises(RuntimeError):
+            submit_jobs(cell, direct_prompt, OpenAIModel)
+        # still running
+        self.assertEqual(collect_jobs(cell, direct_prompt, OpenAIModel)['running'], 1)
+        counters = collect_jobs(cell, direct_prompt, OpenAIModel)
+        self.assertEqual(counters, {'running': 0, 'collected': 6, 'failed': 0, 'pending': 0, 'requests': 0})
+        saved = pd.read_csv(cell.eval_path)
+        self.assertEqual(saved['prediction'].tolist(), [1, 0, 1, 0, 1, 0])
+        # the requests are the ones of live calls
+        with open(os.path.join(get_batch_folder(cell.eval_path), 'requests-1.jsonl')) as f:
+            request = json.loads(f.readline())
+        self.assertEqual(request['body']['messages'][0]['content'], "0\n\nThe answer must be either 'True' or 'False'.")
+        self.assertEqual(request['body']['max_completion_tokens'], 2000)
+        self.assertEqual(request['url'], OpenAIModel.batch_endpoint)
+        self.assertEqual(submit_jobs(self._cell(6), direct_prompt, OpenAIModel), 0)
+
+    def test_endpoint(self):
+        class CustomModel(OpenAIModel):
+            batch_endpoint = '/v4/chat/completions'
+
+        cell = self._cell(2)
+        # (models of providers without a batch API)
+        with patch.dict('os.environ', {'DEEPSEEK_API_KEY': 'batch-test'}), self.assertRaises(ValueError):
+            submit_jobs(cell, direct_prompt, DeepSeekModel)
+        submit_jobs(cell, direct_prompt, CustomModel)
+        with open(os.path.join(get_batch_folder(cell.eval_path), 'requests-1.jsonl')) as f:
+            self.assertEqual(json.loads(f.readline())['url'], '/v4/chat/completions')
+        self.assertEqual([batch['endpoint'] for batch in self.server.batches.values()], ['/v4/chat/completions'])
+
+    def test_rounds(self):
+        # the second request of least to most depends on the first response
+        cell = self._cell(4)
+        self.assertEqual(submit_jobs(cell, least_to_most_prompt, OpenAIModel), 4)
+        collect_jobs(cell, least_to_most_prompt, OpenAIModel)
+        counters = collect_jobs(cell, least_to_most_prompt, OpenAIModel)
+        self.assertEqual((counters['pending'], counters['requests']), (4, 4))
+        self.assertEqual(submit_jobs(cell, least_to_most_prompt, OpenAIModel), 4)
+        collect_jobs(cell, least_to_most_prompt, OpenAIModel)
+        self.assertEqual(collect_jobs(cell, least_to_most_prompt, OpenAIModel)['pending'], 0)
+        self.assertEqual(cell.data['prediction'].tolist(), [1, 0, 1, 0])
+
+    def test_samples(self):
+        cell = self._cell(2)
+        # three samples per problem
+        self.assertEqual(submit_jobs(cell, self_consistency_prompt, OpenAIModel), 6)
+        collect_jobs(cell, self_consistency_prompt, OpenAIModel)
+        collect_jobs(cell, self_consistency_prompt, OpenAIModel)
+        self.assertEqual(cell.data['prediction'].tolist(), [1, 0])
+        self.assertIn("Votes: {'True': 2}", cell.data.at[0, 'prediction_raw'])
@@ -0,0 +1,344 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.cli.engine import EvaluationCell, evaluate_cells, AdaptiveLimit
+from src.models.echo_model import EchoModel
+from src.models.instrument import get_calls_path, read_calls
+from src.utils.cache import SqliteLRUCache
+
+
+def slow_strategy(question: str, llm) -> tuple[str, str]:
+    time.sleep(0.05)
+    return llm.chat(question), 'True' if int(question) % 2 == 0 else 'False'
+
+
+class TestEvaluateCells(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _cell(self, name: str, count: int) -> EvaluationCell:
+        data = pd.DataFrame({'id': range(count), 'question': [str(i) for i in range(count)]})
+        data['prediction'] = pd.NA
+        data['prediction_raw'] = pd.NA
+        return EvaluationCell(data, os.path.join(self.folder.name, f'{name}.csv'))
+
+    def test_concurrent(self):
+        cells = [self._cell('a', 20), self._cell('b', 20)]
+        start = time.monotonic()
+        self.assertFalse(evaluate_cells(cells, slow_strategy, EchoModel, concurrency=10))
+        self.assertLess(time.monotonic() - start, 40 * 0.05 / 2)
+        for cell in cells:
+            saved = pd.read_csv(cell.eval_path)
+            self.assertEqual(saved['prediction'].tolist(), [1 - i % 2 for i in range(20)])
+            self.assertEqual(saved['prediction_raw'].tolist(), list(range(20)))
+
+    def test_concurrency_beyond_default_executor(self):
+        # more stages in flight than the default executor of a loop has threads (at most 32)
+        n = 40
+        cell = self._cell('a', n)
+        barrier = threading.Barrier(n, timeout=5)
+
+        def strategy(question, llm):
+            barrier.wait()
+            return llm.chat(question), 'True'
+
+        evaluate_cells([cell], strategy, EchoModel, concurrency=n)
+        self.assertEqual(cell.data['prediction'].tolist(), [1] * n)
+
+    def test_last_stages_concurrent(self):
+        # the next stages of the last problems run at the same time, also while nothing else is queued
+        n = 3
+        cell = self._cell('a', n)
+        barrier = threading.Barrier(n, timeout=5)
+
+        def first(question, llm):
+            time.sleep(0.05 * int(question))
+            return question
+
+        def second(question, llm, result):
+            barrier.wait()
+            return llm.chat(result), 'True'
+
+        evaluate_cells([cell], [first, second], EchoModel, concurrency=n)
+        self.assertEqual(cell.data['prediction'].tolist(), [1] * n)
+
+    def test_resume_skips_done(self):
+        cell = self._cell('a', 6)
+        cell.data.loc[:2, 'prediction'] = 7
+        calls = []
+
+        def strategy(question, llm):
+            calls.append(question)
+            return question, None
+
+        evaluate_cells([cell], strategy, EchoModel)
+        self.assertEqual(calls, ['3', '4', '5'])
+        self.assertEqual(cell.data['prediction'].tolist(), [7, 7, 7, -1, -1, -1])
+
+    def test_failure_lets_in_flight_finish(self):
+        cell = self._cell('a', 10)
+        finished = threading.Event()
+
+        def strategy(question, llm):
+            if question == '0':
+                raise RuntimeError('provider error')
+            time.sleep(0.1)
+            finished.set()
+            return question, 'True'
+
+        with self.assertRaises(RuntimeError):
+            evaluate_cells([cell], strategy, EchoModel, concurrency=2)
+        self.assertTrue(finished.is_set())
+        self.assertEqual(cell.data['prediction'].notna().sum(), 1)
+
+    def test_response_cache(self):
+        cache = SqliteLRUCache(os.path.join(self.folder.name, 'responses.sqlite'), table='responses')
+        self.addCleanup(cache.close)
+        calls = []
+
+        class CountingModel(EchoModel):
+            def chat(self, message: str) -> str:
+                calls.append(message)
+                return message
+
+        def strategy(question, llm):
+            llm.reconfig({'temperature': 0})
+            return llm.chat(question), 'True'
+
+        evaluate_cells([self._cell('a', 5)], strategy, CountingModel, cache=cache)
+        evaluate_cells([self._cell('b', 5)], strategy, CountingModel, cache=cache)
+        self.assertEqual(calls, ['0', '1', '2', '3', '4'])
+        self.assertEqual(cache.counters(), {'cache_hits': 5, 'cache_misses': 5})
+
+    def test_call_records(self):
+        cell = self._cell('a', 6)
+        evaluate_cells([cell], slow_strategy, EchoModel, concurrency=3, strategy='zero_shot')
+        calls = read_calls([get_calls_path(cell.eval_path)])
+        self.assertEqual(sorted(calls['problem_id']), list(range(6)))
+        self.assertEqual(set(calls['strategy']), {'zero_shot'})
+        self.assertEqual(set(calls['model']), {EchoModel().get_model_name()})
+        self.assertTrue(calls['error'].isna().all())
+
+
+class TestEvaluationCell(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.eval_path = os.path.join(self.folder.name, 'a.csv')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _cell(self) -> EvaluationCell:
+        data = pd.DataFrame({'id': range(10, 16), 'question': [str(i) for i in range(6)]})
+        data['prediction'] = pd.NA
+        data['prediction_raw'] = pd.NA
+        return EvaluationCell(data, self.eval_path)
+
+    def test_resume_from_journal(self):
+        cell = self._cell()
+        cell.record(0, 'yes', 'True')
+        cell.record(3, 'no', 'False')
+        # records are appended to the journal, not to the evaluation file
+        self.assertFalse(os.path.exists(self.eval_path))
+        # crash in the middle of a record
+        cell._journal.write('{"id": 15, "predic')
+        cell._journal.flush()
+
+        resumed = self._cell()
+        self.assertEqual(resumed.pending(), [1, 2, 4, 5])
+        self.assertEqual(resumed.data['prediction'].tolist()[:4], [1, pd.NA, pd.NA, 0])
+        self.assertEqual(resumed.data.at[3, 'prediction_raw'], 'no')
+        resumed.record(5, 'maybe', None)
+        resumed.compact()
+
+        self.assertFalse(os.path.exists(resumed.journal_path))
+        saved = pd.read_csv(self.eval_path)
+        self.assertEqual(saved['prediction'].fillna(7).tolist(), [1, 7, 7, 0, 7, -1])
+        self.assertEqual(saved['prediction_raw'].fillna('').tolist(), ['yes', '', '', 'no', '', 'maybe'])
+
+    def test_stage_checkpoint(self):
+        cell = self._cell()
+        cell.record_stage(1, 1, 'breakdown 1')
+        cell.record_stage(2, 1, 'breakdown 2')
+        cell.record(2, 'yes', 'True')
+        cell.compact()
+        # the intermediate results of unfinished problems stay in the journal
+        resumed = EvaluationCell(pd.read_csv(self.eval_path), self.eval_path)
+        self.assertEqual(resumed.intermediate, {1: (1, 'breakdown 1')})
+        self.assertEqual(resumed.pending(), [0, 1, 3, 4, 5])
+        resumed.record(1, 'no', 'False')
+        resumed.compact()
+        self.assertFalse(os.path.exists(resumed.journal_path))
+
+    def test_compact_without_journal(self):
+        self._cell().compact()
+        self.assertFalse(os.path.exists(self.eval_path))
+
+
+class TestScheduler(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _cell(self, name: str, count: int) -> EvaluationCell:
+        data = pd.DataFrame({'id': range(count), 'question': [f'{name}{i}' for i in range(count)]})
+        data['prediction'] = pd.NA
+        data['prediction_raw'] = pd.NA
+        return EvaluationCell(data, os.path.join(self.folder.name, f'{name}.csv'))
+
+    def test_interleaved(self):
+        order = []
+
+        def strategy(question, llm):
+            order.append(question)
+            return question, 'True'
+
+        evaluate_cells([self._cell('a', 3), self._cell('b', 2), self._cell('c', 1)], strategy, EchoModel)
+        self.assertEqual(order, ['a0', 'b0', 'c0', 'a1', 'b1', 'a2'])
+
+    def test_model_concurrency(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def strategy(question, llm):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return question, 'True'
+
+        evaluate_cells([self._cell('a', 12)], strategy, EchoModel, concurrency=8, model_concurrency=2)
+        self.assertEqual(peak[0], 2)
+
+    def test_backpressure(self):
+        attempts = []
+
+        def strategy(question, llm):
+            attempts.append(question)
+            if attempts.count(question) == 1 and question in ('a0', 'a1'):
+                raise TimeoutError('provider overloaded')
+            return question, 'True'
+
+        cell = self._cell('a', 4)
+        with patch('src.cli.engine.RETRY_DELAY', 0.01):
+            evaluate_cells([cell], strategy, EchoModel, concurrency=4)
+        self.assertEqual(cell.data['prediction'].tolist(), [1, 1, 1, 1])
+        self.assertEqual(len(attempts), 6)
+
+    def test_backpressure_gives_up(self):
+        def strategy(question, llm):
+            raise TimeoutError('provider overloaded')
+
+        with patch('src.cli.engine.RETRY_DELAY', 0.001), patch('src.cli.engine.MAX_RETRIES', 2):
+            with self.assertRaises(TimeoutError):
+                evaluate_cells([self._cell('a', 2)], strategy, EchoModel)
+
+
+class TestStages(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _cell(self, count: int) -> EvaluationCell:
+        # (resumed from the evaluation file, if any)
+        eval_path = os.path.join(self.folder.name, 'a.csv')
+        if os.path.exists(eval_path):
+            return EvaluationCell(pd.read_csv(eval_path), eval_path)
+        data = pd.DataFrame({'id': range(count), 'question': [str(i) for i in range(count)]})
+        data['prediction'] = pd.NA
+        data['prediction_raw'] = pd.NA
+        return EvaluationCell(data, eval_path)
+
+    def test_pipelined(self):
+        calls = []
+
+        def breakdown(question, llm):
+            calls.append(f'breakdown {question}')
+            time.sleep(0.05)
+            return f'parts of {question}'
+
+        def solve(question, llm, parts):
+            calls.append(f'solve {question}')
+            time.sleep(0.05)
+            return parts, 'True'
+
+        cell = self._cell(8)
+        start = time.monotonic()
+        evaluate_cells([cell], [breakdown, solve], EchoModel, concurrency=4)
+        # 16 requests, 4 at a time
+        self.assertLess(time.monotonic() - start, 8 * 0.05)
+        self.assertEqual(cell.data['prediction_raw'].tolist(), [f'parts of {i}' for i in range(8)])
+        # the solution of a problem goes before the breakdown of the problems after it
+        self.assertLess(calls.index('solve 0'), calls.index('breakdown 5'))
+
+    def test_resume_missing_stage(self):
+        calls = []
+
+        def breakdown(question, llm):
+            calls.append(f'breakdown {question}')
+            return f'parts of {question}'
+
+        def failing_solve(question, llm, parts):
+            if question == '2':
+                raise RuntimeError('provider error')
+            return parts, 'True'
+
+        def solve(question, llm, parts):
+            calls.append(f'solve {question}')
+            return parts, 'False'
+
+        with self.assertRaises(RuntimeError):
+            evaluate_cells([self._cell(4)], [breakdown, failing_solve], EchoModel)
+        calls.clear()
+        cell = self._cell(4)
+        evaluate_cells([cell], [breakdown, solve], EchoModel)
+        self.assertEqual(calls, ['solve 2', 'breakdown 3', 'solve 3'])
+        self.assertEqual(cell.data['prediction'].tolist(), [1, 1, 0, 0])
+        self.assertFalse(os.path.exists(cell.journal_path))
+
+    def test_stage_retry(self):
+        calls = []
+
+        def breakdown(question, llm):
+            calls.append(f'breakdown {question}')
+            return question
+
+        def solve(question, llm, parts):
+            calls.append(f'solve {question}')
+            if calls.count(f'solve {question}') == 1:
+                raise TimeoutError('provider overloaded')
+            return parts, 'True'
+
+        with patch('src.cli.engine.RETRY_DELAY', 0.01):
+            evaluate_cells([self._cell(1)], [breakdown, solve], EchoModel)
+        # only the overloaded stage is repeated
+        self.assertEqual(calls, ['breakdown 0', 'solve 0', 'solve 0'])
+
+
+class TestAdaptiveLimit(TestCase):
+    def test_aimd(self):
+        limit = AdaptiveLimit(8)
+        limit.overload()
+        limit.overload()
+        self.assertEqual(limit.limit, 2)
+        for _ in range(2):
+            limit.success()
+        self.assertEqual(limit.limit, 3)
+        for _ in range(100):
+            limit.success()
+        self.assertEqual(limit.limit, 8)
@@ -0,0 +1,56 @@
+import time
+
+import networkx as nx
+import numpy as np
+from networkx import DiGraph
+
+from src.generator.context import generate_nodes, generate_context_from_graph
+
+
+def generate_sparse_graph(rng: np.random.Generator, number_of_events: int, degree: int) -> DiGraph:
+    """
+    Generate a random directed graph with `degree` random successors per node, large graphs of the
+    generator's edge density do not fit in memory
+
+    :param rng: a np.random.Generator
+    :param number_of_events: number of nodes
+    :param degree: number of successors drawn per node (with replacement)
+    :return: a random directed graph
+    """
+    nodes = generate_nodes(number_of_events)
+    targets = rng.integers(0, number_of_events, size=(number_of_events, degree))
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from((nodes[i], nodes[j]) for i in range(number_of_events) for j in targets[i] if i != j)
+    return graph
+
+
+def benchmark_context(list_of_numbers_of_events: list[int], degree: int = 8, repeat: int = 3,
+                      random_seed: int = 1) -> list[dict]:
+    """
+    Time `generate_context_from_graph` on sparse random graphs of growing size
+
+    :param list_of_numbers_of_events: graph sizes
+    :param degree: number of successors drawn per node
+    :param repeat: number of runs per size, the fastest is reported
+    :param random_seed: random seed
+    :return: one row per size and mode with the time in seconds and the time per event in microseconds
+    """
+    rng = np.random.default_rng(random_seed)
+    rows = []
+    for number_of_events in list_of_numbers_of_events:
+        graph = generate_sparse_graph(rng, number_of_events, degree)
+        for seed_compatible in (True, False):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                generate_context_from_graph(np.random.default_rng(random_seed), graph, seed_compatible)
+                best = min(best, time.perf_counter() - start)
+            rows.append({
+                'number_of_events': number_of_events,
+                'number_of_edges': graph.number_of_edges(),
+                'seed_compatible': seed_compatible,
+                'seconds': best,
+                'us_per_event': best / number_of_events * 1e6,
+            })
+    return rows
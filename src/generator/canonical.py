@@ -0,0 +1,140 @@
+import hashlib
+
+import numpy as np
+from networkx import DiGraph
+
+from src.generator.checker import transition_matrix
+
+
+def _atom_paths(ltl_formula, path: tuple = (), paths: dict = None) -> dict:
+    """
+    Helper function: collect the positions of every atom in a formula, a position is the path of
+    (operator, operand index) pairs from the root and does not depend on the names of the atoms
+
+    :param ltl_formula: LTL formula from `generate_ltl_formulas`
+    :return: dictionary from atom to the sorted tuple of its positions
+    """
+    paths = {} if paths is None else paths
+    if not isinstance(ltl_formula, list):
+        paths.setdefault(str(ltl_formula), []).append(path)
+    elif len(ltl_formula) == 2:
+        _atom_paths(ltl_formula[1], path + ((ltl_formula[0], 0),), paths)
+    else:
+        _atom_paths(ltl_formula[0], path + ((ltl_formula[1], 0),), paths)
+        _atom_paths(ltl_formula[2], path + ((ltl_formula[1], 1),), paths)
+    return {atom: tuple(sorted(positions)) for atom, positions in paths.items()}
+
+
+def _rename(ltl_formula, names: dict) -> str:
+    """
+    Helper function: render a formula with renamed atoms
+
+    :param ltl_formula: LTL formula from `generate_ltl_formulas`
+    :param names: new name per atom, other atoms keep their name
+    :return: string formula
+    """
+    if not isinstance(ltl_formula, list):
+        return names.get(str(ltl_formula), str(ltl_formula))
+    if len(ltl_formula) == 2:
+        return f'({ltl_formula[0]} {_rename(ltl_formula[1], names)})'
+    return f'({_rename(ltl_formula[0], names)} {ltl_formula[1]} {_rename(ltl_formula[2], names)})'
+
+
+def _refine(matrix: np.ndarray, colors: list) -> list:
+    """
+    Helper function: refine node colors by the colors of their successors and predecessors until stable
+
+    :param matrix: successor matrix
+    :param colors: initial colors, any sortable values
+    :return: colors as ranks 0..k-1, in a relabeling-invariant order
+    """
+    successors = [np.flatnonzero(row) for row in matrix]
+    predecessors = [np.flatnonzero(column) for column in matrix.T]
+    ranks = _ranks(colors)
+    while True:
+        signatures = [(ranks[i], tuple(sorted(ranks[j] for j in successors[i])),
+                       tuple(sorted(ranks[j] for j in predecessors[i]))) for i in range(len(ranks))]
+        refined = _ranks(signatures)
+        if len(set(refined)) == len(set(ranks)):
+            return refined
+        ranks = refined
+
+
+def _ranks(values: list) -> list:
+    order = {value: rank for rank, value in enumerate(sorted(set(values)))}
+    return [order[value] for value in values]
+
+
+def _search(matrix: np.ndarray, ranks: list, encode) -> str:
+    """
+    Helper function: individualization-refinement search for the smallest encoding over all orderings
+    consistent with the refined colors
+
+    :param matrix: successor matrix
+    :param ranks: refined colors
+    :param encode: function from an ordering of the nodes to its encoding
+    :return: smallest encoding
+    """
+    if len(set(ranks)) == len(ranks):
+        return encode(sorted(range(len(ranks)), key=lambda i: ranks[i]))
+    sizes = np.bincount(ranks)
+    target = int(np.flatnonzero(sizes > 1)[0])
+    cell = [i for i in range(len(ranks)) if ranks[i] == target]
+    best = None
+    tried = []
+    for v in cell:
+        # individualizing one of two interchangeable nodes gives the same result
+        if any(_twins(matrix, v, u) for u in tried):
+            continue
+        tried.append(v)
+        colors = [(rank, 0 if i == v else 1) if rank == target else (rank, 0) for i, rank in enumerate(ranks)]
+        candidate = _search(matrix, _refine(matrix, colors), encode)
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def _twins(matrix: np.ndarray, u: int, v: int) -> bool:
+    """
+    Helper function: whether swapping two nodes of the same color is an automorphism of the system
+    """
+    others = np.ones(len(matrix), dtype=bool)
+    others[[u, v]] = False
+    return (np.array_equal(matrix[u, others], matrix[v, others])
+            and np.array_equal(matrix[others, u], matrix[others, v])
+            and matrix[u, u] == matrix[v, v] and matrix[u, v] == matrix[v, u])
+
+
+def canonical_form(graph: DiGraph, init_state: str, ltl_formula: list) -> str:
+    """
+    Canonical form of a problem (graph, initial state, formula) under renaming of the events.
+    Renaming the events in both the graph and the formula does not change the answer, and two problems
+    have the same canonical form iff one is such a renaming of the other.
+
+    :param graph: a directed graph, nodes are the events
+    :param init_state: the initial state
+    :param ltl_formula: LTL formula from `generate_ltl_formulas`
+    :return: '<number of events>:<adjacency bitmask in hex>:<initial event>:<formula>' over events e0, e1, ...
+    """
+    nodes = sorted(graph.nodes)
+    matrix = transition_matrix(graph, nodes)
+    paths = _atom_paths(ltl_formula)
+    colors = [(node != init_state, paths.get(node, ())) for node in nodes]
+
+    def encode(order: list) -> str:
+        permuted = matrix[np.ix_(order, order)]
+        bits = ''.join('1' if x else '0' for x in permuted.flatten())
+        mask = format(int(bits, 2), 'x') if bits else '0'
+        names = {nodes[i]: f'e{new}' for new, i in enumerate(order)}
+        return f'{len(nodes)}:{mask}:{names[init_state]}:{_rename(ltl_formula, names)}'
+
+    return _search(matrix, _refine(matrix, colors), encode)
+
+
+def canonical_key(graph: DiGraph, init_state: str, ltl_formula: list) -> str:
+    """
+    Relabeling-invariant key of a problem, the hash of its canonical form
+
+    :return: hex digest
+    """
+    return hashlib.sha256(canonical_form(graph, init_state, ltl_formula).encode()).hexdigest()
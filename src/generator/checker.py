@@ -0,0 +1,199 @@
+import numpy as np
+from networkx import DiGraph
+
+
+def transition_matrix(graph: DiGraph, states: list) -> np.ndarray:
+    """
+    Build the successor matrix of the transition system that `code_template` emits for the graph:
+    states without outgoing edges get a self loop so that every state has a successor.
+
+    :param graph: a directed graph
+    :param states: list of states, the order defines the row/column index
+    :return: a boolean matrix, matrix[i, j] is True iff states[j] is a successor of states[i]
+    """
+    index = {state: i for i, state in enumerate(states)}
+    matrix = np.zeros((len(states), len(states)), dtype=bool)
+    for source, target in graph.edges:
+        matrix[index[source], index[target]] = True
+    sinks = ~matrix.any(axis=1)
+    matrix[sinks, sinks] = True
+    return matrix
+
+
+def _to_nnf(ltl_formula, negated: bool = False) -> tuple:
+    """
+    Helper function: convert LTL formula from `generate_ltl_formulas` to negation normal form over
+    literals, 'and', 'or', 'X', 'F' and 'G'
+
+    :param ltl_formula: LTL formula
+    :param negated: whether the formula is under a negation
+    :return: the formula in negation normal form as nested tuples
+    """
+    if not isinstance(ltl_formula, list):
+        return ('nap' if negated else 'ap', str(ltl_formula))
+    if len(ltl_formula) == 2:
+        operator, operand = ltl_formula
+        if operator == '!':
+            return _to_nnf(operand, not negated)
+        if operator == 'X':
+            return 'X', _to_nnf(operand, negated)
+        if operator == 'G':
+            return 'F' if negated else 'G', _to_nnf(operand, negated)
+        if operator == 'F':
+            return 'G' if negated else 'F', _to_nnf(operand, negated)
+        raise ValueError(f'Unknown operator: {operator}')
+    if len(ltl_formula) == 3:
+        left, operator, right = ltl_formula
+        if operator == '&':
+            return 'or' if negated else 'and', _to_nnf(left, negated), _to_nnf(right, negated)
+        if operator == '|':
+            return 'and' if negated else 'or', _to_nnf(left, negated), _to_nnf(right, negated)
+        if operator == '->':
+            return 'and' if negated else 'or', _to_nnf(left, not negated), _to_nnf(right, negated)
+        raise ValueError(f'Unknown operator: {operator}')
+    raise ValueError(f'Invalid formula: {ltl_formula}')
+
+
+def _build_automaton(nnf: tuple) -> tuple[list, list, list]:
+    """
+    Helper function: translate a formula in negation normal form to a generalized Buchi automaton
+    with the tableau construction of Gerth, Peled, Vardi and Wolper
+
+    :param nnf: formula in negation normal form
+    :return: (incoming, old) per automaton node and the list of 'F' subformulas (one acceptance set each)
+    """
+    incoming, olds, nexts = [], [], []
+    eventualities = []
+    pending = [({-1}, [nnf], frozenset(), frozenset())]
+    while pending:
+        inc, new, old, nxt = pending.pop()
+        if not new:
+            for idx in range(len(olds)):
+                if olds[idx] == old and nexts[idx] == nxt:
+                    incoming[idx] |= inc
+                    break
+            else:
+                incoming.append(set(inc))
+                olds.append(old)
+                nexts.append(nxt)
+                pending.append(({len(olds) - 1}, list(nxt), frozenset(), frozenset()))
+            continue
+        f, new = new[-1], new[:-1]
+        if f in old:
+            pending.append((inc, new, old, nxt))
+            continue
+        kind = f[0]
+        old = old | {f}
+        if kind in ('ap', 'nap'):
+            if (('nap' if kind == 'ap' else 'ap'), f[1]) in old:
+                continue
+            pending.append((inc, new, old, nxt))
+        elif kind == 'and':
+            pending.append((inc, new + [f[1], f[2]], old, nxt))
+        elif kind == 'or':
+            pending.append((inc, new + [f[2]], old, nxt))
+            pending.append((inc, new + [f[1]], old, nxt))
+        elif kind == 'X':
+            pending.append((inc, new, old, nxt | {f[1]}))
+        elif kind == 'G':
+            pending.append((inc, new + [f[1]], old, nxt | {f}))
+        elif kind == 'F':
+            if f not in eventualities:
+                eventualities.append(f)
+            pending.append((inc, new, old, nxt | {f}))
+            pending.append((inc, new + [f[1]], old, nxt))
+    return incoming, olds, eventualities
+
+
+def check_ltl_formula(graph: DiGraph, init_state: str, ltl_formula: list) -> bool:
+    """
+    Check an LTL formula against the transition system of `code_template` without calling NuSMV.
+    The formula holds iff the product of the system and the automaton of the negated formula
+    has no reachable fair cycle.
+
+    :param graph: a directed graph, nodes are the values of `state`
+    :param init_state: the initial state
+    :param ltl_formula: LTL formula from `generate_ltl_formulas`
+    :return: LTL specification result
+    """
+    states = sorted(graph.nodes)
+    matrix = transition_matrix(graph, states)
+    incoming, olds, eventualities = _build_automaton(_to_nnf(ltl_formula, negated=True))
+
+    # consistent[s, q]: state s satisfies the literals of automaton node q
+    labels = np.array(states, dtype=object)
+    consistent = np.ones((len(states), len(olds)), dtype=bool)
+    for q, old in enumerate(olds):
+        for f in old:
+            if f[0] == 'ap':
+                consistent[:, q] &= labels == f[1]
+            elif f[0] == 'nap':
+                consistent[:, q] &= labels != f[1]
+    # accepting[k, q]: automaton node q is in the acceptance set of the k-th eventuality
+    accepting = np.array([[f not in old or f[1] in old for old in olds] for f in eventualities],
+                         dtype=bool).reshape(len(eventualities), len(olds))
+    successors = [[] for _ in olds]
+    initial = []
+    for q, inc in enumerate(incoming):
+        for p in inc:
+            (initial if p == -1 else successors[p]).append(q)
+
+    def product_successors(node: tuple[int, int]) -> list[tuple[int, int]]:
+        s, q = node
+        return [(int(t), r) for r in successors[q] for t in np.flatnonzero(matrix[s] & consistent[:, r])]
+
+    start = states.index(init_state)
+    roots = [(start, q) for q in initial if consistent[start, q]]
+    return not _has_fair_cycle(roots, product_successors, accepting)
+
+
+def _has_fair_cycle(roots: list, successors, accepting: np.ndarray) -> bool:
+    """
+    Helper function: search the strongly connected components reachable from the roots (Tarjan's
+    algorithm, iterative) for a cycle that visits every acceptance set
+
+    :param roots: initial product nodes
+    :param successors: function returning the successors of a product node
+    :param accepting: acceptance sets over automaton nodes
+    :return: whether a fair cycle exists
+    """
+    index, lowlink = {}, {}
+    stack, on_stack = [], set()
+    for root in roots:
+        if root in index:
+            continue
+        work = [(root, iter(successors(root)))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] != index[node]:
+                continue
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == node:
+                    break
+            if len(component) == 1 and node not in successors(node):
+                continue
+            covered = accepting[:, [q for _, q in component]].any(axis=1)
+            if covered.all():
+                return True
+    return False
@@ -0,0 +1,146 @@
+from array import array
+from typing import Iterable
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from src.generator.context import PackedGraph, generate_nodes, code_template
+from src.generator.data import question_template
+from src.generator.formula import Formula, FormulaDAG, render_nl, render_nusmv, render_str
+from src.utils.figure import save_graph_to_string
+
+# columns of a dataset, in the order of the CSV format
+COLUMNS = ('id', 'context', 'query', 'question', 'code', 'formula', 'answer', 'graph')
+# columns that are derived from the stored ones when the dataset is read
+DERIVED_COLUMNS = ('query', 'question', 'code', 'formula', 'graph')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('The Parquet format requires pyarrow, install it with `pip install pyarrow`.') from e
+    return pyarrow
+
+
+def encode_problem(problem: dict) -> dict:
+    """
+    Encode a problem (a row of the CSV format) compactly: the graph as a packed adjacency matrix and the
+    formula as the arrays of a `FormulaDAG` (the root is the last node), the derived text is dropped
+
+    :param problem: a problem with the columns of the CSV format
+    :return: a record of the Parquet format
+    """
+    graph = nx.parse_graphml(problem['graph'])
+    nodes = list(graph.nodes)
+    if nodes != generate_nodes(len(nodes)):
+        raise ValueError(f'Unexpected events: {nodes}')
+    dag = FormulaDAG()
+    dag.from_str(problem['formula'])
+    answer = problem['answer']
+    return {
+        'id': int(problem['id']),
+        'context': problem['context'],
+        'init_state': problem['code'].split('init(state) := ')[1].split(';')[0],
+        'number_of_events': len(nodes),
+        'adjacency': np.packbits(nx.to_numpy_array(graph, nodelist=nodes, dtype=bool), axis=1).tobytes(),
+        'formula_opcodes': dag.opcodes.tolist(),
+        'formula_lefts': dag.lefts.tolist(),
+        'formula_rights': dag.rights.tolist(),
+        'formula_atoms': dag.atoms,
+        'answer': answer if isinstance(answer, bool) else answer == 'True',
+    }
+
+
+def _decode_formula(record: dict) -> Formula:
+    dag = FormulaDAG()
+    dag.atoms = list(record['formula_atoms'])
+    dag.opcodes = array('b', record['formula_opcodes'])
+    dag.lefts = array('i', record['formula_lefts'])
+    dag.rights = array('i', record['formula_rights'])
+    return Formula(dag, len(dag) - 1)
+
+
+def decode_problem(record: dict, columns: Iterable[str] = COLUMNS) -> dict:
+    """
+    Materialize the requested columns of a record of the Parquet format, as in the CSV format
+
+    :param record: a record from `encode_problem`
+    :param columns: columns to materialize
+    :return: a problem with the requested columns
+    """
+    columns = list(columns)
+    n = record['number_of_events']
+    nodes = generate_nodes(n)
+    formula = _decode_formula(record)
+    graph = None
+    if 'code' in columns or 'graph' in columns:
+        bits = np.frombuffer(record['adjacency'], dtype=np.uint8).reshape(n, -1)
+        graph = PackedGraph(nodes, bits).to_digraph()
+    query = last_case = None
+    if 'query' in columns or 'question' in columns:
+        query, last_case = render_nl(formula, base_states=nodes)
+    problem = {}
+    for column in columns:
+        if column == 'query':
+            problem[column] = query
+        elif column == 'question':
+            problem[column] = question_template(context=record['context'], query=query, last_case=last_case)
+        elif column == 'code':
+            context_code = code_template(state=nodes, init=record['init_state'], transition=list(graph.edges))
+            problem[column] = f'{context_code}\nLTLSPEC {render_nusmv(formula)}\n'
+        elif column == 'formula':
+            problem[column] = render_str(formula)
+        elif column == 'graph':
+            problem[column] = save_graph_to_string(graph)
+        else:
+            problem[column] = record[column]
+    return problem
+
+
+def write_parquet(problems: Iterable[dict], path: str, chunk_size: int = 1000):
+    """
+    Write problems (rows of the CSV format) to a Parquet file, one row group per chunk
+
+    :param problems: problems with the columns of the CSV format
+    :param path: path of the Parquet file
+    :param chunk_size: number of rows per row group
+    """
+    pyarrow = _pyarrow()
+    writer = None
+    chunk = []
+
+    def flush():
+        nonlocal writer
+        table = pyarrow.Table.from_pylist(chunk)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+        chunk.clear()
+
+    for problem in problems:
+        chunk.append(encode_problem(problem))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk or writer is None:
+        flush()
+    writer.close()
+
+
+def read_parquet(path: str, columns: Iterable[str] = None) -> pd.DataFrame:
+    """
+    Read a Parquet dataset, materializing only the requested columns
+
+    :param path: path of the Parquet file
+    :param columns: columns of the CSV format to read, all by default
+    :return: DataFrame with the requested columns, as `pd.read_csv` would read them
+    """
+    pyarrow = _pyarrow()
+    columns = list(COLUMNS if columns is None else columns)
+    table = pyarrow.parquet.read_table(path)
+    if not any(column in DERIVED_COLUMNS for column in columns):
+        return table.select(columns).to_pandas()
+    records = table.to_pylist()
+    return pd.DataFrame([decode_problem(record, columns) for record in records], columns=columns)
@@ -1,31 +1,87 @@
 import networkx as nx
+import numpy as np
 from matplotlib import pyplot as plt
 from networkx import DiGraph
 from numpy.random import Generator
-from collections import defaultdict
+from collections import defaultdict, deque
 
-def generate_random_directed_graph(rng: Generator, nodes: list) -> DiGraph:
+
+class PackedGraph:
     """
-    Generate a random directed graph from a list of nodes
+    A directed graph over a list of nodes stored as a packed bit adjacency matrix:
+    bit j of row i (`np.packbits` order) is set iff there is an edge from nodes[i] to nodes[j].
+    It takes n * ceil(n / 8) bytes and is converted to a `DiGraph` only when needed.
+    """
+
+    def __init__(self, nodes: list, bits: np.ndarray):
+        self.nodes = list(nodes)
+        self.bits = bits
+
+    @classmethod
+    def from_matrix(cls, nodes: list, matrix: np.ndarray) -> 'PackedGraph':
+        return cls(nodes, np.packbits(matrix, axis=1))
+
+    def matrix(self) -> np.ndarray:
+        """
+        :return: boolean adjacency matrix
+        """
+        return np.unpackbits(self.bits, axis=1, count=len(self.nodes)).astype(bool)
+
+    def edges(self) -> list[tuple]:
+        """
+        :return: edges in row-major order, the order in which `generate_random_directed_graph` adds them
+        """
+        sources, targets = np.nonzero(self.matrix())
+        return [(self.nodes[i], self.nodes[j]) for i, j in zip(sources.tolist(), targets.tolist())]
+
+    def to_digraph(self) -> DiGraph:
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.nodes)
+        graph.add_edges_from(self.edges())
+        return graph
+
+
+def generate_random_packed_graph(rng: Generator, nodes: list, seed_compatible: bool = True) -> PackedGraph:
+    """
+    Generate a random directed graph from a list of nodes, every edge between two different nodes exists
+    with 50% probability, with all random numbers drawn in one call.
+
+    Seed compatibility: with `seed_compatible=True` the generator draws one double per ordered pair, in the
+    order of the original pairwise loop (i -> j then j -> i for each i < j), so it consumes the random stream
+    exactly as before and reproduces the edge sets of existing datasets. With `seed_compatible=False` it draws
+    the packed bits directly (one random byte per 8 pairs), but gives different graphs for the same seed.
 
     :param rng: a np.random.Generator
     :param nodes: list of nodes
+    :param seed_compatible: whether to reproduce the graphs of `generate_random_directed_graph` for a seed
     :return: a random directed graph
     """
     if len(nodes) != len(set(nodes)):
         raise ValueError('Nodes must be unique')
-    graph = nx.DiGraph()
-    graph.add_nodes_from(nodes)
-    for i in range(len(nodes)):
-        for j in range(i + 1, len(nodes)):
-            # Add an edge from i to j with 50% probability
-            if rng.random() > 0.5:
-                graph.add_edge(nodes[i], nodes[j])
-            # Add an edge from j to i with 50% probability
-            if rng.random() > 0.5:
-                graph.add_edge(nodes[j], nodes[i])
+    n = len(nodes)
+    if not seed_compatible:
+        bits = rng.integers(0, 256, size=(n, (n + 7) // 8), dtype=np.uint8)
+        matrix = np.unpackbits(bits, axis=1, count=n).astype(bool)
+        np.fill_diagonal(matrix, False)
+        return PackedGraph.from_matrix(nodes, matrix)
+    draws = rng.random(n * (n - 1)) > 0.5
+    rows, columns = np.triu_indices(n, k=1)
+    matrix = np.zeros((n, n), dtype=bool)
+    matrix[rows, columns] = draws[0::2]
+    matrix[columns, rows] = draws[1::2]
+    return PackedGraph.from_matrix(nodes, matrix)
+
+
+def generate_random_directed_graph(rng: Generator, nodes: list, seed_compatible: bool = True) -> DiGraph:
+    """
+    Generate a random directed graph from a list of nodes
 
-    return graph
+    :param rng: a np.random.Generator
+    :param nodes: list of nodes
+    :param seed_compatible: see `generate_random_packed_graph`
+    :return: a random directed graph
+    """
+    return generate_random_packed_graph(rng=rng, nodes=nodes, seed_compatible=seed_compatible).to_digraph()
 
 
 def plot_graph(graph: nx.Graph):
@@ -41,41 +97,58 @@ def plot_graph(graph: nx.Graph):
     plt.show()
 
 
-def generate_context_from_graph(rng: Generator, graph: nx.DiGraph) -> str:
+def generate_context_from_graph(rng: Generator, graph: nx.DiGraph, seed_compatible: bool = True) -> str:
     """
-    Generate a context from the given directed graph
+    Generate a context from the given directed graph, one sentence per node in breadth-first order from a
+    random node, continuing from the smallest unvisited node when a component is exhausted.
+    The traversal is linear in the size of the graph: a deque, the sorted successors computed once and a
+    cursor over the sorted nodes.
+
+    Seed compatibility: the original traversal marks nodes as visited when they are dequeued, so a node
+    reachable from several nodes of the same level is enqueued, and described, more than once. With
+    `seed_compatible=True` this is kept, to reproduce the contexts of existing datasets; with
+    `seed_compatible=False` nodes are marked when enqueued and every node is described exactly once.
 
     :param rng: a np.random.Generator
     :param graph: a directed graph
+    :param seed_compatible: whether to reproduce the contexts of existing datasets
     :return: context
     """
     context = []
 
     nodes = sorted(list(graph.nodes))
     node = rng.choice(nodes)
-    visited = set()
-    queue = [node]
-    while len(queue) > 0:
-        node = queue.pop(0)
-        visited.add(node)
-
-        # Get all neighbors for this node
-        neighbors = sorted(list(graph.neighbors(node)))
-
+    successors = {}
+    sentences = {}
+    for n in nodes:
+        neighbors = sorted(list(graph.neighbors(n)))
+        successors[n] = neighbors
         if len(neighbors) == 0:
-            context.append(f'After {node}, no other events can happen.')
+            sentences[n] = f'After {n}, no other events can happen.'
         elif len(neighbors) == 1:
-            context.append(f'After {node}, {neighbors[0]} must happen.')
+            sentences[n] = f'After {n}, {neighbors[0]} must happen.'
         else:
             neighbors_str = ', '.join(neighbors[:-1]) + f', or {neighbors[-1]}'
-            context.append(f'After {node}, either {neighbors_str} must happen.')
+            sentences[n] = f'After {n}, either {neighbors_str} must happen.'
+
+    visited = {node}
+    # nodes before the cursor are all visited
+    pending = iter(nodes)
+    queue = deque([node])
+    while len(queue) > 0:
+        node = queue.popleft()
+        visited.add(node)
+        context.append(sentences[node])
 
-        for neighbor in neighbors:
+        for neighbor in successors[node]:
             if neighbor not in visited:
+                if not seed_compatible:
+                    visited.add(neighbor)
                 queue.append(neighbor)
 
         if len(queue) == 0 and len(visited) != len(nodes):
-            node = sorted(list(set(nodes) - visited))[0]
+            node = next(n for n in pending if n not in visited)
+            visited.add(node)
             queue.append(node)
 
     context = ' '.join(context)
@@ -1,16 +1,17 @@
+from networkx import DiGraph
 from numpy.random import Generator
 
+from src.generator.canonical import canonical_key
+from src.generator.checker import check_ltl_formula
 from src.generator.context import generate_random_directed_graph, generate_nodes, generate_context_from_graph, code_template
-from src.generator.query import generate_ltl_formulas, convert_ltl_formula_to_nl, convert_ltl_formula_to_nusmv, \
-    covert_ltl_formula_to_str_formula
-from copy import deepcopy
+from src.generator.formula import Formula, render_nl, render_nusmv, render_str
+from src.generator.query import generate_formulas
 
-from src.utils.external import call_nusmv
+from src.utils.external import check_many, get_verdict_cache
 from src.utils.figure import save_graph_to_string
-from src.utils.types import ReferenceValue
 
 
-def generate_problem(rng: Generator, number_of_events: int, formula_length: int) -> dict:
+def generate_problem(rng: Generator, number_of_events: int, formula_length: int, checker: str = 'nusmv') -> dict:
     """
     Generate a problem:
     1. Question: A question that needs to be answered consisting of a context (premises) and a query (hypothesis).
@@ -20,51 +21,115 @@ def generate_problem(rng: Generator, number_of_events: int, formula_length: int)
     :param rng: a np.random.Generator
     :param number_of_events: the number of nodes in the graph.
     :param formula_length: length of the formula, len = count of operator of a formula.
+    :param checker: model checker computing the answer, 'nusmv' (reference) or 'native' (in-process).
     :return: a dictionary containing related fields
     """
+    return generate_problems(rng=rng, number_of_events=number_of_events, formula_length=formula_length,
+                             count_of_formulas=1, checker=checker)[0]
+
+
+def generate_problems(rng: Generator, number_of_events: int, formula_length: int, count_of_formulas: int,
+                      checker: str = 'nusmv', canonical: bool = False) -> list[dict]:
+    """
+    Generate problems sharing one context (graph and initial state) with several queries,
+    all queries are checked against the model at once.
+    With `count_of_formulas=1` the random stream is consumed exactly as by `generate_problem`.
+
+    :param rng: a np.random.Generator
+    :param number_of_events: the number of nodes in the graph.
+    :param formula_length: length of the formula, len = count of operator of a formula.
+    :param count_of_formulas: number of queries (problems) generated for the context.
+    :param checker: model checker computing the answer, 'nusmv' (reference) or 'native' (in-process).
+    :param canonical: whether to compute the canonical keys of the problems, see `build_problems`
+    :return: a list of dictionaries containing related fields, see `generate_problem`
+    """
     # Generate a context
     nodes = generate_nodes(number_of_events)
     graph = generate_random_directed_graph(rng=rng, nodes=nodes)
     context = generate_context_from_graph(rng=rng, graph=graph)
 
-    # Generate a query
-    formula = generate_ltl_formulas(rng=rng, states=nodes, formula_length=formula_length, count_of_formulas=1).pop()
-    h_idx = ReferenceValue(0)
-    query = ReferenceValue("")
-    last_case = convert_ltl_formula_to_nl(ltl_formula=deepcopy(formula), base_states=nodes, c_idx=h_idx, result=query)
-    query = query.get()
-    query = f'{query}'
+    # Generate queries
+    formulas = generate_formulas(rng=rng, states=nodes, formula_length=formula_length,
+                                 count_of_formulas=count_of_formulas)
 
     # Initialize the init_state
     init_state = rng.choice(nodes)
 
-    # Prepare the question
-    context = f'Initially, {init_state} happened. {context}'
-    query = f'{query}'.strip()
+    return build_problems(nodes=nodes, graph=graph, context=context, init_state=init_state, formulas=formulas,
+                          checker=checker, canonical=canonical)
 
-    # Prepare code
-    context_code = code_template(state=list(nodes), init=init_state, transition=list(graph.edges))
-    query_code = convert_ltl_formula_to_nusmv(ltl_formula=deepcopy(formula))
-    query_code = f'LTLSPEC {query_code}'
-    code = f'{context_code}\n{query_code}\n'
 
-    # Prepare the answer
-    answer = call_nusmv(code)
+def question_template(context: str, query: str, last_case: str) -> str:
+    """
+    Generate the question of a problem
 
-    problem = {
-        "context": context,
-        "query": query,
-        "question": f'''\
+    :param context: context, with the initial state
+    :param query: cases of the hypothesis, see `render_nl`
+    :param last_case: the case to decide, e.g. 'C3'
+    :return: question
+    """
+    return f'''\
 === Context ===\n
 {context}\n
 === Hypothesis ===\n
 {query}
 
 {last_case} is True or False?
-''',
-        "code": code,
-        "formula": covert_ltl_formula_to_str_formula(formula),
-        "answer": answer,
-        "graph": save_graph_to_string(graph),
-    }
-    return problem
+'''
+
+
+def build_problems(nodes: list[str], graph: DiGraph, context: str, init_state: str, formulas: list[Formula],
+                   checker: str = 'nusmv', canonical: bool = False) -> list[dict]:
+    """
+    Build the problems of queries over one context and compute their answers.
+    With `canonical` (and whenever NuSMV verdicts are cached) every problem gets a relabeling-invariant
+    `_key` (see `canonical_key`), which also keys the verdict cache. Fields starting with '_' are not saved.
+
+    :param nodes: list of nodes (events)
+    :param graph: a directed graph over the nodes
+    :param context: context generated from the graph, without the initial state
+    :param init_state: the initial state
+    :param formulas: LTL formulas from `generate_formulas`
+    :param checker: model checker computing the answer, 'nusmv' (reference) or 'native' (in-process).
+    :param canonical: whether to compute the canonical keys of the problems
+    :return: a list of dictionaries containing related fields, see `generate_problem`
+    """
+    # the checker and the canonical form work on nested lists
+    trees = [formula.to_list() for formula in formulas]
+    keys = None
+    if canonical or (checker == 'nusmv' and get_verdict_cache() is not None):
+        keys = [canonical_key(graph=graph, init_state=init_state, ltl_formula=tree) for tree in trees]
+
+    queries = [render_nl(formula, base_states=nodes) for formula in formulas]
+
+    # Prepare the question
+    context = f'Initially, {init_state} happened. {context}'
+
+    # Prepare code
+    context_code = code_template(state=list(nodes), init=init_state, transition=list(graph.edges))
+    query_codes = [render_nusmv(formula) for formula in formulas]
+
+    # Prepare the answers
+    if checker == 'nusmv':
+        answers = check_many(context_code, query_codes, keys=keys)
+    elif checker == 'native':
+        answers = [check_ltl_formula(graph=graph, init_state=init_state, ltl_formula=tree) for tree in trees]
+    else:
+        raise ValueError(f'Unknown checker: {checker}')
+
+    graph_str = save_graph_to_string(graph)
+    problems = []
+    for formula, (query, last_case), query_code, answer in zip(formulas, queries, query_codes, answers):
+        problems.append({
+            "context": context,
+            "query": query,
+            "question": question_template(context=context, query=query, last_case=last_case),
+            "code": f'{context_code}\nLTLSPEC {query_code}\n',
+            "formula": render_str(formula),
+            "answer": answer,
+            "graph": graph_str,
+        })
+    if keys is not None:
+        for problem, key in zip(problems, keys):
+            problem['_key'] = key
+    return problems
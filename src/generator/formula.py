@@ -0,0 +1,228 @@
+from array import array
+from typing import NamedTuple
+
+ATOM = 0
+OPERATORS = ('X', 'G', 'F', '!', '&', '|', '->')
+UNARY_OPERATORS = ('X', 'G', 'F', '!')
+# opcode of an operator, 0 is an atom
+OPCODES = {operator: i + 1 for i, operator in enumerate(OPERATORS)}
+
+
+class FormulaDAG:
+    """
+    Hash-consed LTL formulas stored in flat arrays: node i is (opcodes[i], lefts[i], rights[i]).
+    An atom has opcode 0 and the index of its name in `atoms` as left, a unary operator has right -1.
+    Adding a node that already exists returns the existing node, so equal subterms are shared and
+    nodes are never modified once added.
+    """
+    __slots__ = ('atoms', 'opcodes', 'lefts', 'rights', '_nodes')
+
+    def __init__(self):
+        self.atoms = []
+        self.opcodes = array('b')
+        self.lefts = array('i')
+        self.rights = array('i')
+        self._nodes = {}
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def _add(self, opcode: int, left: int, right: int) -> int:
+        key = (opcode, left, right)
+        node = self._nodes.get(key)
+        if node is None:
+            node = len(self.opcodes)
+            self.opcodes.append(opcode)
+            self.lefts.append(left)
+            self.rights.append(right)
+            self._nodes[key] = node
+        return node
+
+    def atom(self, name: str) -> int:
+        """
+        :param name: name of the atom, e.g. 'event1'
+        :return: node of the atom
+        """
+        key = ('atom', name)
+        if key not in self._nodes:
+            self.atoms.append(name)
+            self._nodes[key] = self._add(ATOM, len(self.atoms) - 1, -1)
+        return self._nodes[key]
+
+    def unary(self, operator: str, operand: int) -> int:
+        return self._add(OPCODES[operator], operand, -1)
+
+    def binary(self, left: int, operator: str, right: int) -> int:
+        return self._add(OPCODES[operator], left, right)
+
+    def from_list(self, ltl_formula) -> int:
+        """
+        Add a formula in the nested list format of `generate_ltl_formulas`
+
+        :param ltl_formula: LTL formula
+        :return: root node
+        """
+        if not isinstance(ltl_formula, list):
+            return self.atom(str(ltl_formula))
+        if len(ltl_formula) == 2:
+            return self.unary(ltl_formula[0], self.from_list(ltl_formula[1]))
+        return self.binary(self.from_list(ltl_formula[0]), ltl_formula[1], self.from_list(ltl_formula[2]))
+
+    def from_str(self, text: str) -> int:
+        """
+        Add a formula in the string format of `render_str`, e.g. '(F (event1 & (X event2)))'
+
+        :param text: string formula
+        :return: root node
+        """
+        tokens = text.replace('(', ' ( ').replace(')', ' ) ').split()
+        position = 0
+
+        def parse() -> int:
+            nonlocal position
+            token = tokens[position]
+            position += 1
+            if token != '(':
+                return self.atom(token)
+            if tokens[position] in UNARY_OPERATORS:
+                operator = tokens[position]
+                position += 1
+                node = self.unary(operator, parse())
+            else:
+                left = parse()
+                operator = tokens[position]
+                position += 1
+                node = self.binary(left, operator, parse())
+            if tokens[position] != ')':
+                raise ValueError(f'Invalid formula: {text}')
+            position += 1
+            return node
+
+        root = parse()
+        if position != len(tokens):
+            raise ValueError(f'Invalid formula: {text}')
+        return root
+
+
+class Formula(NamedTuple):
+    """
+    An immutable handle of a formula: its root node in a `FormulaDAG`
+    """
+    dag: FormulaDAG
+    root: int
+
+    @classmethod
+    def from_list(cls, ltl_formula) -> 'Formula':
+        dag = FormulaDAG()
+        return cls(dag, dag.from_list(ltl_formula))
+
+    @classmethod
+    def from_str(cls, text: str) -> 'Formula':
+        dag = FormulaDAG()
+        return cls(dag, dag.from_str(text))
+
+    def to_list(self):
+        """
+        :return: the formula in the nested list format of `generate_ltl_formulas`, shared subterms are
+            shared lists and must not be modified
+        """
+        return _fold(self, lambda name: name, lambda operator, operand: [operator, operand],
+                     lambda left, operator, right: [left, operator, right])
+
+
+def _fold(formula: Formula, atom, unary, binary):
+    """
+    Helper function: evaluate a formula bottom-up, every node once
+
+    :param formula: formula
+    :param atom: function from the name of an atom to its value
+    :param unary: function from an operator and the value of its operand to a value
+    :param binary: function from the value of the left operand, an operator and the value of the right operand
+    :return: value of the root
+    """
+    dag = formula.dag
+    values = {}
+
+    def visit(node: int):
+        if node in values:
+            return values[node]
+        opcode = dag.opcodes[node]
+        if opcode == ATOM:
+            value = atom(dag.atoms[dag.lefts[node]])
+        elif dag.rights[node] < 0:
+            value = unary(OPERATORS[opcode - 1], visit(dag.lefts[node]))
+        else:
+            value = binary(visit(dag.lefts[node]), OPERATORS[opcode - 1], visit(dag.rights[node]))
+        values[node] = value
+        return value
+
+    return visit(formula.root)
+
+
+def render_str(formula: Formula) -> str:
+    """
+    :return: string format of the formula, e.g. '(F (G (! event2)))'
+    """
+    return _fold(formula, lambda name: name, lambda operator, operand: f'({operator} {operand})',
+                 lambda left, operator, right: f'({left} {operator} {right})')
+
+
+def render_nusmv(formula: Formula) -> str:
+    """
+    :return: NuSMV format of the formula, e.g. '(F (G (! (state=event2))))'
+    """
+    return _fold(formula, lambda name: f'(state={name})' if name.startswith('event') else name,
+                 lambda operator, operand: f'({operator} {operand})',
+                 lambda left, operator, right: f'({left} {operator} {right})')
+
+
+def _describe(operand: str, base_states: list) -> str:
+    return f'{operand} happens' if operand in base_states else f'{operand} holds'
+
+
+def render_nl(formula: Formula, base_states: list) -> tuple[str, str]:
+    """
+    Render a formula in natural language as numbered cases, one per operator occurrence in post-order.
+    A subterm occurring more than once gets a new case at each occurrence, but its operands are only
+    described at its first occurrence and referred to by their cases afterwards.
+
+    :param formula: formula
+    :param base_states: a list of base/atomic states
+    :return: the cases separated by newlines, the last case, e.g. 'C3'
+    """
+    dag = formula.dag
+    lines = []
+    operands = {}
+
+    def visit(node: int) -> str:
+        opcode = dag.opcodes[node]
+        if opcode == ATOM:
+            return dag.atoms[dag.lefts[node]]
+        if node not in operands:
+            children = (dag.lefts[node],) if dag.rights[node] < 0 else (dag.lefts[node], dag.rights[node])
+            operands[node] = [visit(child) for child in children]
+        operator = OPERATORS[opcode - 1]
+        if operator in UNARY_OPERATORS:
+            operand, = operands[node]
+            event = operand in base_states
+            if operator == 'X':
+                nl = f'{operand} {"happens" if event else "holds"} in the next state'
+            elif operator == 'G':
+                nl = f'{operand} always {"happens" if event else "holds"}'
+            elif operator == 'F':
+                nl = f'{operand} eventually {"happens" if event else "holds"}'
+            else:
+                nl = f'{operand} does not {"happen" if event else "hold"}'
+        else:
+            left, right = (_describe(operand, base_states) for operand in operands[node])
+            if operator == '&':
+                nl = f'{left} and {right}'
+            elif operator == '|':
+                nl = f'{left} or {right}'
+            else:
+                nl = f'If {left}, then {right}'
+        lines.append(f'C{len(lines) + 1}: {nl[0].upper() + nl[1:]}.')
+        return f'C{len(lines)}'
+
+    last_case = visit(formula.root)
+    return '\n'.join(lines), last_case
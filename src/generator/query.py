@@ -1,12 +1,13 @@
 import numpy as np
 from numpy.random import Generator
 
+from src.generator.formula import Formula, FormulaDAG
 from src.utils.types import ReferenceValue
 
 
-def generate_ltl_formulas(rng: Generator, states: list, formula_length: int, count_of_formulas: int) -> list[list]:
+def generate_formulas(rng: Generator, states: list, formula_length: int, count_of_formulas: int) -> list[Formula]:
     """
-    Generate LTL formulas
+    Generate LTL formulas in one `FormulaDAG`, the formulas share their common subterms
 
     :param rng: a np.random.Generator
     :param states: a set of base/atomic states
@@ -19,39 +20,53 @@ def generate_ltl_formulas(rng: Generator, states: list, formula_length: int, cou
     binary_operators = ['&', '|', '->']  # And, Or
     operators = unary_operators + binary_operators
 
-    # Initialize the list of lists to hold formulas of increasing lengths
+    dag = FormulaDAG()
+    # Initialize the list of lists to hold formulas (nodes) of increasing lengths
     B = [[] for _ in range(formula_length + 1)]
-    B[0] = states
+    B[0] = [dag.atom(state) for state in states]
 
     # Generate m formulas
     formulas = []
     for _ in range(count_of_formulas):
         for j in range(1, formula_length + 1):
             # Randomly select an operator
-            x = rng.choice(list(operators))
+            x = str(rng.choice(list(operators)))
 
             if x in unary_operators:
                 # Choose a formula from the previous set of formulas
                 y = B[j - 1][rng.integers(0, len(B[j - 1]))]
-                new_formula = [x, y]
+                new_formula = dag.unary(x, y)
             else:
                 # Choose two formulas for binary operator
                 s = rng.integers(0, j)
                 y1 = B[s][rng.integers(0, len(B[s]))]
                 y2 = B[j - 1 - s][rng.integers(0, len(B[j - 1 - s]))]
 
-                new_formula = [y1, x, y2]
+                new_formula = dag.binary(y1, x, y2)
 
             # Add the new formula to the list
             B[j].append(new_formula)
 
         # Store the final processed formula
-        formula = B[formula_length][-1]
-        formulas.append(formula)
+        formulas.append(Formula(dag, B[formula_length][-1]))
 
     return formulas
 
 
+def generate_ltl_formulas(rng: Generator, states: list, formula_length: int, count_of_formulas: int) -> list[list]:
+    """
+    Generate LTL formulas as nested lists, e.g. ['F', ['event1', '&', ['X', 'event2']]]
+
+    :param rng: a np.random.Generator
+    :param states: a set of base/atomic states
+    :param formula_length: length of a certain formula to generate, len = count of operators
+    :param count_of_formulas: number of formulas to generate
+    :return: a list of LTL formulas, see `generate_formulas`
+    """
+    return [formula.to_list() for formula in generate_formulas(rng=rng, states=states, formula_length=formula_length,
+                                                               count_of_formulas=count_of_formulas)]
+
+
 def _convert_ltl_formula_to_nu_smv(ltl_formula: list) -> list:
     """
     Helper function: convert LTL formula from `generate_ltl_formulas` to NuSMV format
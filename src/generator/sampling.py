@@ -0,0 +1,189 @@
+from numpy.random import Generator
+
+from src.generator.context import generate_nodes, generate_random_directed_graph, generate_context_from_graph
+from src.generator.data import build_problems, generate_problems
+from src.generator.query import generate_formulas
+from src.generator.sink import ShardSink
+
+# a cell with fewer distinct problems than requested would otherwise be sampled forever
+MAX_DUPLICATE_STREAK = 10_000
+
+
+def _check_streak(streak: int):
+    if streak >= MAX_DUPLICATE_STREAK:
+        raise RuntimeError(f'{streak} duplicate problems in a row, the cell has too few distinct problems '
+                           f'for the requested count.')
+
+
+class BalancedSampler:
+    """
+    Keep a bounded reservoir per answer class. Once a class is full, surplus problems replace reservoir
+    entries with reservoir sampling (Algorithm R), so every checked problem of the class has the same
+    chance to end up in the dataset instead of only the first ones.
+    With `deduplicate`, problems whose canonical key (`_key`) was offered before are dropped.
+    """
+
+    def __init__(self, rng: Generator, count_true: int, count_false: int, deduplicate: bool = False):
+        self.rng = rng
+        self.quotas = {True: count_true, False: count_false}
+        self.reservoirs = {True: [], False: []}
+        self.seen = {True: 0, False: 0}
+        self.oracle_calls = 0
+        self.deduplicate = deduplicate
+        self.keys = set()
+        self.duplicates = 0
+        self.streak = 0
+
+    @property
+    def full(self) -> bool:
+        return all(len(self.reservoirs[answer]) >= self.quotas[answer] for answer in (True, False))
+
+    def needs(self, answer: bool) -> bool:
+        return len(self.reservoirs[answer]) < self.quotas[answer]
+
+    def offer(self, problem: dict) -> bool:
+        """
+        Offer a checked problem to the sampler
+
+        :param problem: a problem from `generate_problems`
+        :return: whether the problem filled a slot of a class that was not full yet
+        """
+        if self.deduplicate:
+            if problem['_key'] in self.keys:
+                self.duplicates += 1
+                self.streak += 1
+                _check_streak(self.streak)
+                return False
+            self.keys.add(problem['_key'])
+            self.streak = 0
+        answer = bool(problem['answer'])
+        self.seen[answer] += 1
+        reservoir = self.reservoirs[answer]
+        if len(reservoir) < self.quotas[answer]:
+            reservoir.append(problem)
+            return True
+        slot = self.rng.integers(0, self.seen[answer])
+        if slot < self.quotas[answer]:
+            reservoir[slot] = problem
+        return False
+
+    def stats(self) -> dict:
+        candidates = self.seen[True] + self.seen[False] + self.duplicates
+        accepted = len(self.reservoirs[True]) + len(self.reservoirs[False])
+        return {
+            'candidates': candidates,
+            'accepted': accepted,
+            'rejected': candidates - accepted,
+            'duplicates': self.duplicates,
+            'oracle_calls': self.oracle_calls,
+        }
+
+
+def sample_balanced(rng: Generator, count_true: int, count_false: int, number_of_events: int, formula_length: int,
+                    checker: str = 'nusmv', formulas_per_graph: int = 4, max_reuse: int = 8,
+                    deduplicate: bool = False) -> tuple[list[dict], list[dict], dict]:
+    """
+    Sample balanced problems, reusing each graph for several batches of candidate formulas as long as
+    it keeps producing answers of a class that is not full yet. Every batch is one model checker call.
+
+    :param rng: a np.random.Generator
+    :param count_true: count of true problems
+    :param count_false: count of false problems
+    :param number_of_events: the number of nodes in the graph.
+    :param formula_length: length of the formula, len = count of operator of a formula.
+    :param checker: model checker computing the answer, 'nusmv' (reference) or 'native' (in-process).
+    :param formulas_per_graph: number of candidate formulas per batch
+    :param max_reuse: maximum number of batches per graph
+    :param deduplicate: whether to drop problems that are renamings of an earlier problem
+    :return: true problems, false problems, sampling statistics (see `BalancedSampler.stats`)
+    """
+    sampler = BalancedSampler(rng, count_true, count_false, deduplicate)
+    nodes = generate_nodes(number_of_events)
+    while not sampler.full:
+        graph = generate_random_directed_graph(rng=rng, nodes=nodes)
+        context = generate_context_from_graph(rng=rng, graph=graph)
+        init_state = rng.choice(nodes)
+        for _ in range(max_reuse):
+            formulas = generate_formulas(rng=rng, states=nodes, formula_length=formula_length,
+                                         count_of_formulas=formulas_per_graph)
+            problems = build_problems(nodes=nodes, graph=graph, context=context, init_state=init_state,
+                                      formulas=formulas, checker=checker, canonical=deduplicate)
+            sampler.oracle_calls += 1
+            useful = [sampler.offer(problem) for problem in problems]
+            if sampler.full or not any(useful):
+                break
+    return sampler.reservoirs[True], sampler.reservoirs[False], sampler.stats()
+
+
+def sample_rejection(rng: Generator, count_true: int, count_false: int, number_of_events: int, formula_length: int,
+                     checker: str = 'nusmv', formulas_per_graph: int = 1, deduplicate: bool = False,
+                     sink: ShardSink = None) -> tuple[list[dict], list[dict], dict]:
+    """
+    Sample balanced problems by rejecting every problem whose class is already full (the original sampling)
+
+    :param sink: if given, accepted problems are streamed to it instead of being returned, and the sampling
+        resumes from its last checkpoint
+    :return: true problems, false problems, sampling statistics (see `BalancedSampler.stats`)
+    """
+    problems = {True: [], False: []}
+    quotas = {True: count_true, False: count_false}
+    counters = {'true': 0, 'false': 0, 'candidates': 0, 'oracle_calls': 0, 'duplicates': 0, 'streak': 0}
+    keys = set()
+    checkpoint = sink.resume() if sink is not None else None
+    if checkpoint is not None:
+        rng.bit_generator.state = checkpoint['rng']
+        counters = checkpoint['counters']
+        keys = sink.keys()
+    taken = {True: counters['true'], False: counters['false']}
+    # (all formulas generated for one graph are checked in one model checker call)
+    while taken[True] < count_true or taken[False] < count_false:
+        batch = generate_problems(rng=rng, number_of_events=number_of_events, formula_length=formula_length,
+                                  count_of_formulas=formulas_per_graph, checker=checker, canonical=deduplicate)
+        counters['oracle_calls'] += 1
+        for problem in batch:
+            counters['candidates'] += 1
+            if deduplicate:
+                if problem['_key'] in keys:
+                    counters['duplicates'] += 1
+                    counters['streak'] += 1
+                    _check_streak(counters['streak'])
+                    continue
+                keys.add(problem['_key'])
+                counters['streak'] = 0
+                if sink is not None:
+                    sink.write_key(problem['_key'])
+            answer = bool(problem['answer'])
+            if taken[answer] < quotas[answer]:
+                taken[answer] += 1
+                if sink is None:
+                    problems[answer].append(problem)
+                else:
+                    sink.write(problem)
+        counters['true'], counters['false'] = taken[True], taken[False]
+        if sink is not None and sink.pending >= sink.chunk_size:
+            sink.checkpoint(rng, counters)
+    if sink is not None:
+        sink.checkpoint(rng, counters, done=True)
+    accepted = taken[True] + taken[False]
+    stats = {
+        'candidates': counters['candidates'],
+        'accepted': accepted,
+        'rejected': counters['candidates'] - accepted,
+        'duplicates': counters['duplicates'],
+        'oracle_calls': counters['oracle_calls'],
+    }
+    return problems[True], problems[False], stats
+
+
+def format_stats(stats: dict) -> str:
+    """
+    Format sampling statistics
+
+    :param stats: sampling statistics
+    :return: one line summary
+    """
+    rejection_rate = stats['rejected'] / stats['candidates'] if stats['candidates'] else 0.0
+    calls_per_problem = stats['oracle_calls'] / stats['accepted'] if stats['accepted'] else 0.0
+    return (f"{stats['candidates']} candidates, {stats['accepted']} accepted, rejection rate {rejection_rate:.1%} "
+            f"({stats['duplicates']} duplicates), {stats['oracle_calls']} model checker calls "
+            f"({calls_per_problem:.2f} per accepted problem)")
@@ -0,0 +1,148 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import NamedTuple
+
+import numpy as np
+from numpy.random import Generator
+
+from src.generator.sampling import sample_balanced, sample_rejection
+from src.generator.sink import ShardSink, get_shard_folder
+from src.utils.external import verdict_cache_counters
+
+
+class Shard(NamedTuple):
+    """
+    A deterministic unit of generation work: a part of the problems of one (events, operators) cell
+    """
+    number_of_events: int
+    number_of_operators: int
+    random_seed: int
+    shard_index: int
+    shards: int
+    count_true: int
+    count_false: int
+    checker: str = 'nusmv'
+    formulas_per_graph: int = 1
+    sampling: str = 'rejection'
+    max_reuse: int = 8
+    deduplicate: bool = False
+
+
+def shard_quotas(count_of_problem: int, shards: int) -> list[tuple[int, int]]:
+    """
+    Split the balanced quota of a cell over shards
+
+    :param count_of_problem: count of problems of the cell, must be even
+    :param shards: number of shards
+    :return: (count of true problems, count of false problems) per shard
+    """
+    half = count_of_problem // 2
+    return [(half // shards + (i < half % shards),) * 2 for i in range(shards)]
+
+
+def shard_rng(random_seed: int, shard_index: int, shards: int) -> Generator:
+    """
+    Random generator of a shard, a single shard uses the seed directly as the unsharded generation does
+
+    :param random_seed: random seed of the cell
+    :param shard_index: index of the shard
+    :param shards: number of shards
+    :return: a np.random.Generator
+    """
+    if shards == 1:
+        return np.random.default_rng(random_seed)
+    return np.random.default_rng(np.random.SeedSequence(random_seed, spawn_key=(shard_index,)))
+
+
+def plan_cell(count_of_problem: int, number_of_events: int, number_of_operators: int, random_seed: int,
+              shards: int = 1, checker: str = 'nusmv', formulas_per_graph: int = 1, sampling: str = 'rejection',
+              max_reuse: int = 8, deduplicate: bool = False) -> list[Shard]:
+    """
+    Split one cell into shards
+
+    :return: list of shards, in merge order
+    """
+    if count_of_problem % 2 != 0:
+        raise ValueError('Count of problems must be even to ensure balanced data.')
+    if sampling not in ('rejection', 'balanced'):
+        raise ValueError(f'Unknown sampling: {sampling}')
+    return [Shard(number_of_events, number_of_operators, random_seed, i, shards, count_true, count_false, checker,
+                  formulas_per_graph, sampling, max_reuse, deduplicate)
+            for i, (count_true, count_false) in enumerate(shard_quotas(count_of_problem, shards))]
+
+
+def generate_shard(shard: Shard, folder: str = None) -> tuple[list[dict], list[dict], dict]:
+    """
+    Generate the problems of a shard while ensuring its quotas of true and false problems
+
+    :param shard: the shard
+    :param folder: spool folder, if given the problems are streamed to it (see `ShardSink`)
+        instead of being returned, and an interrupted shard resumes from its last checkpoint
+    :return: true problems, false problems, sampling and verdict cache statistics
+    """
+    rng = shard_rng(shard.random_seed, shard.shard_index, shard.shards)
+    sink = None
+    if folder is not None:
+        sink = ShardSink(get_shard_folder(folder, shard), shard)
+    before = verdict_cache_counters()
+    if shard.sampling == 'balanced':
+        # reservoir entries can be replaced until the end, so a shard is only written once complete
+        checkpoint = sink.resume() if sink is not None else None
+        if checkpoint is not None and checkpoint['done']:
+            problems_true, problems_false, stats = [], [], checkpoint['counters']
+        else:
+            problems_true, problems_false, stats = sample_balanced(
+                rng=rng, count_true=shard.count_true, count_false=shard.count_false,
+                number_of_events=shard.number_of_events, formula_length=shard.number_of_operators,
+                checker=shard.checker, formulas_per_graph=shard.formulas_per_graph, max_reuse=shard.max_reuse,
+                deduplicate=shard.deduplicate)
+            if sink is not None:
+                for problem in problems_true + problems_false:
+                    sink.write(problem)
+                sink.checkpoint(rng, stats, done=True)
+                problems_true, problems_false = [], []
+    else:
+        problems_true, problems_false, stats = sample_rejection(
+            rng=rng, count_true=shard.count_true, count_false=shard.count_false,
+            number_of_events=shard.number_of_events, formula_length=shard.number_of_operators, checker=shard.checker,
+            formulas_per_graph=shard.formulas_per_graph, deduplicate=shard.deduplicate, sink=sink)
+    # counters of this process only, they are summed over shards by `merge_shards`
+    after = verdict_cache_counters()
+    stats.update({key: after[key] - before[key] for key in after})
+    return problems_true, problems_false, stats
+
+
+def run_shards(shards: list[Shard], workers: int = 1,
+               folder: str = None) -> list[tuple[list[dict], list[dict], dict]]:
+    """
+    Generate shards, serially in this process or in a pool of worker processes.
+    Every shard owns its random stream, so the results do not depend on the number of workers.
+
+    :param shards: list of shards
+    :param workers: number of worker processes
+    :param folder: spool folder, see `generate_shard`
+    :return: results of `generate_shard`, in the order of the shards
+    """
+    generate = partial(generate_shard, folder=folder)
+    if workers <= 1 or len(shards) <= 1:
+        return [generate(shard) for shard in shards]
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+        return list(executor.map(generate, shards))
+
+
+def merge_shards(results: list[tuple[list[dict], list[dict], dict]]) -> tuple[list[dict], dict]:
+    """
+    Merge the results of the shards of one cell: all true problems first, then all false problems
+
+    :param results: results of `generate_shard`, in shard order
+    :return: list of problems, summed sampling statistics
+    """
+    problems = []
+    stats = {}
+    for problems_true, _, shard_stats in results:
+        problems.extend(problems_true)
+        for key, value in shard_stats.items():
+            stats[key] = stats.get(key, 0) + value
+    for _, problems_false, _ in results:
+        problems.extend(problems_false)
+    return problems, stats
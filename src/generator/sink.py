@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import shutil
+from typing import Iterator, NamedTuple
+
+from numpy.random import Generator
+
+from src.generator.columnar import write_parquet
+
+# columns of a dataset after the id, in the order of the fields of a problem
+COLUMNS = ('context', 'query', 'question', 'code', 'formula', 'answer', 'graph')
+
+
+class ShardSink:
+    """
+    Append the accepted problems of a shard to spool files on disk, one per answer class, in chunks.
+    Every flush writes a checkpoint with the byte length of the spool files and the state of the sampling
+    (random generator state and counters), so an interrupted shard resumes from its last checkpoint:
+    the rows written after it are dropped and the random stream continues from the saved state.
+    """
+
+    def __init__(self, folder: str, shard: NamedTuple, chunk_size: int = 100):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.parameters = shard._asdict()
+        self.chunk_size = chunk_size
+        self.paths = {name: os.path.join(folder, f'{name}.csv') for name in ('true', 'false')}
+        self.paths['keys'] = os.path.join(folder, 'keys.txt')
+        self.checkpoint_path = os.path.join(folder, 'checkpoint.json')
+        self._rows = {True: [], False: []}
+        self._keys = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows[True]) + len(self._rows[False])
+
+    def resume(self) -> dict:
+        """
+        Restore the spool files to the last checkpoint
+
+        :return: the checkpoint (see `checkpoint`), None to start from scratch
+        """
+        checkpoint = None
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint['parameters'] != self.parameters:
+                checkpoint = None
+        for name, path in self.paths.items():
+            with open(path, 'a+b') as f:
+                f.truncate(checkpoint['lengths'][name] if checkpoint else 0)
+        return checkpoint
+
+    def keys(self) -> set:
+        """
+        :return: canonical keys written up to the last flush
+        """
+        with open(self.paths['keys']) as f:
+            return set(f.read().split())
+
+    def write(self, problem: dict):
+        self._rows[bool(problem['answer'])].append([problem[column] for column in COLUMNS])
+
+    def write_key(self, key: str):
+        self._keys.append(key)
+
+    def checkpoint(self, rng: Generator, counters: dict, done: bool = False):
+        """
+        Flush the pending rows and save a checkpoint
+
+        :param rng: random generator of the shard, its state is saved
+        :param counters: JSON-serializable sampling state needed to resume
+        :param done: whether the shard is complete
+        """
+        for answer, name in ((True, 'true'), (False, 'false')):
+            with open(self.paths[name], 'a', newline='') as f:
+                csv.writer(f, lineterminator='\n').writerows(self._rows[answer])
+            self._rows[answer] = []
+        with open(self.paths['keys'], 'a') as f:
+            f.writelines(f'{key}\n' for key in self._keys)
+        self._keys = []
+        checkpoint = {
+            'parameters': self.parameters,
+            'lengths': {name: os.path.getsize(path) for name, path in self.paths.items()},
+            'rng': rng.bit_generator.state,
+            'counters': counters,
+            'done': done,
+        }
+        # replace the checkpoint atomically, a crash leaves the previous one
+        with open(f'{self.checkpoint_path}.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(f'{self.checkpoint_path}.tmp', self.checkpoint_path)
+
+    def rows(self, answer: bool) -> Iterator[list[str]]:
+        with open(self.paths['true' if answer else 'false'], newline='') as f:
+            yield from csv.reader(f)
+
+
+def get_cell_folder(folder: str, number_of_events: int, number_of_operators: int) -> str:
+    return os.path.join(folder, f'{number_of_events}_events_{number_of_operators}_formula_len')
+
+
+def get_shard_folder(folder: str, shard: NamedTuple) -> str:
+    return os.path.join(get_cell_folder(folder, shard.number_of_events, shard.number_of_operators),
+                        f'shard_{shard.shard_index}_of_{shard.shards}')
+
+
+def clear_cell(folder: str, number_of_events: int, number_of_operators: int):
+    """
+    Remove the spool files of a cell, so that its generation starts from scratch
+    """
+    shutil.rmtree(get_cell_folder(folder, number_of_events, number_of_operators), ignore_errors=True)
+
+
+def write_cell(folder: str, shards: list[NamedTuple], path: str):
+    """
+    Merge the spool files of the shards of one cell into a dataset, all true problems first, then all
+    false problems, and remove the spool files of the cell
+
+    :param folder: spool folder
+    :param shards: shards of the cell, in merge order
+    :param path: path of the dataset, CSV or Parquet (.parquet, see `write_parquet`)
+    """
+    sinks = [ShardSink(get_shard_folder(folder, shard), shard) for shard in shards]
+    rows = ([i] + row for i, row in enumerate(row for answer in (True, False)
+                                                  for sink in sinks for row in sink.rows(answer)))
+    if path.endswith('.parquet'):
+        write_parquet((dict(zip(('id',) + COLUMNS, row)) for row in rows), f'{path}.tmp')
+    else:
+        with open(f'{path}.tmp', 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(('id',) + COLUMNS)
+            writer.writerows(rows)
+    os.replace(f'{path}.tmp', path)
+    clear_cell(folder, shards[0].number_of_events, shards[0].number_of_operators)
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+import networkx as nx
+import numpy as np
+
+from src.generator.canonical import canonical_form, canonical_key
+from src.generator.checker import check_ltl_formula
+from src.generator.context import generate_random_directed_graph, generate_nodes
+from src.generator.query import generate_ltl_formulas
+
+
+def _relabel(formula, names: dict):
+    if not isinstance(formula, list):
+        return names.get(formula, formula)
+    return [_relabel(part, names) for part in formula]
+
+
+class TestCanonicalKey(TestCase):
+    def setUp(self):
+        self.graph = nx.DiGraph()
+        self.graph.add_nodes_from(['event1', 'event2', 'event3'])
+        self.graph.add_edges_from([('event1', 'event3'), ('event1', 'event2'), ('event2', 'event1')])
+
+    def test_relabeling_invariant(self):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            nodes = generate_nodes(int(rng.integers(2, 7)))
+            graph = generate_random_directed_graph(rng=rng, nodes=nodes)
+            formula = generate_ltl_formulas(rng=rng, states=nodes, formula_length=3, count_of_formulas=1)[0]
+            init_state = str(rng.choice(nodes))
+            names = dict(zip(nodes, rng.permutation(nodes).tolist()))
+            relabeled = nx.relabel_nodes(graph, names)
+            self.assertEqual(canonical_key(graph, init_state, formula),
+                             canonical_key(relabeled, names[init_state], _relabel(formula, names)))
+            self.assertEqual(check_ltl_formula(graph, init_state, formula),
+                             check_ltl_formula(relabeled, names[init_state], _relabel(formula, names)))
+
+    def test_distinguishes_problems(self):
+        key = canonical_key(self.graph, 'event1', ['F', 'event3'])
+        self.assertNotEqual(key, canonical_key(self.graph, 'event2', ['F', 'event3']))
+        self.assertNotEqual(key, canonical_key(self.graph, 'event1', ['G', 'event3']))
+        self.assertNotEqual(key, canonical_key(self.graph, 'event1', ['F', 'event2']))
+        self.assertNotEqual(key, canonical_key(self.graph, 'event1', ['F', ['event3', '&', 'event2']]))
+
+    def test_symmetric_nodes(self):
+        # event2 and event3 are interchangeable when the formula does not mention them
+        graph = nx.DiGraph()
+        graph.add_edges_from([('event1', 'event2'), ('event1', 'event3'), ('event2', 'event1'),
+                              ('event3', 'event1')])
+        self.assertEqual(canonical_key(graph, 'event1', ['X', 'event2']),
+                         canonical_key(graph, 'event1', ['X', 'event3']))
+        self.assertEqual(canonical_form(graph, 'event1', ['G', 'event1']), '3:e4:e0:(G e0)')
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import networkx as nx
+import numpy as np
+
+from src.generator.checker import check_ltl_formula, transition_matrix
+from src.generator.context import generate_random_directed_graph, generate_nodes, generate_context_from_graph
+from src.generator.data import generate_problem
+
+
+class TestTransitionMatrix(TestCase):
+    def test_self_loop_for_sink(self):
+        graph = nx.DiGraph()
+        graph.add_nodes_from(['event1', 'event2'])
+        graph.add_edge('event1', 'event2')
+        matrix = transition_matrix(graph, ['event1', 'event2'])
+        self.assertTrue(matrix[0, 1] and matrix[1, 1])
+        self.assertFalse(matrix[0, 0] or matrix[1, 0])
+
+
+class TestCheckLtlFormula(TestCase):
+    def setUp(self):
+        self.graph = nx.DiGraph()
+        self.graph.add_nodes_from(['event1', 'event2', 'event3'])
+        self.graph.add_edges_from([('event1', 'event3'), ('event1', 'event2'), ('event2', 'event1'),
+                                   ('event2', 'event3')])
+
+    def test_true(self):
+        self.assertTrue(check_ltl_formula(self.graph, 'event3', ['G', ['G', ['event3', '|', 'event3']]]))
+        self.assertTrue(check_ltl_formula(self.graph, 'event2', ['X', ['!', 'event2']]))
+        self.assertTrue(check_ltl_formula(self.graph, 'event2', ['F', ['event1', '|', 'event3']]))
+
+    def test_false(self):
+        self.assertFalse(check_ltl_formula(self.graph, 'event2', 'event3'))
+        self.assertFalse(check_ltl_formula(self.graph, 'event2', ['X', 'event3']))
+        self.assertFalse(check_ltl_formula(self.graph, 'event1', ['G', ['F', 'event1']]))
+
+    def test_nondeterminism_is_universal(self):
+        # both F event2 and its negation can fail on a branching system
+        graph = nx.DiGraph()
+        graph.add_nodes_from(['event1', 'event2'])
+        graph.add_edges_from([('event1', 'event1'), ('event1', 'event2')])
+        self.assertFalse(check_ltl_formula(graph, 'event1', ['F', 'event2']))
+        self.assertFalse(check_ltl_formula(graph, 'event1', ['!', ['F', 'event2']]))
+
+    def test_agrees_with_nusmv(self):
+        # cross-validate against the reference checker over a seed sweep
+        for number_of_events in [2, 3, 4]:
+            for formula_length in [1, 2, 3, 5, 7]:
+                for seed in range(40):
+                    problem = generate_problem(rng=np.random.default_rng(seed), number_of_events=number_of_events,
+                                               formula_length=formula_length, checker='nusmv')
+                    native = generate_problem(rng=np.random.default_rng(seed), number_of_events=number_of_events,
+                                              formula_length=formula_length, checker='native')
+                    self.assertEqual(problem['code'], native['code'])
+                    self.assertEqual(problem['answer'], native['answer'], problem['code'])
+
+    def test_generated_graph(self):
+        rng = np.random.default_rng(1)
+        nodes = generate_nodes(3)
+        graph = generate_random_directed_graph(rng, nodes)
+        generate_context_from_graph(rng, graph)
+        for node in nodes:
+            self.assertTrue(check_ltl_formula(graph, node, [node, '|', ['!', node]]))
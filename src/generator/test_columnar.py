@@ -0,0 +1,48 @@
+import io
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+
+import numpy as np
+import pandas as pd
+
+from src.generator.columnar import decode_problem, encode_problem, read_parquet, write_parquet
+from src.generator.data import generate_problems
+from src.generator.formula import Formula
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+
+class TestColumnar(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        problems = []
+        for _ in range(10):
+            problems += generate_problems(rng=rng, number_of_events=5, formula_length=4, count_of_formulas=4,
+                                          checker='native')
+        # the dataset as read from the CSV format
+        self.data = pd.read_csv(io.StringIO(pd.DataFrame(problems).to_csv(index_label='id')))
+
+    def test_formula_from_str(self):
+        text = '(! (event2 -> (F (event1 | (X event2)))))'
+        self.assertEqual(Formula.from_str(text).to_list(),
+                         ['!', ['event2', '->', ['F', ['event1', '|', ['X', 'event2']]]]])
+        with self.assertRaises(ValueError):
+            Formula.from_str('(F event1) event2')
+
+    def test_round_trip(self):
+        for problem in self.data.to_dict('records'):
+            self.assertEqual(decode_problem(encode_problem(problem)), problem)
+
+    @skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_parquet(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'data.parquet')
+            write_parquet(self.data.to_dict('records'), path, chunk_size=16)
+            pd.testing.assert_frame_equal(read_parquet(path), self.data)
+            pd.testing.assert_frame_equal(read_parquet(path, ['id', 'question']), self.data[['id', 'question']])
+            self.assertLess(os.path.getsize(path), self.data.to_csv(index=False).__len__() / 4)
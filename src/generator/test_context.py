@@ -2,7 +2,8 @@ from unittest import TestCase
 
 import numpy as np
 
-from src.generator.context import generate_random_directed_graph, plot_graph, generate_context_from_graph, code_template
+from src.generator.context import generate_random_directed_graph, plot_graph, generate_context_from_graph, code_template, \
+    generate_nodes, generate_random_packed_graph, PackedGraph
 
 
 class TestGenerateRandomDirectedGraph(TestCase):
@@ -32,6 +33,37 @@ class TestGenerateRandomDirectedGraph(TestCase):
         with self.assertRaises(ValueError):
             generate_random_directed_graph(rng, nodes)
 
+    def test_seed_compatible(self):
+        # the pairwise loop of the original implementation
+        for n in (0, 1, 2, 3, 9, 40):
+            nodes = generate_nodes(n)
+            rng = np.random.default_rng(n)
+            expected = []
+            for i in range(n):
+                for j in range(i + 1, n):
+                    if rng.random() > 0.5:
+                        expected.append((nodes[i], nodes[j]))
+                    if rng.random() > 0.5:
+                        expected.append((nodes[j], nodes[i]))
+            after = rng.random()
+            rng = np.random.default_rng(n)
+            graph = generate_random_directed_graph(rng, nodes)
+            self.assertEqual(sorted(graph.edges), sorted(expected))
+            self.assertEqual(rng.random(), after)
+
+    def test_packed_graph(self):
+        rng = np.random.default_rng(1)
+        nodes = generate_nodes(300)
+        packed = generate_random_packed_graph(rng, nodes, seed_compatible=False)
+        self.assertEqual(packed.bits.shape, (300, 38))
+        matrix = packed.matrix()
+        self.assertFalse(matrix.diagonal().any())
+        self.assertAlmostEqual(matrix.sum() / (300 * 299), 0.5, delta=0.01)
+        graph = packed.to_digraph()
+        self.assertEqual(list(graph.nodes), nodes)
+        self.assertEqual(len(graph.edges), matrix.sum())
+        self.assertEqual(PackedGraph.from_matrix(nodes, matrix).edges(), list(graph.edges))
+
 
 class TestGenerateContextFromGraph(TestCase):
     def test_default(self):
@@ -45,5 +77,47 @@ class TestGenerateContextFromGraph(TestCase):
         context.remove('')
         self.assertTrue(len(context) == len(random_graph.edges))
 
+    def test_every_node_once(self):
+        rng = np.random.default_rng(1)
+        for n in (1, 4, 9, 30):
+            nodes = generate_nodes(n)
+            graph = generate_random_directed_graph(rng, nodes)
+            context = generate_context_from_graph(rng, graph, seed_compatible=False)
+            sentences = [sentence for sentence in context.split('.') if sentence]
+            self.assertEqual(sorted(sentence.split(',')[0].strip() for sentence in sentences),
+                             sorted(f'After {node}' for node in nodes))
+
+    def test_seed_compatible(self):
+        # the traversal of the original implementation, which marks nodes when they are dequeued
+        def original(rng, graph):
+            context = []
+            nodes = sorted(list(graph.nodes))
+            node = rng.choice(nodes)
+            visited = set()
+            queue = [node]
+            while len(queue) > 0:
+                node = queue.pop(0)
+                visited.add(node)
+                neighbors = sorted(list(graph.neighbors(node)))
+                context.append(f'After {node}: {neighbors}')
+                for neighbor in neighbors:
+                    if neighbor not in visited:
+                        queue.append(neighbor)
+                if len(queue) == 0 and len(visited) != len(nodes):
+                    queue.append(sorted(list(set(nodes) - visited))[0])
+            return [sentence.split(':')[0] for sentence in context]
+
+        for seed in range(20):
+            rng = np.random.default_rng(seed)
+            nodes = generate_nodes(int(rng.integers(1, 12)))
+            graph = generate_random_directed_graph(rng, nodes)
+            sparse = graph.copy()
+            sparse.remove_edges_from(list(graph.edges)[::2])
+            for g in (graph, sparse):
+                expected = original(np.random.default_rng(seed), g)
+                context = generate_context_from_graph(np.random.default_rng(seed), g)
+                self.assertEqual([sentence.split(',')[0].strip() for sentence in context.split('.') if sentence],
+                                 expected)
+
 
 
@@ -2,7 +2,7 @@ from unittest import TestCase
 
 import numpy as np
 
-from src.generator.data import generate_problem
+from src.generator.data import generate_problem, generate_problems
 
 
 class Test(TestCase):
@@ -11,3 +11,16 @@ class Test(TestCase):
         problem = generate_problem(rng=rng, number_of_events=3, formula_length=3)
         # hard to test, just print it
         print(problem)
+
+    def test_generate_problems(self):
+        problems = generate_problems(rng=np.random.default_rng(1), number_of_events=3, formula_length=3,
+                                     count_of_formulas=4, checker='native')
+        self.assertEqual(len(problems), 4)
+        self.assertEqual(len(set(problem['context'] for problem in problems)), 1)
+
+    def test_generate_problems_single_formula(self):
+        problem = generate_problem(rng=np.random.default_rng(1), number_of_events=3, formula_length=3,
+                                   checker='native')
+        problems = generate_problems(rng=np.random.default_rng(1), number_of_events=3, formula_length=3,
+                                     count_of_formulas=1, checker='native')
+        self.assertEqual(problems, [problem])
@@ -0,0 +1,63 @@
+from copy import deepcopy
+from unittest import TestCase
+
+import numpy as np
+
+from src.generator.context import generate_nodes
+from src.generator.formula import Formula, FormulaDAG, render_nl, render_nusmv, render_str
+from src.generator.query import generate_formulas, convert_ltl_formula_to_nl, convert_ltl_formula_to_nusmv, \
+    covert_ltl_formula_to_str_formula
+from src.utils.types import ReferenceValue
+
+
+class TestFormulaDAG(TestCase):
+    def test_hash_consing(self):
+        dag = FormulaDAG()
+        left = dag.unary('X', dag.atom('event1'))
+        right = dag.unary('X', dag.atom('event1'))
+        self.assertEqual(left, right)
+        root = dag.binary(left, '&', right)
+        self.assertEqual(len(dag), 3)
+        self.assertEqual(Formula(dag, root).to_list(), [['X', 'event1'], '&', ['X', 'event1']])
+
+    def test_round_trip(self):
+        ltl_formula = ['!', ['event2', '->', ['F', ['event1', '|', 'event2']]]]
+        self.assertEqual(Formula.from_list(ltl_formula).to_list(), ltl_formula)
+
+    def test_shared_subterms(self):
+        rng = np.random.default_rng(1)
+        formulas = generate_formulas(rng=rng, states=generate_nodes(2), formula_length=9, count_of_formulas=200)
+        dag = formulas[0].dag
+        self.assertTrue(all(formula.dag is dag for formula in formulas))
+        self.assertLess(len(dag), 200 * 9)
+
+
+class TestRender(TestCase):
+    def test_render(self):
+        formula = Formula.from_list(['F', ['G', ['!', 'event2']]])
+        self.assertEqual(render_str(formula), '(F (G (! event2)))')
+        self.assertEqual(render_nusmv(formula), '(F (G (! (state=event2))))')
+        self.assertEqual(render_nl(formula, ['event1', 'event2']),
+                         ('C1: Event2 does not happen.\nC2: C1 always holds.\nC3: C2 eventually holds.', 'C3'))
+
+    def test_shared_subterm_cases(self):
+        dag = FormulaDAG()
+        shared = dag.unary('F', dag.unary('X', dag.atom('event1')))
+        formula = Formula(dag, dag.binary(shared, '&', shared))
+        query, last_case = render_nl(formula, ['event1'])
+        self.assertEqual(query.split('\n'), ['C1: Event1 happens in the next state.', 'C2: C1 eventually holds.',
+                                             'C3: C1 eventually holds.', 'C4: C2 holds and C3 holds.'])
+        self.assertEqual(last_case, 'C4')
+
+    def test_agrees_with_list_renderers(self):
+        rng = np.random.default_rng(1)
+        nodes = generate_nodes(3)
+        for formula_length in (1, 3, 5, 9):
+            for formula in generate_formulas(rng=rng, states=nodes, formula_length=formula_length,
+                                             count_of_formulas=50):
+                ltl_formula = formula.to_list()
+                query = ReferenceValue('')
+                last_case = convert_ltl_formula_to_nl(deepcopy(ltl_formula), nodes, ReferenceValue(0), query)
+                self.assertEqual(render_nl(formula, nodes), (query.get().strip(), last_case))
+                self.assertEqual(render_nusmv(formula), convert_ltl_formula_to_nusmv(deepcopy(ltl_formula)))
+                self.assertEqual(render_str(formula), covert_ltl_formula_to_str_formula(ltl_formula))
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from src.generator.shard import shard_quotas, plan_cell, run_shards, merge_shards
+
+
+class TestShard(TestCase):
+    def test_shard_quotas(self):
+        quotas = shard_quotas(count_of_problem=10, shards=3)
+        self.assertEqual(quotas, [(2, 2), (2, 2), (1, 1)])
+        self.assertEqual(shard_quotas(count_of_problem=10, shards=1), [(5, 5)])
+
+    def test_odd_count(self):
+        with self.assertRaises(ValueError):
+            plan_cell(count_of_problem=3, number_of_events=2, number_of_operators=2, random_seed=1)
+
+    def test_balanced(self):
+        cell = plan_cell(count_of_problem=20, number_of_events=3, number_of_operators=2, random_seed=1, shards=3,
+                         checker='native')
+        problems, stats = merge_shards(run_shards(cell))
+        self.assertEqual(stats['accepted'], 20)
+        answers = [problem['answer'] for problem in problems]
+        self.assertEqual(answers, [True] * 10 + [False] * 10)
+
+    def test_independent_of_workers(self):
+        cell = plan_cell(count_of_problem=20, number_of_events=3, number_of_operators=3, random_seed=1, shards=4,
+                         checker='native')
+        self.assertEqual(merge_shards(run_shards(cell, workers=1)), merge_shards(run_shards(cell, workers=3)))
+
+    def test_balanced_sampling(self):
+        cell = plan_cell(count_of_problem=20, number_of_events=3, number_of_operators=5, random_seed=1, shards=2,
+                         checker='native', formulas_per_graph=4, sampling='balanced')
+        problems, stats = merge_shards(run_shards(cell))
+        answers = [problem['answer'] for problem in problems]
+        self.assertEqual(answers, [True] * 10 + [False] * 10)
+        self.assertEqual(stats['candidates'], stats['accepted'] + stats['rejected'])
+        self.assertEqual(merge_shards(run_shards(cell)), (problems, stats))
+
+    def test_deduplicate(self):
+        for sampling in ('rejection', 'balanced'):
+            cell = plan_cell(count_of_problem=20, number_of_events=3, number_of_operators=1, random_seed=1, shards=1,
+                             checker='native', formulas_per_graph=4, sampling=sampling, deduplicate=True)
+            problems, stats = merge_shards(run_shards(cell))
+            self.assertEqual(len({problem['_key'] for problem in problems}), 20)
+            self.assertGreater(stats['duplicates'], 0)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.generator import sampling
+from src.generator.shard import plan_cell, run_shards, merge_shards
+from src.generator.sink import write_cell
+
+
+class Interrupt(Exception):
+    pass
+
+
+class TestSink(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.spool = os.path.join(self.folder.name, 'spool')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _in_memory(self, cell) -> str:
+        # the dataset as written before streaming: one DataFrame at the end
+        problems, _ = merge_shards(run_shards(cell))
+        df = pd.DataFrame(problems)
+        df = df[[col for col in df.columns if not col.startswith('_')]]
+        df.insert(0, 'id', range(len(df)))
+        path = os.path.join(self.folder.name, 'memory.csv')
+        df.to_csv(path, index=False)
+        return path
+
+    def _streamed(self, cell) -> str:
+        run_shards(cell, folder=self.spool)
+        path = os.path.join(self.folder.name, 'streamed.csv')
+        write_cell(self.spool, cell, path)
+        return path
+
+    def assertSameFile(self, first: str, second: str):
+        with open(first, 'rb') as f, open(second, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+
+    def test_same_as_in_memory(self):
+        for sampling_mode in ('rejection', 'balanced'):
+            cell = plan_cell(count_of_problem=40, number_of_events=4, number_of_operators=3, random_seed=1,
+                             shards=2, checker='native', formulas_per_graph=2, sampling=sampling_mode)
+            self.assertSameFile(self._in_memory(cell), self._streamed(cell))
+            self.assertFalse(os.listdir(self.spool))
+
+    def test_resume(self):
+        cell = plan_cell(count_of_problem=600, number_of_events=3, number_of_operators=2, random_seed=1,
+                         checker='native', deduplicate=True)
+        expected = self._in_memory(cell)
+        calls = []
+        generate_problems = sampling.generate_problems
+
+        def interrupted(**kwargs):
+            calls.append(1)
+            if len(calls) == 500:
+                raise Interrupt()
+            return generate_problems(**kwargs)
+
+        with patch.object(sampling, 'generate_problems', interrupted):
+            with self.assertRaises(Interrupt):
+                run_shards(cell, folder=self.spool)
+        # the resumed run starts from the last checkpoint, not from scratch
+        calls.clear()
+        with patch.object(sampling, 'generate_problems', interrupted):
+            _, _, stats = run_shards(cell, folder=self.spool)[0]
+        self.assertLess(len(calls), stats['oracle_calls'] - 400)
+        path = os.path.join(self.folder.name, 'streamed.csv')
+        write_cell(self.spool, cell, path)
+        self.assertSameFile(expected, path)
@@ -1,23 +1,25 @@
 import copy
 import os
-from typing import Dict
+from typing import Dict, Iterator
 
 import backoff
-from openai import OpenAI
-from dotenv import find_dotenv, load_dotenv
 
-from src.models.base_model import BaseModel
+from src.models.base_model import BaseModel, get_prefix
+from src.models.clients import get_async_openai_client, get_openai_client, load_environment
+from src.models.instrument import record_openai_usage, record_retry
+
+BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
 
 class AlibabaModel(BaseModel):
+    # endpoint of the chat completion requests in batch jobs
+    batch_endpoint = '/v1/chat/completions'
 
     def __init__(self):
         super().__init__()
-        load_dotenv(find_dotenv())
-        self.client = OpenAI(
-            api_key=os.getenv("ALIBABA_API_KEY"),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
+        load_environment()
+        self.api_key = os.getenv("ALIBABA_API_KEY")
+        self.client = get_openai_client(self.api_key, BASE_URL)
         self.config = {
             "model": "qwen-plus",
             "temperature": 0,
@@ -27,18 +29,53 @@ class AlibabaModel(BaseModel):
     def reconfig(self, config: Dict[str, any]):
         self.config.update(config)
 
-    @backoff.on_exception(backoff.expo, Exception, max_time=10)
-    def chat(self, message: str) -> str:
-        chat_completion = self.client.chat.completions.create(
-            messages=[{
+    def build_request(self, message: str) -> Dict[str, any]:
+        """
+        :return: arguments of the chat completion request of a message, also the body of its batch request
+        """
+        prefix = get_prefix(message)
+        content = message if prefix is None else [
+            # (the static prefix is cached explicitly, for at least 1024 tokens)
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": message.suffix},
+        ]
+        return {
+            "messages": [{
                 "role": "user",
-                "content": message,
+                "content": content,
             }],
-            temperature=self.config["temperature"],
-            model=self.config["model"],
-            max_tokens=self.config["max_tokens"],
-            extra_body= {"enable_thinking": False} if self.config["model"] in ["qwen3-32b","qwen3-14b"] else {},
-        )
+            "temperature": self.config["temperature"],
+            "model": self.config["model"],
+            "max_tokens": self.config["max_tokens"],
+            "extra_body": {"enable_thinking": False} if self.config["model"] in ["qwen3-32b", "qwen3-14b"] else {},
+        }
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    def chat(self, message: str) -> str:
+        chat_completion = self.client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
+        chat_message = chat_completion.choices[0].message
+        return chat_message.content
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    def _stream(self, message: str):
+        # (the request is sent here, the chunks are read by iterating the stream)
+        return self.client.chat.completions.create(**self.build_request(message), stream=True,
+                                                   stream_options={"include_usage": True})
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        with self._stream(message) as stream:
+            for chunk in stream:
+                # (the usage comes with the last chunk)
+                record_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    async def achat(self, message: str) -> str:
+        client = get_async_openai_client(self.api_key, BASE_URL)
+        chat_completion = await client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
         chat_message = chat_completion.choices[0].message
         return chat_message.content
 
@@ -1,5 +1,42 @@
+import asyncio
+import re
 from abc import ABC, abstractmethod
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator
+
+# an explicit answer, e.g. 'Answer: True' or '**Answer:** False', at which `chat_until` can stop a reasoning response,
+# and the instruction asking for it
+ANSWER_MARKER = re.compile(r'answer\s*\**:\**\s*\**(true|false)\b', re.IGNORECASE)
+ANSWER_INSTRUCTION = "End your response with 'Answer: True' or 'Answer: False'."
+
+
+class Prompt(str):
+    """
+    A prompt made of a static prefix shared by many prompts (e.g. few-shot examples) and a dynamic suffix (e.g. the
+    question). It is the string of the whole prompt, so it is sent, cached and counted as any other message; models
+    whose provider caches prompt prefixes mark or warm its prefix so that it is reused across requests.
+    """
+    prefix: str
+
+    def __new__(cls, prefix: str, suffix: str):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        return prompt
+
+    def __getnewargs__(self):
+        # (so that it is copied and pickled, e.g. by clients that deep-copy their messages)
+        return self.prefix, self.suffix
+
+    @property
+    def suffix(self) -> str:
+        return self[len(self.prefix):]
+
+
+def get_prefix(message: str) -> str | None:
+    """
+    :return: the static prefix of a message, None if it has none
+    """
+    return message.prefix if isinstance(message, Prompt) and message.prefix else None
 
 
 class BaseModel(ABC):
@@ -10,6 +47,51 @@ class BaseModel(ABC):
     def chat(self, message: str) -> str:
         pass
 
+    async def achat(self, message: str) -> str:
+        """
+        Chat without blocking the event loop, by default `chat` in a worker thread
+        """
+        return await asyncio.to_thread(self.chat, message)
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        """
+        Draw `n` responses to the same message at once, by default with `n` concurrent `chat` requests
+        """
+        if n == 1:
+            return [self.chat(message)]
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            return list(executor.map(self.chat, [message] * n))
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        """
+        Stream the response to a message in chunks, by default the response of `chat` as one chunk.
+        Closing the stream stops the request.
+        """
+        yield self.chat(message)
+
+    def chat_until(self, message: str, stop: re.Pattern) -> str:
+        """
+        Chat, streaming the response until `stop` matches it, and stop the request there, so the model generates no
+        more tokens. A match is only accepted once more text follows it, as a match at the end of the text received
+        so far could still grow.
+
+        :param message: message
+        :param stop: pattern ending the response, e.g. an explicit answer
+        :return: the response up to the end of the first match of `stop`, or the whole response without a match
+        """
+        text = ''
+        stream = self.chat_stream(message)
+        try:
+            for chunk in stream:
+                text += chunk
+                match = stop.search(text)
+                if match is not None and match.end() < len(text):
+                    return text[:match.end()]
+        finally:
+            stream.close()
+        match = stop.search(text)
+        return text[:match.end()] if match is not None else text
+
     @abstractmethod
     def reconfig(self, config: Dict[str, any]):
         pass
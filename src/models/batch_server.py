@@ -0,0 +1,129 @@
+import email
+import email.policy
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+
+def echo_response(body: Dict[str, any]) -> str:
+    """
+    :return: the last line of the prompt
+    """
+    return body['messages'][-1]['content'].strip().splitlines()[-1]
+
+
+class LocalBatchServer:
+    """
+    A local stand-in for the files and batches endpoints of an OpenAI-compatible API, to use the batch mode
+    without network access. A batch completes after `polls` retrievals and answers every request with `respond`.
+    Use it as a context manager and point the client at `base_url`.
+    """
+
+    def __init__(self, respond: Callable[[Dict[str, any]], str] = echo_response, polls: int = 0):
+        self.respond = respond
+        self.polls = polls
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, dict] = {}
+        self._polls: Dict[str, int] = {}
+        self._outputs: Dict[str, str] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _add_file(self, content: bytes, purpose: str) -> dict:
+        file_id = f'file-{next(self._ids)}'
+        self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': f'{file_id}.jsonl', 'purpose': purpose, 'status': 'processed'}
+
+    def _create_batch(self, request: dict) -> dict:
+        lines = []
+        for line in self.files[request['input_file_id']].decode().splitlines():
+            item = json.loads(line)
+            completion = {'id': f'chatcmpl-{next(self._ids)}', 'object': 'chat.completion',
+                          'created': int(time.time()), 'model': item['body']['model'],
+                          'choices': [{'index': 0, 'finish_reason': 'stop',
+                                       'message': {'role': 'assistant', 'content': self.respond(item['body'])}}]}
+            lines.append(json.dumps({'id': f'batch_req_{next(self._ids)}', 'custom_id': item['custom_id'],
+                                     'response': {'status_code': 200, 'body': completion}, 'error': None}))
+        output = self._add_file('\n'.join(lines).encode() + b'\n', 'batch_output')
+        batch_id = f'batch_{next(self._ids)}'
+        self.batches[batch_id] = {
+            'id': batch_id, 'object': 'batch', 'endpoint': request['endpoint'],
+            'input_file_id': request['input_file_id'], 'completion_window': request['completion_window'],
+            'status': 'in_progress', 'created_at': int(time.time()), 'output_file_id': None, 'error_file_id': None,
+            'request_counts': {'total': len(lines), 'completed': 0, 'failed': 0},
+        }
+        self._polls[batch_id] = 0
+        self._outputs[batch_id] = output['id']
+        return self._retrieve_batch(batch_id, poll=False)
+
+    def _retrieve_batch(self, batch_id: str, poll: bool = True) -> dict:
+        batch = self.batches[batch_id]
+        if poll:
+            self._polls[batch_id] += 1
+        if batch['status'] == 'in_progress' and self._polls[batch_id] > self.polls:
+            batch['status'] = 'completed'
+            batch['output_file_id'] = self._outputs[batch_id]
+            batch['request_counts']['completed'] = batch['request_counts']['total']
+        return batch
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_POST(self):
+                with server._lock:
+                    if self.path == '/v1/files':
+                        # multipart form with the fields `purpose` and `file`
+                        message = email.message_from_bytes(
+                            f'Content-Type: {self.headers["Content-Type"]}\r\n\r\n'.encode() + self._body(),
+                            policy=email.policy.HTTP)
+                        fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                                  for part in message.iter_parts()}
+                        response = server._add_file(fields['file'], fields['purpose'].decode())
+                    elif self.path == '/v1/batches':
+                        response = server._create_batch(json.loads(self._body()))
+                    else:
+                        return self._send(404, b'{"error": {"message": "not found"}}')
+                self._send(200, json.dumps(response).encode())
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                with server._lock:
+                    if parts[:2] == ['v1', 'batches'] and len(parts) == 3 and parts[2] in server.batches:
+                        return self._send(200, json.dumps(server._retrieve_batch(parts[2])).encode())
+                    if parts[:2] == ['v1', 'files'] and parts[3:] == ['content'] and parts[2] in server.files:
+                        return self._send(200, server.files[parts[2]], 'application/octet-stream')
+                self._send(404, b'{"error": {"message": "not found"}}')
+
+        return Handler
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from src.models.clients import close_async_clients
+from src.models.ollama_parallel_model import OllamaDispatcher
+from src.models.ollama_server import LocalOllamaServer
+
+
+def benchmark_ollama(list_of_concurrency: list[int], requests: int = 64, latency: float = 0.05,
+                     num_parallel: int = 4) -> list[dict]:
+    """
+    Measure the throughput of the Ollama dispatcher against a local stand-in server for growing numbers of
+    requests in flight
+
+    :param list_of_concurrency: numbers of requests in flight
+    :param requests: number of requests per run
+    :param latency: seconds the server takes per request
+    :param num_parallel: number of requests the server processes in parallel
+    :return: one row per number of requests in flight with the time in seconds and the requests per second
+    """
+    rows = []
+    with LocalOllamaServer(latency=latency, num_parallel=num_parallel) as server:
+        for concurrency in list_of_concurrency:
+            dispatcher = OllamaDispatcher(server.host, 'stub', concurrency, '30m')
+
+            async def run():
+                try:
+                    await asyncio.gather(*(dispatcher.achat({'model': 'stub', 'messages': [
+                        {'role': 'user', 'content': str(i)}]}) for i in range(requests)))
+                finally:
+                    await close_async_clients()
+
+            start = time.perf_counter()
+            asyncio.run(run())
+            seconds = time.perf_counter() - start
+            rows.append({
+                'concurrency': concurrency,
+                'requests': requests,
+                'seconds': seconds,
+                'requests_per_second': requests / seconds,
+            })
+    return rows
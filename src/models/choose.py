@@ -1,5 +1,6 @@
 from src.models.base_model import BaseModel
 from src.models.ollama_model import OllamaModel
+from src.models.ollama_parallel_model import OllamaParallelModel
 from src.models.openai_model import OpenAIModel
 from src.models.deepseek_model import DeepSeekModel
 from src.models.alibaba_model import AlibabaModel
@@ -20,6 +21,11 @@ def choose_model(model_name: str) -> BaseModel:
         model = OllamaModel()
         model.reconfig({"model": model_name})
         return model
+    elif model_name.startswith("local/"):
+        # any Ollama model, with parallel requests to the local server
+        model = OllamaParallelModel()
+        model.reconfig({"model": model_name.removeprefix("local/")})
+        return model
     elif model_name in ["deepseek-chat", "deepseek-reasoner"]:
         model = DeepSeekModel()
         model.reconfig({"model": model_name})
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Callable, Dict
+
+from dotenv import find_dotenv, load_dotenv
+from ollama import AsyncClient, Client
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from src.models.instrument import arecord_first_byte, record_first_byte
+
+# Clients are shared by all models of the process: their HTTP connection pools keep the connections to a
+# provider alive between requests, instead of opening new sockets for every model object.
+# Asynchronous clients are bound to the event loop they are used on, so they are shared per loop.
+# The clients record the time to the first byte of the calls of an `InstrumentedModel`.
+_CLIENTS: Dict[tuple, object] = {}
+_ASYNC_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_CLIENTS_LOCK = threading.Lock()
+
+
+@functools.cache
+def load_environment():
+    """
+    Load the `.env` file, once per process
+    """
+    load_dotenv(find_dotenv())
+
+
+def _get_client(key: tuple, create: Callable[[], object]):
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = create()
+        return _CLIENTS[key]
+
+
+def _get_async_client(key: tuple, create: Callable[[], object]):
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        if key not in clients:
+            clients[key] = create()
+        return clients[key]
+
+
+def get_openai_client(api_key: str, base_url: str = None) -> OpenAI:
+    """
+    Get the client of an OpenAI-compatible API shared by all models of this process
+
+    :param api_key: API key
+    :param base_url: URL of the API, OpenAI by default
+    :return: the client
+    """
+    return _get_client(('openai', api_key, base_url), lambda: OpenAI(
+        api_key=api_key, base_url=base_url,
+        http_client=DefaultHttpxClient(event_hooks={'response': [record_first_byte]})))
+
+
+def get_async_openai_client(api_key: str, base_url: str = None) -> AsyncOpenAI:
+    """
+    Get the asynchronous client of an OpenAI-compatible API shared by all models on the running event loop
+
+    :param api_key: API key
+    :param base_url: URL of the API, OpenAI by default
+    :return: the client
+    """
+    return _get_async_client(('openai', api_key, base_url), lambda: AsyncOpenAI(
+        api_key=api_key, base_url=base_url,
+        http_client=DefaultAsyncHttpxClient(event_hooks={'response': [arecord_first_byte]})))
+
+
+def get_ollama_client(host: str) -> Client:
+    """
+    Get the client of an Ollama server shared by all models of this process
+
+    :param host: URL of the server
+    :return: the client
+    """
+    return _get_client(('ollama', host), lambda: Client(
+        host=host, event_hooks={'response': [record_first_byte]}))
+
+
+def get_async_ollama_client(host: str) -> AsyncClient:
+    """
+    Get the asynchronous client of an Ollama server shared by all models on the running event loop
+
+    :param host: URL of the server
+    :return: the client
+    """
+    return _get_async_client(('ollama', host), lambda: AsyncClient(
+        host=host, event_hooks={'response': [arecord_first_byte]}))
+
+
+async def close_async_clients():
+    """
+    Close the asynchronous clients of the running event loop, before the loop is closed
+    """
+    with _CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for (kind, *_), client in clients.items():
+        if kind == 'ollama':
+            # (the Ollama client of the pinned version has no `close`, its HTTP client is closed instead)
+            await client._client.aclose()
+        else:
+            await client.close()
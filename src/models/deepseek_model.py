@@ -1,23 +1,22 @@
 import copy
 import os
-from typing import Dict
+from typing import Dict, Iterator
 
 import backoff
-from openai import OpenAI
-from dotenv import find_dotenv, load_dotenv
 
 from src.models.base_model import BaseModel
+from src.models.clients import get_async_openai_client, get_openai_client, load_environment
+from src.models.instrument import record_openai_usage, record_retry
 
+BASE_URL = "https://api.deepseek.com"
 
-class DeepSeekModel(BaseModel):
 
+class DeepSeekModel(BaseModel):
     def __init__(self):
         super().__init__()
-        load_dotenv(find_dotenv())
-        self.client = OpenAI(
-            api_key=os.getenv("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com"
-        )
+        load_environment()
+        self.api_key = os.getenv("DEEPSEEK_API_KEY")
+        self.client = get_openai_client(self.api_key, BASE_URL)
         self.config = {
             "model": "deepseek-chat",
             "temperature": 0,
@@ -27,17 +26,46 @@ class DeepSeekModel(BaseModel):
     def reconfig(self, config: Dict[str, any]):
         self.config.update(config)
 
-    @backoff.on_exception(backoff.expo, Exception, max_time=10)
-    def chat(self, message: str) -> str:
-        chat_completion = self.client.chat.completions.create(
-            messages=[{
+    def build_request(self, message: str) -> Dict[str, any]:
+        """
+        :return: arguments of the chat completion request of a message
+        """
+        return {
+            "messages": [{
                 "role": "user",
                 "content": message,
             }],
-            temperature=self.config["temperature"],
-            model=self.config["model"],
-            max_tokens=self.config["max_tokens"],
-        )
+            "temperature": self.config["temperature"],
+            "model": self.config["model"],
+            "max_tokens": self.config["max_tokens"],
+        }
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    def chat(self, message: str) -> str:
+        chat_completion = self.client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
+        chat_message = chat_completion.choices[0].message
+        return chat_message.content
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    def _stream(self, message: str):
+        # (the request is sent here, the chunks are read by iterating the stream)
+        return self.client.chat.completions.create(**self.build_request(message), stream=True,
+                                                   stream_options={"include_usage": True})
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        with self._stream(message) as stream:
+            for chunk in stream:
+                # (the usage comes with the last chunk)
+                record_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @backoff.on_exception(backoff.expo, Exception, max_time=10, on_backoff=record_retry)
+    async def achat(self, message: str) -> str:
+        client = get_async_openai_client(self.api_key, BASE_URL)
+        chat_completion = await client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
         chat_message = chat_completion.choices[0].message
         return chat_message.content
 
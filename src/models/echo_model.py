@@ -0,0 +1,22 @@
+from typing import Dict
+
+from src.models.base_model import BaseModel
+
+
+class EchoModel(BaseModel):
+    """
+    A model answering with its prompt, a stand-in for a provider in tests
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.config = {'max_tokens': 10}
+
+    def chat(self, message: str) -> str:
+        return message
+
+    def reconfig(self, config: Dict[str, any]):
+        self.config.update(config)
+
+    def get_model_name(self) -> str:
+        return 'echo'
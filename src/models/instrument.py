@@ -0,0 +1,252 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from src.models.base_model import BaseModel
+
+# the record of the call in progress, filled by the models, their retries and their HTTP clients
+_CALL: ContextVar[dict | None] = ContextVar('call', default=None)
+
+
+def record_retry(details: dict = None):
+    """
+    Count a retry of the call in progress, an `on_backoff` handler for the `backoff` decorators
+    """
+    call = _CALL.get()
+    if call is not None:
+        call['retries'] += 1
+
+
+def record_usage(prompt_tokens: int | None, completion_tokens: int | None, cached_tokens: int = None):
+    """
+    Record the tokens of the call in progress, as counted by the provider, with the prompt tokens read from its
+    prompt cache if it reports them
+    """
+    call = _CALL.get()
+    if call is not None:
+        call['prompt_tokens'] = (call['prompt_tokens'] or 0) + (prompt_tokens or 0)
+        call['completion_tokens'] = (call['completion_tokens'] or 0) + (completion_tokens or 0)
+        if cached_tokens is not None:
+            call['cached_tokens'] = (call['cached_tokens'] or 0) + cached_tokens
+
+
+def record_openai_usage(chat_completion):
+    """
+    Record the tokens of a chat completion of an OpenAI-compatible API
+    """
+    usage = getattr(chat_completion, 'usage', None)
+    if usage is not None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None)
+        if cached_tokens is None:
+            # (DeepSeek)
+            cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+        record_usage(usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+
+
+def record_ollama_usage(chat_completion):
+    """
+    Record the tokens of a chat response of Ollama. Ollama reports no cached tokens, but the prompt tokens it counts
+    are the ones it evaluated, without the prefix reused from its cache.
+    """
+    record_usage(chat_completion.get('prompt_eval_count'), chat_completion.get('eval_count'))
+
+
+def record_first_byte(response=None):
+    """
+    Record the time to the first byte (the response headers) of the call in progress, an httpx response hook
+    """
+    call = _CALL.get()
+    if call is not None:
+        # (of the last attempt)
+        call['ttfb'] = time.perf_counter() - call['_start']
+
+
+async def arecord_first_byte(response=None):
+    record_first_byte(response)
+
+
+def get_calls_path(eval_path: str) -> str:
+    """
+    :return: path of the call records of an evaluation, next to its evaluation file
+    """
+    return os.path.splitext(eval_path)[0] + '.calls.jsonl'
+
+
+class CallLog:
+    """
+    An append-only JSONL file of call records, shared by the threads of an evaluation
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class InstrumentedModel(BaseModel):
+    """
+    A model that records every call: its latency, time to first byte, tokens, retries and error, with the given
+    fields (e.g. the strategy and the problem id)
+    """
+
+    def __init__(self, llm: BaseModel, log: CallLog, **fields):
+        super().__init__()
+        self.llm = llm
+        self.log = log
+        self.fields = fields
+
+    @property
+    def config(self) -> Dict[str, any]:
+        return self.llm.config
+
+    def _start(self, samples: int = 1) -> dict:
+        return {'model': self.llm.get_model_name(), **self.fields, 'time': time.time(), 'latency': None,
+                'ttfb': None, 'prompt_tokens': None, 'completion_tokens': None, 'cached_tokens': None, 'retries': 0,
+                'samples': samples,
+                'error': None, '_start': time.perf_counter()}
+
+    def _finish(self, call: dict, error: BaseException = None):
+        call['latency'] = time.perf_counter() - call.pop('_start')
+        if error is not None:
+            call['error'] = f'{type(error).__name__}: {error}'
+        self.log.write(call)
+
+    def chat(self, message: str) -> str:
+        call = self._start()
+        token = _CALL.set(call)
+        try:
+            response = self.llm.chat(message)
+        except Exception as e:
+            self._finish(call, e)
+            raise
+        finally:
+            _CALL.reset(token)
+        self._finish(call)
+        return response
+
+    def chat_until(self, message: str, stop: re.Pattern) -> str:
+        call = self._start()
+        token = _CALL.set(call)
+        try:
+            response = self.llm.chat_until(message, stop)
+        except Exception as e:
+            self._finish(call, e)
+            raise
+        finally:
+            _CALL.reset(token)
+        self._finish(call)
+        return response
+
+    async def achat(self, message: str) -> str:
+        call = self._start()
+        token = _CALL.set(call)
+        try:
+            response = await self.llm.achat(message)
+        except Exception as e:
+            self._finish(call, e)
+            raise
+        finally:
+            _CALL.reset(token)
+        self._finish(call)
+        return response
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        if type(self.llm).chat_samples is BaseModel.chat_samples:
+            # (one call per sample)
+            return super().chat_samples(message, n)
+        call = self._start(samples=n)
+        token = _CALL.set(call)
+        try:
+            responses = self.llm.chat_samples(message, n)
+        except Exception as e:
+            self._finish(call, e)
+            raise
+        finally:
+            _CALL.reset(token)
+        self._finish(call)
+        return responses
+
+    def reconfig(self, config: Dict[str, any]):
+        self.llm.reconfig(config)
+
+    def get_model_name(self) -> str:
+        return self.llm.get_model_name()
+
+
+def read_calls(paths: Iterable[str]) -> pd.DataFrame:
+    """
+    Read call records
+
+    :param paths: call record files or folders searched recursively for them
+    :return: DataFrame with one row per call
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '**', '*.calls.jsonl'), recursive=True))
+        else:
+            files.append(path)
+    records = []
+    for file in files:
+        with open(file) as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    return pd.DataFrame(records)
+
+
+def summarize_calls(calls: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize call records per model and strategy: latency and time to first byte percentiles in seconds,
+    tokens, the fraction of the prompt tokens read from the prompt cache of the provider (of the calls whose provider
+    reports it), retries, errors and throughput (calls and completion tokens per second of wall-clock time)
+
+    :param calls: DataFrame from `read_calls`
+    :return: DataFrame with one row per model and strategy
+    """
+    rows = []
+    for (model, strategy), group in calls.groupby(['model', 'strategy'], dropna=False):
+        latency = group['latency'].to_numpy(dtype=float)
+        ttfb = group['ttfb'].dropna().to_numpy(dtype=float)
+        wall = (group['time'] + group['latency']).max() - group['time'].min()
+        completion_tokens = group['completion_tokens'].fillna(0).sum()
+        reported = group[group['cached_tokens'].notna()] if 'cached_tokens' in group else group.iloc[:0]
+        reported_tokens = reported['prompt_tokens'].fillna(0).sum()
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        rows.append({
+            'model': model,
+            'strategy': strategy,
+            'calls': len(group),
+            'errors': int(group['error'].notna().sum()),
+            'retries': int(group['retries'].sum()),
+            'latency_p50': p50,
+            'latency_p95': p95,
+            'latency_p99': p99,
+            'ttfb_p50': np.percentile(ttfb, 50) if len(ttfb) else np.nan,
+            'prompt_tokens': int(group['prompt_tokens'].fillna(0).sum()),
+            'completion_tokens': int(completion_tokens),
+            'cached_fraction': reported['cached_tokens'].sum() / reported_tokens if reported_tokens else np.nan,
+            'calls_per_second': len(group) / wall if wall > 0 else np.nan,
+            'tokens_per_second': completion_tokens / wall if wall > 0 else np.nan,
+        })
+    return pd.DataFrame(rows)
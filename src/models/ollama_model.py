@@ -1,19 +1,19 @@
+import contextlib
 import copy
 import os
-from typing import Dict
-import ollama
-from ollama import Client
-from dotenv import find_dotenv, load_dotenv
+from typing import Dict, Iterator
 
 from src.models.base_model import BaseModel
+from src.models.clients import get_async_ollama_client, get_ollama_client
+from src.models.instrument import record_ollama_usage
 
 
 class OllamaModel(BaseModel):
 
     def __init__(self):
         super().__init__()
-        ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
-        self.client = Client(host=ollama_url)
+        self.host = os.getenv("OLLAMA_URL", "http://localhost:11434")
+        self.client = get_ollama_client(self.host)
 
         self.config = {
             "model": "gemma:7b-instruct",
@@ -21,18 +21,39 @@ class OllamaModel(BaseModel):
             "max_tokens": 20,
         }
 
-    def chat(self, message: str) -> str:
-        chat_completion = self.client.chat(
-            messages=[{
+    def _request(self, message: str) -> Dict[str, any]:
+        return {
+            "messages": [{
                 "role": "user",
                 "content": message
             }],
-            model=self.config["model"],
-            options={
+            "model": self.config["model"],
+            "options": {
                 "temperature": self.config["temperature"],
                 "num_predict": self.config["max_tokens"]
             }
-        )
+        }
+
+    def chat(self, message: str) -> str:
+        chat_completion = self.client.chat(**self._request(message))
+        record_ollama_usage(chat_completion)
+        chat_message = chat_completion["message"]["content"]
+        return chat_message
+
+    def _stream(self, message: str) -> Iterator:
+        return self.client.chat(**self._request(message), stream=True)
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        with contextlib.closing(self._stream(message)) as stream:
+            for chunk in stream:
+                if chunk.get("done"):
+                    record_ollama_usage(chunk)
+                if chunk["message"]["content"]:
+                    yield chunk["message"]["content"]
+
+    async def achat(self, message: str) -> str:
+        chat_completion = await get_async_ollama_client(self.host).chat(**self._request(message))
+        record_ollama_usage(chat_completion)
         chat_message = chat_completion["message"]["content"]
         return chat_message
 
@@ -0,0 +1,181 @@
+import asyncio
+import contextlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterator
+
+from src.models.base_model import get_prefix
+from src.models.clients import get_async_ollama_client, get_ollama_client
+from src.models.instrument import record_ollama_usage
+from src.models.ollama_model import OllamaModel
+
+# prefixes whose evaluation a dispatcher remembers, the most recently used ones
+MAX_WARMED = 1024
+
+
+class OllamaDispatcher:
+    """
+    Queues the requests to one model of an Ollama server and keeps `num_parallel` of them in flight, the number of
+    requests the server processes in parallel (`OLLAMA_NUM_PARALLEL` of the server). The model is loaded before the
+    first request and kept loaded for `keep_alive` after the last one. The static prefix of a prompt (see `Prompt`) is
+    evaluated once before the first request with it, so that the server reuses it from its cached contexts and only
+    evaluates the suffix of every prompt. The requests with a prefix being evaluated wait for it, the others do not.
+    """
+
+    def __init__(self, host: str, model: str, num_parallel: int, keep_alive: str):
+        self.host = host
+        self.model = model
+        self.num_parallel = num_parallel
+        self.keep_alive = keep_alive
+        self._threads = threading.Semaphore(num_parallel)
+        self._slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        # (done once the model is loaded, None before the first request)
+        self._loaded: Future | None = None
+        # prefix -> done once the prefix is evaluated, the most recently used last
+        self._warmed: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _claim(self, prefix: str = None) -> tuple[Future, bool]:
+        # the future of the model load (without prefix) or of the evaluation of a prefix, and whether the caller is
+        # the first one, which sends its request while the others wait for it
+        with self._lock:
+            future = self._loaded if prefix is None else self._warmed.get(prefix)
+            if future is not None:
+                if prefix is not None:
+                    self._warmed.move_to_end(prefix)
+                return future, False
+            future = Future()
+            if prefix is None:
+                self._loaded = future
+            else:
+                self._warmed[prefix] = future
+                if len(self._warmed) > MAX_WARMED:
+                    self._warmed.popitem(last=False)
+            return future, True
+
+    @contextlib.contextmanager
+    def _settle(self, future: Future, prefix: str = None):
+        # (the waiting requests go on once the request is done; after a failure, the next request sends it again)
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                if prefix is None:
+                    self._loaded = None
+                elif self._warmed.get(prefix) is future:
+                    del self._warmed[prefix]
+            raise
+        finally:
+            future.set_result(None)
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        return self._slots.setdefault(asyncio.get_running_loop(), asyncio.Semaphore(self.num_parallel))
+
+    def _warm_request(self, request: Dict[str, any], prefix: str) -> Dict[str, any]:
+        # (a request with only the prefix, generating one token)
+        return {"model": self.model, "messages": [{"role": "user", "content": prefix}],
+                "options": {**request["options"], "num_predict": 1}, "keep_alive": self.keep_alive}
+
+    def _load(self):
+        future, first = self._claim()
+        if not first:
+            future.result()
+            return
+        with self._settle(future):
+            # (a request without prompt only loads the model)
+            get_ollama_client(self.host).generate(model=self.model, keep_alive=self.keep_alive)
+
+    def _warm(self, request: Dict[str, any], prefix: str | None):
+        self._load()
+        if prefix is None:
+            return
+        future, first = self._claim(prefix)
+        if not first:
+            future.result()
+            return
+        with self._settle(future, prefix), self._threads:
+            get_ollama_client(self.host).chat(**self._warm_request(request, prefix))
+
+    async def _awarm(self, request: Dict[str, any], prefix: str | None):
+        # (on the loop, as its worker threads may all be waiting for requests sent on it)
+        client = get_async_ollama_client(self.host)
+        for key in [None] if prefix is None else [None, prefix]:
+            future, first = self._claim(key)
+            if not first:
+                if not future.done():
+                    await asyncio.wrap_future(future)
+                continue
+            with self._settle(future, key):
+                if key is None:
+                    await client.generate(model=self.model, keep_alive=self.keep_alive)
+                else:
+                    async with self._loop_slots():
+                        await client.chat(**self._warm_request(request, key))
+
+    def chat(self, request: Dict[str, any], prefix: str = None):
+        self._warm(request, prefix)
+        with self._threads:
+            return get_ollama_client(self.host).chat(**request, keep_alive=self.keep_alive)
+
+    def stream(self, request: Dict[str, any], prefix: str = None) -> Iterator:
+        self._warm(request, prefix)
+        # (the request stays in flight until the stream is read or closed)
+        with self._threads:
+            with contextlib.closing(get_ollama_client(self.host).chat(**request, stream=True,
+                                                                      keep_alive=self.keep_alive)) as stream:
+                yield from stream
+
+    async def achat(self, request: Dict[str, any], prefix: str = None):
+        await self._awarm(request, prefix)
+        async with self._loop_slots():
+            return await get_async_ollama_client(self.host).chat(**request, keep_alive=self.keep_alive)
+
+
+_DISPATCHERS: Dict[tuple, OllamaDispatcher] = {}
+_DISPATCHERS_LOCK = threading.Lock()
+
+
+def get_dispatcher(host: str, model: str, num_parallel: int = None, keep_alive: str = None) -> OllamaDispatcher:
+    """
+    Get the dispatcher of a model of an Ollama server shared by all models of this process
+
+    :param host: URL of the server
+    :param model: model name
+    :param num_parallel: requests in flight, by default `OLLAMA_NUM_PARALLEL` from the environment or 4
+    :param keep_alive: how long the model stays loaded, by default `OLLAMA_KEEP_ALIVE` from the environment or 30m
+    :return: the dispatcher
+    """
+    with _DISPATCHERS_LOCK:
+        if (host, model) not in _DISPATCHERS:
+            _DISPATCHERS[(host, model)] = OllamaDispatcher(
+                host, model,
+                num_parallel or int(os.getenv('OLLAMA_NUM_PARALLEL', '4') or 4),
+                keep_alive or os.getenv('OLLAMA_KEEP_ALIVE', '30m') or '30m')
+        return _DISPATCHERS[(host, model)]
+
+
+class OllamaParallelModel(OllamaModel):
+    """
+    An Ollama model whose requests are queued by the dispatcher of its model, so that concurrent evaluations
+    keep the server busy with parallel requests. Its name is the Ollama model name prefixed with 'local/'.
+    """
+    # (same provider as `OllamaModel`, for rate limits and the response cache)
+    provider = 'OLLAMA'
+
+    def chat(self, message: str) -> str:
+        chat_completion = get_dispatcher(self.host, self.config["model"]).chat(self._request(message),
+                                                                               get_prefix(message))
+        record_ollama_usage(chat_completion)
+        return chat_completion["message"]["content"]
+
+    def _stream(self, message: str) -> Iterator:
+        return get_dispatcher(self.host, self.config["model"]).stream(self._request(message), get_prefix(message))
+
+    async def achat(self, message: str) -> str:
+        chat_completion = await get_dispatcher(self.host, self.config["model"]).achat(self._request(message),
+                                                                                      get_prefix(message))
+        record_ollama_usage(chat_completion)
+        return chat_completion["message"]["content"]
@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator
+
+from src.models.batch_server import echo_response
+
+
+class LocalOllamaServer:
+    """
+    A local stand-in for the chat endpoint of an Ollama server, to test and benchmark without a model. It processes
+    `num_parallel` requests in parallel, each taking `latency` seconds, queues the others, and answers with
+    `respond`, by default the last line of the prompt. Streamed responses are sent word by word, every word taking
+    `token_latency` seconds, and stop when the client closes the stream. As a server reusing its cached contexts, it
+    keeps the last `num_parallel` prompts and counts as prompt tokens (words) only the ones after the longest prefix
+    shared with one of them.
+    Use it as a context manager and point the client at `host`.
+    """
+
+    def __init__(self, latency: float = 0.05, num_parallel: int = 4,
+                 respond: Callable[[Dict[str, any]], str] = echo_response, token_latency: float = 0.0):
+        self.latency = latency
+        self.num_parallel = num_parallel
+        self.respond = respond
+        self.token_latency = token_latency
+        self.requests = 0
+        self.streamed = 0
+        self.contexts = []
+        self.loads = 0
+        self.peak = 0
+        self._active = 0
+        self._slots = threading.Semaphore(num_parallel)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _evaluate_prompt(self, request: dict) -> int:
+        prompt = ''.join(message['content'] for message in request['messages'])
+        with self._lock:
+            shared = max((len(os.path.commonprefix([prompt, context])) for context in self.contexts), default=0)
+            self.contexts = (self.contexts + [prompt])[-self.num_parallel:]
+        return len(prompt[shared:].split())
+
+    def _process(self, request: dict) -> Iterator[dict]:
+        # the chunks of the response, the last one with the whole response unless streamed
+        prompt_tokens = self._evaluate_prompt(request)
+        with self._slots:
+            with self._lock:
+                self._active += 1
+                self.peak = max(self.peak, self._active)
+            try:
+                time.sleep(self.latency)
+                content = self.respond(request)
+                words = re.findall(r'\S+\s*', content)
+                if request.get('stream'):
+                    for word in words:
+                        time.sleep(self.token_latency)
+                        yield {'model': request['model'], 'created_at': datetime.now(timezone.utc).isoformat(),
+                               'message': {'role': 'assistant', 'content': word}, 'done': False}
+                        with self._lock:
+                            self.streamed += 1
+                    content = ''
+                else:
+                    time.sleep(self.token_latency * len(words))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self.requests += 1
+        yield {'model': request['model'], 'created_at': datetime.now(timezone.utc).isoformat(),
+               'message': {'role': 'assistant', 'content': content}, 'done': True, 'done_reason': 'stop',
+               # (words as tokens)
+               'prompt_eval_count': prompt_tokens, 'eval_count': len(words)}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # (the headers and the body are written separately)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _stream(self, chunks: Iterator[dict]):
+                # (newline-delimited JSON with chunked transfer encoding)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        line = json.dumps(chunk).encode() + b'\n'
+                        self.wfile.write(f'{len(line):X}\r\n'.encode() + line + b'\r\n')
+                        self.wfile.flush()
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client closed the stream
+                    self.close_connection = True
+                finally:
+                    chunks.close()
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if self.path == '/api/chat' and request.get('stream'):
+                    return self._stream(server._process(request))
+                if self.path == '/api/chat':
+                    *_, response = server._process(request)
+                elif self.path == '/api/generate':
+                    # a request without prompt loads the model
+                    with server._lock:
+                        server.loads += 1
+                    response = {'model': request['model'], 'created_at': datetime.now(timezone.utc).isoformat(),
+                                'response': '', 'done': True}
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -1,19 +1,25 @@
 import copy
+import hashlib
 import os
-from typing import Dict
+from typing import Dict, Iterator
 
 import backoff
 import openai
-from openai import OpenAI
 
-from src.models.base_model import BaseModel
+from src.models.base_model import BaseModel, get_prefix
+from src.models.clients import get_async_openai_client, get_openai_client
+from src.models.instrument import record_openai_usage, record_retry
 
 
 class OpenAIModel(BaseModel):
+    # endpoint of the chat completion requests in batch jobs
+    batch_endpoint = '/v1/chat/completions'
 
     def __init__(self):
         super().__init__()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.base_url = os.getenv("OPENAI_BASE_URL")
+        self.client = get_openai_client(self.api_key, self.base_url)
         self.config = {
             "model": "gpt-3.5-turbo",
             "temperature": 0,
@@ -27,27 +33,59 @@ class OpenAIModel(BaseModel):
             config = {k: v for k, v in config.items() if k != "temperature"}
         self.config.update(config)
 
-    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_time=10)
-    def chat(self, message: str) -> str:
+    def build_request(self, message: str) -> Dict[str, any]:
+        """
+        :return: arguments of the chat completion request of a message, also the body of its batch request
+        """
+        request = {
+            "messages": [{
+                "role": "user",
+                "content": message,
+            }],
+            "model": self.config["model"],
+            "max_completion_tokens": self.config["max_tokens"],
+        }
         if not self.config["model"].startswith("gpt-5"):
-            chat_completion = self.client.chat.completions.create(
-                messages=[{
-                    "role": "user",
-                    "content": message,
-                }],
-                temperature=self.config["temperature"],
-                model=self.config["model"],
-                max_completion_tokens=self.config["max_tokens"],
-            )
-        else:
-            chat_completion = self.client.chat.completions.create(
-                messages=[{
-                    "role": "user",
-                    "content": message,
-                }],
-                model=self.config["model"],
-                max_completion_tokens=self.config["max_tokens"],
-            )
+            request["temperature"] = self.config["temperature"]
+        prefix = get_prefix(message)
+        if prefix is not None:
+            # (requests with the same key are routed to the same prompt cache, for prefixes of 1024 tokens or more)
+            request["prompt_cache_key"] = hashlib.sha256(prefix.encode()).hexdigest()[:32]
+        return request
+
+    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_time=10, on_backoff=record_retry)
+    def chat(self, message: str) -> str:
+        chat_completion = self.client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
+        chat_message = chat_completion.choices[0].message
+        return chat_message.content
+
+    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_time=10, on_backoff=record_retry)
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        # (one request with `n` choices, the prompt is sent and billed once)
+        chat_completion = self.client.chat.completions.create(**self.build_request(message), n=n)
+        record_openai_usage(chat_completion)
+        return [choice.message.content for choice in chat_completion.choices]
+
+    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_time=10, on_backoff=record_retry)
+    def _stream(self, message: str):
+        # (the request is sent here, the chunks are read by iterating the stream)
+        return self.client.chat.completions.create(**self.build_request(message), stream=True,
+                                                   stream_options={"include_usage": True})
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        with self._stream(message) as stream:
+            for chunk in stream:
+                # (the usage comes with the last chunk)
+                record_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_time=10, on_backoff=record_retry)
+    async def achat(self, message: str) -> str:
+        client = get_async_openai_client(self.api_key, self.base_url)
+        chat_completion = await client.chat.completions.create(**self.build_request(message))
+        record_openai_usage(chat_completion)
         chat_message = chat_completion.choices[0].message
         return chat_message.content
 
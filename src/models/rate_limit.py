@@ -0,0 +1,159 @@
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict
+
+import httpx
+import openai
+
+from src.models.base_model import BaseModel
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at `rate_per_minute`, holding at most one minute of tokens
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        """
+        Take tokens, waiting until they are available.
+        A request larger than the capacity waits for a full bucket and drives it negative.
+
+        :param amount: number of tokens
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_BUCKETS: Dict[tuple[str, str], TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def unwrap(llm: BaseModel) -> BaseModel:
+    """
+    :return: the model wrapped by wrappers (models with an `llm` attribute)
+    """
+    while hasattr(llm, 'llm'):
+        llm = llm.llm
+    return llm
+
+
+def get_provider(llm: BaseModel) -> str:
+    """
+    :return: provider of a model, its `provider` class attribute or e.g. 'OPENAI' for `OpenAIModel`, the provider of
+        the wrapped model for wrappers
+    """
+    llm = unwrap(llm)
+    return getattr(type(llm), 'provider', None) or type(llm).__name__.removesuffix('Model').upper()
+
+
+def get_bucket(provider: str, unit: str, rate_per_minute: float = None) -> TokenBucket:
+    """
+    Get the bucket of a provider shared by all models of this process
+
+    :param provider: provider, see `get_provider`
+    :param unit: 'REQUESTS' or 'TOKENS'
+    :param rate_per_minute: limit, by default `<provider>_<unit>_PER_MINUTE` from the environment
+    :return: the bucket, None if there is no limit
+    """
+    with _BUCKETS_LOCK:
+        if (provider, unit) not in _BUCKETS:
+            if rate_per_minute is None:
+                rate_per_minute = float(os.getenv(f'{provider}_{unit}_PER_MINUTE', 0) or 0)
+            _BUCKETS[(provider, unit)] = TokenBucket(rate_per_minute) if rate_per_minute > 0 else None
+        return _BUCKETS[(provider, unit)]
+
+
+def is_overload(error: BaseException) -> bool:
+    """
+    :return: whether an error of a model signals that its provider is overloaded (rate limited or timed out), so
+        that the request can be retried later
+    """
+    return (isinstance(error, (openai.RateLimitError, openai.APITimeoutError, httpx.TimeoutException, TimeoutError))
+            or getattr(error, 'status_code', None) == 429)
+
+
+def estimate_tokens(message: str, max_tokens: int) -> int:
+    """
+    Estimate the tokens of a request as providers count them against a limit: the prompt (about 4
+    characters per token) and the maximum completion
+    """
+    return math.ceil(len(message) / 4) + max_tokens
+
+
+class RateLimitedModel(BaseModel):
+    """
+    A model whose `chat` waits for the request and token limits of its provider.
+    With an event loop, `chat` can be called from worker threads and sends the requests of models with an
+    asynchronous client with `achat` on that loop, sharing its clients.
+    """
+
+    def __init__(self, llm: BaseModel, loop: asyncio.AbstractEventLoop = None):
+        super().__init__()
+        self.llm = llm
+        # (the default `achat` would take another worker thread while this one waits)
+        self.loop = loop if type(unwrap(llm)).achat is not BaseModel.achat else None
+        provider = get_provider(llm)
+        self.requests = get_bucket(provider, 'REQUESTS')
+        self.tokens = get_bucket(provider, 'TOKENS')
+
+    @property
+    def config(self) -> Dict[str, any]:
+        return self.llm.config
+
+    def _acquire(self, message: str):
+        if self.requests is not None:
+            self.requests.acquire()
+        if self.tokens is not None:
+            self.tokens.acquire(estimate_tokens(message, self.llm.config.get('max_tokens', 0)))
+
+    def chat(self, message: str) -> str:
+        self._acquire(message)
+        if self.loop is not None:
+            return asyncio.run_coroutine_threadsafe(self.llm.achat(message), self.loop).result()
+        return self.llm.chat(message)
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        if type(unwrap(self.llm)).chat_samples is BaseModel.chat_samples:
+            # (n requests, each one limited)
+            return super().chat_samples(message, n)
+        if self.requests is not None:
+            self.requests.acquire()
+        if self.tokens is not None:
+            self.tokens.acquire(estimate_tokens(message, n * self.llm.config.get('max_tokens', 0)))
+        return self.llm.chat_samples(message, n)
+
+    def chat_until(self, message: str, stop: re.Pattern) -> str:
+        # (streamed from this thread)
+        self._acquire(message)
+        return self.llm.chat_until(message, stop)
+
+    async def achat(self, message: str) -> str:
+        if self.requests is not None or self.tokens is not None:
+            await asyncio.to_thread(self._acquire, message)
+        return await self.llm.achat(message)
+
+    def reconfig(self, config: Dict[str, any]):
+        self.llm.reconfig(config)
+
+    def get_model_name(self) -> str:
+        return self.llm.get_model_name()
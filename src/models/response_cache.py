@@ -0,0 +1,104 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from typing import Dict
+
+from src.models.base_model import BaseModel
+from src.models.rate_limit import get_provider
+from src.utils.cache import SqliteLRUCache
+
+
+def response_key(provider: str, config: Dict[str, any], message: str, sample: int = 0, stop: str = None) -> str:
+    """
+    Key of a response: the provider, the model, its temperature and maximum tokens, the hash of the prompt and the
+    pattern the response was stopped at, if any (see `BaseModel.chat_until`)
+
+    :param provider: provider, see `get_provider`
+    :param config: configuration of the model
+    :param message: prompt
+    :param sample: index of the sample among the identical prompts of a problem, for sampled responses
+    :param stop: pattern the response was stopped at
+    :return: key
+    """
+    prompt = hashlib.sha256(message.encode()).hexdigest()
+    fields = [provider, config.get('model'), config.get('temperature'), config.get('max_tokens'), prompt, sample]
+    if stop is not None:
+        # (the keys of whole responses are unchanged)
+        fields.append(stop)
+    return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+
+class CachedModel(BaseModel):
+    """
+    A model whose responses are cached in a persistent cache.
+    Sampled responses (temperature above 0) are not cached unless `cache_sampled`; they are then cached per
+    sample, so that the n-th identical prompt to a model object gets the n-th cached response.
+    """
+
+    def __init__(self, llm: BaseModel, cache: SqliteLRUCache, cache_sampled: bool = False):
+        super().__init__()
+        self.llm = llm
+        self.cache = cache
+        self.cache_sampled = cache_sampled
+        self.provider = get_provider(llm)
+        self._samples = Counter()
+
+    @property
+    def config(self) -> Dict[str, any]:
+        return self.llm.config
+
+    def _key(self, message: str, stop: str = None) -> str | None:
+        sample = 0
+        if self.config.get('temperature', 0):
+            if not self.cache_sampled:
+                return None
+            self._samples[message] += 1
+            sample = self._samples[message]
+        return response_key(self.provider, self.config, message, sample, stop)
+
+    def chat(self, message: str) -> str:
+        key = self._key(message)
+        response = self.cache.get(key) if key is not None else None
+        if response is None:
+            response = self.llm.chat(message)
+            if key is not None and response is not None:
+                self.cache.put(key, response)
+        return response
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        keys = [self._key(message) for _ in range(n)]
+        if keys[0] is None:
+            return self.llm.chat_samples(message, n)
+        responses = [self.cache.get(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            for i, response in zip(missing, self.llm.chat_samples(message, len(missing))):
+                responses[i] = response
+                if response is not None:
+                    self.cache.put(keys[i], response)
+        return responses
+
+    def chat_until(self, message: str, stop: re.Pattern) -> str:
+        key = self._key(message, stop.pattern)
+        response = self.cache.get(key) if key is not None else None
+        if response is None:
+            response = self.llm.chat_until(message, stop)
+            if key is not None and response is not None:
+                self.cache.put(key, response)
+        return response
+
+    async def achat(self, message: str) -> str:
+        key = self._key(message)
+        response = self.cache.get(key) if key is not None else None
+        if response is None:
+            response = await self.llm.achat(message)
+            if key is not None and response is not None:
+                self.cache.put(key, response)
+        return response
+
+    def reconfig(self, config: Dict[str, any]):
+        self.llm.reconfig(config)
+
+    def get_model_name(self) -> str:
+        return self.llm.get_model_name()
@@ -0,0 +1,167 @@
+import asyncio
+import copy
+import pickle
+import re
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.models import clients
+from src.models.alibaba_model import AlibabaModel
+from src.models.base_model import Prompt
+from src.models.clients import get_openai_client, get_async_openai_client, get_ollama_client, \
+    get_async_ollama_client, close_async_clients
+from src.models.deepseek_model import DeepSeekModel
+from src.models.echo_model import EchoModel
+from src.models.ollama_model import OllamaModel
+from src.models.openai_model import OpenAIModel
+from src.models.rate_limit import RateLimitedModel
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='True'))])
+
+
+class FakeAsyncClient:
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeCompletions())
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeStream:
+    """
+    The chunks of a streamed chat completion, one per word, the last one with the usage
+    """
+
+    def __init__(self, words: list[str]):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))], usage=None)
+                       for word in words]
+        self.chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=3,
+                                                                            completion_tokens=len(words))))
+        self.read = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+class TestClients(TestCase):
+    def test_shared_by_models(self):
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test', 'DEEPSEEK_API_KEY': 'test'}):
+            self.assertIs(OpenAIModel().client, OpenAIModel().client)
+            self.assertIs(OpenAIModel().client, get_openai_client('test'))
+            # same key, other provider
+            self.assertIsNot(DeepSeekModel().client, OpenAIModel().client)
+        self.assertIs(OllamaModel().client, get_ollama_client('http://localhost:11434'))
+
+    def test_async_shared_per_loop(self):
+        async def get():
+            first, second = get_async_openai_client('test'), get_async_openai_client('test')
+            self.assertIs(first, second)
+            await close_async_clients()
+            return first
+
+        with patch.object(clients, 'AsyncOpenAI', FakeAsyncClient):
+            first, second = asyncio.run(get()), asyncio.run(get())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    def test_close_ollama(self):
+        async def get():
+            client = get_async_ollama_client('http://localhost:11434')
+            await close_async_clients()
+            return client
+
+        # (the installed client class, not a fake one)
+        self.assertTrue(asyncio.run(get())._client.is_closed)
+
+    def test_achat(self):
+        async def chat(model):
+            try:
+                return await asyncio.gather(model.achat('a'), model.achat('b')), get_async_openai_client('test')
+            finally:
+                await close_async_clients()
+
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test'}), patch.object(clients, 'AsyncOpenAI', FakeAsyncClient):
+            model = OpenAIModel()
+            model.reconfig({'model': 'gpt-5-mini', 'temperature': 0})
+            answers, client = asyncio.run(chat(model))
+        self.assertEqual(answers, ['True', 'True'])
+        requests = client.chat.completions.requests
+        self.assertEqual([request['messages'][0]['content'] for request in requests], ['a', 'b'])
+        self.assertNotIn('temperature', requests[0])
+
+    def test_chat_on_loop(self):
+        # `chat` from a worker thread sends the request with `achat` on the loop
+        async def chat():
+            loop = asyncio.get_running_loop()
+            try:
+                model = RateLimitedModel(OpenAIModel(), loop=loop)
+                answer = await asyncio.to_thread(model.chat, 'a')
+                return answer, get_async_openai_client('test')
+            finally:
+                await close_async_clients()
+
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test'}), patch.object(clients, 'AsyncOpenAI', FakeAsyncClient):
+            answer, client = asyncio.run(chat())
+        self.assertEqual(answer, 'True')
+        self.assertEqual(len(client.chat.completions.requests), 1)
+
+    def test_chat_without_async_client(self):
+        # the default `achat` would wait for a worker thread while holding one
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertIs(RateLimitedModel(OllamaModel(), loop=loop).loop, loop)
+        self.assertIsNone(RateLimitedModel(EchoModel(), loop=loop).loop)
+
+    def test_chat_until(self):
+        streams = []
+
+        def create(**request):
+            self.assertTrue(request['stream'])
+            streams.append(FakeStream(['The ', 'answer ', 'is ', 'True', ', ', 'because ', 'event1 ', 'happens.']))
+            return streams[-1]
+
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test'}):
+            model = OpenAIModel()
+        model.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        self.assertEqual(model.chat_until('a', re.compile(r'(true|false)', re.IGNORECASE)), 'The answer is True')
+        # the stream is closed after the chunk following the answer
+        self.assertEqual(streams[0].read, 5)
+        self.assertTrue(streams[0].closed)
+        self.assertEqual(''.join(model.chat_stream('a')), 'The answer is True, because event1 happens.')
+
+    def test_prefix(self):
+        prompt = Prompt('examples\n', 'question')
+        self.assertEqual(prompt, 'examples\nquestion')
+        self.assertEqual((prompt.prefix, prompt.suffix), ('examples\n', 'question'))
+        for copied in copy.deepcopy(prompt), pickle.loads(pickle.dumps(prompt)):
+            self.assertEqual((copied, copied.prefix, copied.suffix), (prompt, 'examples\n', 'question'))
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test', 'ALIBABA_API_KEY': 'test'}):
+            openai_model, alibaba_model = OpenAIModel(), AlibabaModel()
+        # the same prompt cache for the same prefix
+        key = openai_model.build_request(prompt)['prompt_cache_key']
+        self.assertEqual(key, openai_model.build_request(Prompt('examples\n', 'other question'))['prompt_cache_key'])
+        self.assertNotIn('prompt_cache_key', openai_model.build_request('examples\nquestion'))
+        self.assertEqual(openai_model.build_request(prompt)['messages'][0]['content'], 'examples\nquestion')
+        # the prefix is cached explicitly
+        prefix, suffix = alibaba_model.build_request(prompt)['messages'][0]['content']
+        self.assertEqual((prefix['text'], prefix['cache_control']), ('examples\n', {'type': 'ephemeral'}))
+        self.assertEqual(suffix['text'], 'question')
+        self.assertEqual(alibaba_model.build_request('question')['messages'][0]['content'], 'question')
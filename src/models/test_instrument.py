@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from typing import Dict
+from unittest import TestCase
+from unittest.mock import patch
+
+import backoff
+
+from src.models.base_model import BaseModel
+from src.models.choose import choose_model
+from src.models.clients import close_async_clients
+from src.models.instrument import CallLog, InstrumentedModel, get_calls_path, read_calls, record_openai_usage, \
+    record_retry, summarize_calls
+from src.models.ollama_server import LocalOllamaServer
+
+
+class FlakyModel(BaseModel):
+    """
+    Fails the first `failures` requests, then echoes the last line of the prompt
+    """
+
+    def __init__(self, failures: int = 0):
+        super().__init__()
+        self.failures = failures
+
+    @backoff.on_exception(backoff.constant, ConnectionError, interval=0, max_tries=5, on_backoff=record_retry)
+    def chat(self, message: str) -> str:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError('unavailable')
+        return message.strip().splitlines()[-1]
+
+    def reconfig(self, config: Dict[str, any]):
+        self.config = config
+
+    def get_model_name(self) -> str:
+        return 'flaky'
+
+
+class TestInstrumentedModel(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = get_calls_path(os.path.join(self.folder.name, 'evaluation.csv'))
+        self.log = CallLog(self.path)
+        self.addCleanup(self.log.close)
+
+    def _read(self) -> list[dict]:
+        self.log.close()
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_path(self):
+        self.assertEqual(get_calls_path('results/evaluation/model/10_5.csv'), 'results/evaluation/model/10_5.calls.jsonl')
+
+    def test_records(self):
+        llm = InstrumentedModel(FlakyModel(failures=2), self.log, strategy='zero_shot', problem_id=7)
+        self.assertEqual(llm.chat('question\nTrue'), 'True')
+        self.assertEqual(asyncio.run(llm.achat('question\nFalse')), 'False')
+        first, second = self._read()
+        self.assertEqual(first['model'], 'flaky')
+        self.assertEqual(first['strategy'], 'zero_shot')
+        self.assertEqual(first['problem_id'], 7)
+        self.assertEqual(first['retries'], 2)
+        self.assertEqual(second['retries'], 0)
+        self.assertIsNone(first['error'])
+        self.assertGreaterEqual(first['latency'], 0)
+        self.assertNotIn('_start', first)
+
+    def test_error(self):
+        llm = InstrumentedModel(FlakyModel(failures=10), self.log, strategy='zero_shot')
+        with self.assertRaises(ConnectionError):
+            llm.chat('question')
+        call, = self._read()
+        self.assertEqual(call['retries'], 4)
+        self.assertEqual(call['error'], 'ConnectionError: unavailable')
+
+    def test_samples(self):
+        llm = InstrumentedModel(FlakyModel(), self.log, strategy='self_consistency')
+        self.assertEqual(llm.chat_samples('question\nTrue', 3), ['True'] * 3)
+        # one call per sample without native sampling
+        self.assertEqual([call['samples'] for call in self._read()], [1, 1, 1])
+
+    def test_ollama(self):
+        with LocalOllamaServer(latency=0.02) as server, patch.dict('os.environ', {'OLLAMA_URL': server.host}):
+            llm = InstrumentedModel(choose_model('local/stub'), self.log, strategy='zero_shot')
+            self.assertEqual(llm.chat('first\nTrue'), 'True')
+
+            async def run():
+                try:
+                    return await llm.achat('second\nFalse')
+                finally:
+                    await close_async_clients()
+
+            self.assertEqual(asyncio.run(run()), 'False')
+        for call in self._read():
+            self.assertEqual(call['model'], 'stub')
+            self.assertEqual(call['prompt_tokens'], 2)
+            self.assertEqual(call['completion_tokens'], 1)
+            self.assertGreaterEqual(call['ttfb'], 0.02)
+            self.assertGreaterEqual(call['latency'], call['ttfb'])
+
+    def test_cached_tokens(self):
+        class CachingModel(FlakyModel):
+            def chat(self, message: str) -> str:
+                # as reported by OpenAI, then by DeepSeek
+                record_openai_usage(SimpleNamespace(usage=SimpleNamespace(
+                    prompt_tokens=100, completion_tokens=5, prompt_tokens_details=SimpleNamespace(cached_tokens=80))))
+                record_openai_usage(SimpleNamespace(usage=SimpleNamespace(
+                    prompt_tokens=100, completion_tokens=5, prompt_cache_hit_tokens=40)))
+                return message
+
+        InstrumentedModel(CachingModel(), self.log, strategy='few_shot_cot').chat('question')
+        InstrumentedModel(FlakyModel(), self.log, strategy='few_shot_cot').chat('question')
+        self.log.close()
+        calls = read_calls([self.path])
+        self.assertEqual(calls.at[0, 'cached_tokens'], 120)
+        self.assertEqual(summarize_calls(calls).at[0, 'cached_fraction'], 0.6)
+
+    def test_summarize(self):
+        for strategy in ['zero_shot', 'few_shot']:
+            llm = InstrumentedModel(FlakyModel(failures=1), self.log, strategy=strategy)
+            for i in range(4):
+                llm.chat(str(i))
+        self.log.close()
+        summary = summarize_calls(read_calls([self.folder.name]))
+        self.assertEqual(list(summary['strategy']), ['few_shot', 'zero_shot'])
+        self.assertEqual(list(summary['calls']), [4, 4])
+        self.assertEqual(list(summary['retries']), [1, 1])
+        self.assertTrue((summary['latency_p50'] <= summary['latency_p99']).all())
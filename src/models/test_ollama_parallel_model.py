@@ -0,0 +1,138 @@
+import asyncio
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+
+from src.models.base_model import Prompt
+from src.models.benchmark import benchmark_ollama
+from src.models.choose import choose_model
+from src.models.clients import close_async_clients
+from src.models.instrument import CallLog, InstrumentedModel, read_calls
+from src.models import ollama_parallel_model
+from src.models.ollama_parallel_model import OllamaParallelModel, get_dispatcher
+from src.models.ollama_server import LocalOllamaServer
+from src.models.rate_limit import get_provider
+
+
+class TestOllamaParallelModel(TestCase):
+    def setUp(self):
+        self.server = LocalOllamaServer(latency=0.05, num_parallel=8).__enter__()
+        environment = patch.dict('os.environ', {'OLLAMA_URL': self.server.host, 'OLLAMA_NUM_PARALLEL': '3'})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+
+    def test_choose(self):
+        model = choose_model('local/qwen:7b-chat')
+        self.assertIsInstance(model, OllamaParallelModel)
+        self.assertEqual(model.get_model_name(), 'qwen:7b-chat')
+        self.assertEqual(get_provider(model), 'OLLAMA')
+
+    def test_chat(self):
+        model = choose_model('local/stub')
+        self.assertEqual(model.chat('question\nTrue'), 'True')
+        self.assertEqual(model.chat('question\nFalse'), 'False')
+        # loaded once, kept loaded
+        self.assertEqual(self.server.loads, 1)
+        self.assertEqual(get_dispatcher(self.server.host, 'stub').keep_alive, '30m')
+
+    def test_achat_parallel(self):
+        model = choose_model('local/stub')
+
+        async def run():
+            try:
+                return await asyncio.gather(*(model.achat(str(i)) for i in range(12)))
+            finally:
+                await close_async_clients()
+
+        self.assertEqual(asyncio.run(run()), [str(i) for i in range(12)])
+        self.assertEqual(self.server.requests, 12)
+        # requests in flight are capped by OLLAMA_NUM_PARALLEL
+        self.assertEqual(self.server.peak, 3)
+
+    def test_achat_busy_executor(self):
+        # strategies run in the worker threads of the loop and wait there for their requests sent on it
+        model = choose_model('local/stub')
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(1))
+            try:
+                return await asyncio.to_thread(
+                    lambda: asyncio.run_coroutine_threadsafe(model.achat('question\nTrue'), loop).result(timeout=5))
+            finally:
+                await close_async_clients()
+
+        self.assertEqual(asyncio.run(run()), 'True')
+        self.assertEqual(self.server.loads, 1)
+
+    def test_chat_until(self):
+        words = 'Answer: True, since ' + ' '.join(['event1'] * 40)
+        with LocalOllamaServer(latency=0, respond=lambda request: words, token_latency=0.01) as server, \
+                patch.dict('os.environ', {'OLLAMA_URL': server.host}):
+            model = choose_model('local/stub')
+            start = time.monotonic()
+            self.assertEqual(model.chat_until('question', re.compile(r'answer: (true|false)', re.IGNORECASE)),
+                             'Answer: True')
+            self.assertLess(time.monotonic() - start, 40 * 0.01)
+            self.assertEqual(model.chat_until('question', re.compile('never')), words)
+        # the first request stopped once the answer was received
+        self.assertLess(server.streamed, 2 * 44)
+
+    def test_prefix_warmed(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        log = CallLog(os.path.join(folder.name, 'calls.jsonl'))
+        model = InstrumentedModel(choose_model('local/stub'), log)
+        examples = 'Example: event1 happens.\nAnswer: True\n' * 10
+        for question in ['Does event2 happen?\nFalse', 'Can event3 happen?\nTrue']:
+            self.assertEqual(model.chat(Prompt(examples, question)), question.splitlines()[-1])
+        log.close()
+        # the prefix is evaluated once, before the first request
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(list(read_calls([log.path])['prompt_tokens']), [4, 4])
+
+    def test_prefix_warmed_async(self):
+        model = choose_model('local/stub')
+        examples = 'Example: event1 happens.\nAnswer: True\n' * 10
+
+        async def run():
+            try:
+                return await asyncio.gather(*(model.achat(Prompt(examples, str(i))) for i in range(6)))
+            finally:
+                await close_async_clients()
+
+        self.assertEqual(asyncio.run(run()), [f'{i}' for i in range(6)])
+        # the other requests wait for the first evaluation of the prefix
+        self.assertEqual((self.server.loads, self.server.requests), (1, 7))
+
+    def test_prefixes_warmed_concurrently(self):
+        with LocalOllamaServer(latency=0.2, num_parallel=8) as server, \
+                patch.dict('os.environ', {'OLLAMA_URL': server.host}), \
+                patch.object(ollama_parallel_model, 'MAX_WARMED', 2):
+            model = choose_model('local/stub')
+            model.chat('load')
+            threads = [threading.Thread(target=model.chat, args=(Prompt(f'Example {i}\n' * 10, 'question'),))
+                       for i in range(3)]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # the prefixes are evaluated at the same time, then the requests
+            self.assertLess(time.monotonic() - start, 3 * 0.2)
+            self.assertEqual(server.requests, 1 + 2 * 3)
+            # only the most recent prefixes are remembered
+            self.assertEqual(len(get_dispatcher(server.host, 'stub')._warmed), 2)
+
+    def test_benchmark(self):
+        rows = benchmark_ollama([1, 4], requests=8, latency=0.02, num_parallel=4)
+        self.assertEqual([row['concurrency'] for row in rows], [1, 4])
+        self.assertGreater(rows[1]['requests_per_second'], rows[0]['requests_per_second'])
@@ -0,0 +1,65 @@
+import os
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import httpx
+import ollama
+
+from src.models.echo_model import EchoModel
+from src.models.rate_limit import TokenBucket, RateLimitedModel, get_provider, estimate_tokens, is_overload
+
+
+class TestTokenBucket(TestCase):
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate_per_minute=600)
+        start = time.monotonic()
+        bucket.acquire(600)
+        self.assertLess(time.monotonic() - start, 0.05)
+        bucket.acquire(3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_larger_than_capacity(self):
+        bucket = TokenBucket(rate_per_minute=6000)
+        bucket.acquire(12000)
+        self.assertLess(bucket.tokens, 0)
+
+
+class TestRateLimitedModel(TestCase):
+    def test_provider(self):
+        self.assertEqual(get_provider(EchoModel()), 'ECHO')
+
+    def test_limits(self):
+        class LimitedModel(EchoModel):
+            pass
+
+        with patch.dict(os.environ, {'LIMITED_REQUESTS_PER_MINUTE': '1200'}):
+            llm = RateLimitedModel(LimitedModel())
+        self.assertEqual(llm.chat('hello'), 'hello')
+        self.assertEqual(llm.get_model_name(), 'echo')
+        self.assertIsNone(llm.tokens)
+        self.assertLess(llm.requests.tokens, 1200)
+        self.assertEqual(estimate_tokens('x' * 41, 10), 21)
+
+    def test_samples(self):
+        class SampledModel(EchoModel):
+            def chat_samples(self, message: str, n: int) -> list[str]:
+                return [message] * n
+
+        class UnsampledModel(EchoModel):
+            pass
+
+        with patch.dict(os.environ, {'SAMPLED_REQUESTS_PER_MINUTE': '1200', 'UNSAMPLED_REQUESTS_PER_MINUTE': '1200'}):
+            sampled, unsampled = RateLimitedModel(SampledModel()), RateLimitedModel(UnsampledModel())
+        # one request for all samples, or one request per sample
+        self.assertEqual(sampled.chat_samples('a', 3), ['a', 'a', 'a'])
+        self.assertEqual(unsampled.chat_samples('a', 3), ['a', 'a', 'a'])
+        self.assertAlmostEqual(sampled.requests.tokens, 1199, delta=0.5)
+        self.assertAlmostEqual(unsampled.requests.tokens, 1197, delta=0.5)
+
+    def test_overload(self):
+        self.assertTrue(is_overload(TimeoutError()))
+        self.assertTrue(is_overload(httpx.ReadTimeout('timeout')))
+        self.assertTrue(is_overload(ollama.ResponseError('busy', status_code=429)))
+        self.assertFalse(is_overload(ollama.ResponseError('not found', status_code=404)))
+        self.assertFalse(is_overload(ValueError()))
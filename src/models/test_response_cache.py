@@ -0,0 +1,85 @@
+import os
+import re
+import tempfile
+from unittest import TestCase
+
+from src.models.echo_model import EchoModel
+from src.models.rate_limit import RateLimitedModel
+from src.models.response_cache import CachedModel, response_key
+from src.utils.cache import SqliteLRUCache
+
+
+class CountingModel(EchoModel):
+    def __init__(self):
+        super().__init__()
+        self.config['temperature'] = 0
+        self.calls = 0
+
+    def chat(self, message: str) -> str:
+        self.calls += 1
+        return f'{message} {self.calls}'
+
+
+class TestCachedModel(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = SqliteLRUCache(os.path.join(self.folder.name, 'responses.sqlite'), table='responses')
+
+    def tearDown(self):
+        self.cache.close()
+        self.folder.cleanup()
+
+    def test_key(self):
+        config = {'model': 'm', 'temperature': 0, 'max_tokens': 10}
+        key = response_key('OPENAI', config, 'prompt')
+        self.assertEqual(key, response_key('OPENAI', dict(config), 'prompt'))
+        self.assertNotEqual(key, response_key('OLLAMA', config, 'prompt'))
+        self.assertNotEqual(key, response_key('OPENAI', {**config, 'max_tokens': 20}, 'prompt'))
+        self.assertNotEqual(key, response_key('OPENAI', config, 'prompt!'))
+
+    def test_deterministic_cached(self):
+        llm = CountingModel()
+        self.assertEqual(CachedModel(llm, self.cache).chat('a'), 'a 1')
+        self.assertEqual(CachedModel(llm, self.cache).chat('a'), 'a 1')
+        llm.reconfig({'max_tokens': 20})
+        self.assertEqual(CachedModel(llm, self.cache).chat('a'), 'a 2')
+        self.assertEqual(self.cache.counters(), {'cache_hits': 1, 'cache_misses': 2})
+
+    def test_sampled_bypassed(self):
+        llm = CountingModel()
+        llm.reconfig({'temperature': 0.7})
+        model = CachedModel(llm, self.cache)
+        self.assertEqual([model.chat('a'), model.chat('a')], ['a 1', 'a 2'])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_sampled_opt_in(self):
+        llm = CountingModel()
+        llm.reconfig({'temperature': 0.7})
+        first = CachedModel(llm, self.cache, cache_sampled=True)
+        self.assertEqual([first.chat('a'), first.chat('a')], ['a 1', 'a 2'])
+        # every sample of a problem is cached, in order
+        second = CachedModel(llm, self.cache, cache_sampled=True)
+        self.assertEqual([second.chat('a'), second.chat('a'), second.chat('a')], ['a 1', 'a 2', 'a 3'])
+
+    def test_samples_opt_in(self):
+        llm = CountingModel()
+        llm.reconfig({'temperature': 0.7})
+        self.assertEqual(CachedModel(llm, self.cache, cache_sampled=True).chat_samples('a', 2), ['a 1', 'a 2'])
+        model = CachedModel(llm, self.cache, cache_sampled=True)
+        self.assertEqual(sorted(model.chat_samples('a', 3)), ['a 1', 'a 2', 'a 3'])
+
+    def test_provider_of_wrapped(self):
+        model = CachedModel(RateLimitedModel(CountingModel()), self.cache)
+        self.assertEqual(model.provider, 'COUNTING')
+        model.reconfig({'max_tokens': 5})
+        self.assertEqual(model.config['max_tokens'], 5)
+
+    def test_chat_until_cached(self):
+        llm = CountingModel()
+        model = CachedModel(llm, self.cache)
+        stop = re.compile(r'\d')
+        self.assertEqual(model.chat_until('a', stop), 'a 1')
+        self.assertEqual(model.chat_until('a', stop), 'a 1')
+        # stopped responses are cached apart from whole ones
+        self.assertEqual(model.chat('a'), 'a 2')
+        self.assertEqual(llm.calls, 2)
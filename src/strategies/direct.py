@@ -1,13 +1,19 @@
 import re
-from src.models.base_model import BaseModel
+from src.models.base_model import BaseModel, ANSWER_MARKER, ANSWER_INSTRUCTION
 
 
-def direct_prompt(question: str, llm: BaseModel) -> tuple[str, str]:
+def direct_prompt(question: str, llm: BaseModel, early_stop: bool = False) -> tuple[str, str]:
     prompt = f"{question}\n\nThe answer must be either 'True' or 'False'."
+    if early_stop:
+        # (the response stops at the answer it asks for)
+        prompt += f"\n{ANSWER_INSTRUCTION}"
 
     llm.reconfig({'temperature': 0, 'max_tokens': 2000})
 
-    response = llm.chat(message=prompt)
+    if early_stop:
+        response = llm.chat_until(message=prompt, stop=ANSWER_MARKER)
+    else:
+        response = llm.chat(message=prompt)
 
     # Extract answer - get the last occurrence
     pattern = r'(true|false)'
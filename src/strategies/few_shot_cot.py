@@ -1,9 +1,8 @@
 import re
-from src.models.base_model import BaseModel
+from src.models.base_model import BaseModel, Prompt, ANSWER_MARKER, ANSWER_INSTRUCTION
 
-
-def few_shot_cot_prompt(question: str, llm: BaseModel) -> tuple[str, str]:
-    prompt = """
+# the worked examples, the static prefix of every prompt
+EXAMPLES = """
 === Example 1 ===
 
 Context:
@@ -52,7 +51,11 @@ Answer: False
 
 === Now solve this problem ===
 
-""" + question + """
+"""
+
+
+def few_shot_cot_prompt(question: str, llm: BaseModel, early_stop: bool = False) -> tuple[str, str]:
+    suffix = question + """
 
 Let's think step by step.
 
@@ -63,10 +66,17 @@ Finally, let's determine if the hypothesis can be satisfied.
 
 Please reason through this problem thoroughly before answering.
 The final answer must be either 'True' or 'False'."""
+    if early_stop:
+        # (the response stops at the answer it asks for)
+        suffix += f"\n{ANSWER_INSTRUCTION}"
+    prompt = Prompt(EXAMPLES, suffix)
 
     llm.reconfig({'temperature': 0, 'max_tokens': 2000})
 
-    response = llm.chat(message=prompt)
+    if early_stop:
+        response = llm.chat_until(message=prompt, stop=ANSWER_MARKER)
+    else:
+        response = llm.chat(message=prompt)
 
     # Extract answer - get the last occurrence
     pattern = r'(true|false)'
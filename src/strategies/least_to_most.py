@@ -1,8 +1,13 @@
 import re
-from src.models.base_model import BaseModel
+from src.models.base_model import BaseModel, ANSWER_MARKER, ANSWER_INSTRUCTION
 
 
-def least_to_most_prompt(question: str, llm: BaseModel) -> tuple[str, str]:
+def least_to_most_breakdown(question: str, llm: BaseModel) -> str:
+    """
+    The first stage: break down the problem into subproblems
+
+    :return: the breakdown
+    """
     llm.reconfig({'temperature': 0, 'max_tokens': 2000})
 
     # Step 1: Break down the problem into subproblems
@@ -17,7 +22,17 @@ Let me break this down into smaller, manageable parts:
 
 Please answer each of these questions step by step."""
 
-    breakdown_response = llm.chat(message=breakdown_prompt)
+    return llm.chat(message=breakdown_prompt)
+
+
+def least_to_most_solve(question: str, llm: BaseModel, breakdown_response: str,
+                        early_stop: bool = False) -> tuple[str, str]:
+    """
+    The second stage: solve the problem using the breakdown of the first stage
+
+    :return: the response of both stages and the answer
+    """
+    llm.reconfig({'temperature': 0, 'max_tokens': 2000})
 
     # Step 2: Solve the main problem using the breakdown
     solve_prompt = question + f"""
@@ -34,7 +49,12 @@ Now, let's use this understanding to solve the main problem step by step:
 
 The final answer must be either 'True' or 'False'."""
 
-    final_response = llm.chat(message=solve_prompt)
+    if early_stop:
+        # (only the solution ends with the answer, which it asks for)
+        solve_prompt += f"\n{ANSWER_INSTRUCTION}"
+        final_response = llm.chat_until(message=solve_prompt, stop=ANSWER_MARKER)
+    else:
+        final_response = llm.chat(message=solve_prompt)
 
     # Extract answer - get the last occurrence
     pattern = r'(true|false)'
@@ -45,4 +65,9 @@ The final answer must be either 'True' or 'False'."""
     full_response = f"=== Step 1: Problem Breakdown ===\n{breakdown_response}\n\n"
     full_response += f"=== Step 2: Solution ===\n{final_response}"
 
-    return full_response, answer
\ No newline at end of file
+    return full_response, answer
+
+
+def least_to_most_prompt(question: str, llm: BaseModel, early_stop: bool = False) -> tuple[str, str]:
+    breakdown_response = least_to_most_breakdown(question, llm)
+    return least_to_most_solve(question, llm, breakdown_response, early_stop)
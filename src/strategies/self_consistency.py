@@ -21,15 +21,24 @@ The final answer must be either 'True' or 'False'."""
     responses = []
     answers = []
 
-    for i in range(num_samples):
-        response = llm.chat(message=prompt)
-        responses.append(response)
-
-        # Extract answer - get the last occurrence
-        pattern = r'(true|false)'
-        matches = re.findall(pattern, response, re.IGNORECASE)
-        if matches:
-            answers.append(matches[-1].capitalize())
+    # Draw samples concurrently, in waves just large enough for the leading answer to win, and stop as soon as
+    # the remaining samples can not change the majority vote
+    while len(responses) < num_samples:
+        remaining = num_samples - len(responses)
+        counts = Counter(answers).most_common(2) + [(None, 0), (None, 0)]
+        first, second = counts[0][1], counts[1][1]
+        if first > second + remaining:
+            break
+        wave = min(remaining, (second + remaining - first) // 2 + 1)
+
+        for response in llm.chat_samples(message=prompt, n=wave):
+            responses.append(response)
+
+            # Extract answer - get the last occurrence
+            pattern = r'(true|false)'
+            matches = re.findall(pattern, response, re.IGNORECASE)
+            if matches:
+                answers.append(matches[-1].capitalize())
 
     # Majority voting
     if answers:
@@ -37,13 +46,13 @@ The final answer must be either 'True' or 'False'."""
         final_answer = vote_counts.most_common(1)[0][0]
 
         # Aggregate response info
-        aggregated_response = f"Generated {num_samples} samples.\n"
+        aggregated_response = f"Generated {len(responses)} samples.\n"
         aggregated_response += f"Votes: {dict(vote_counts)}\n"
         aggregated_response += f"Final answer by majority vote: {final_answer}\n\n"
         aggregated_response += "Sample responses:\n" + "\n---\n".join(responses)
     else:
         final_answer = None
-        aggregated_response = f"Failed to extract answers from {num_samples} samples.\n\n"
+        aggregated_response = f"Failed to extract answers from {len(responses)} samples.\n\n"
         aggregated_response += "Sample responses:\n" + "\n---\n".join(responses)
 
     return aggregated_response, final_answer
\ No newline at end of file
@@ -0,0 +1,71 @@
+from typing import Dict, Iterator
+from unittest import TestCase
+
+from src.models.base_model import BaseModel, ANSWER_INSTRUCTION
+from src.strategies.direct import direct_prompt
+from src.strategies.few_shot_cot import few_shot_cot_prompt
+from src.strategies.least_to_most import least_to_most_prompt
+from src.strategies.zero_shot_cot import cot_prompt
+
+
+class StreamingModel(BaseModel):
+    """
+    Streams a fixed response word by word and counts the words read
+    """
+
+    def __init__(self, response: str):
+        super().__init__()
+        self.response = response
+        self.config = {}
+        self.read = 0
+        self.messages = []
+
+    def chat(self, message: str) -> str:
+        self.messages.append(message)
+        return self.response
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        self.messages.append(message)
+        for word in self.response.split(' '):
+            self.read += 1
+            yield word + ' '
+
+    def reconfig(self, config: Dict[str, any]):
+        self.config.update(config)
+
+    def get_model_name(self) -> str:
+        return 'streaming'
+
+
+class TestEarlyStop(TestCase):
+    def test_direct(self):
+        # the true/false echoed from the prompt does not stop the response
+        llm = StreamingModel('The answer must be True or False. Answer: False\n\nThe hypothesis can not be true.')
+        response, answer = direct_prompt('question', llm, early_stop=True)
+        self.assertEqual((response, answer), ('The answer must be True or False. Answer: False', 'False'))
+        self.assertEqual(llm.read, 9)
+        self.assertTrue(llm.messages[0].endswith(ANSWER_INSTRUCTION))
+        # without early stopping the last answer counts
+        self.assertEqual(direct_prompt('question', llm)[1], 'True')
+
+    def test_answer_marker(self):
+        llm = StreamingModel('C1 is true, so C2 is false. Answer: False\n\nIn summary, C3 is false as well.')
+        response, answer = few_shot_cot_prompt('question', llm, early_stop=True)
+        self.assertEqual(response, 'C1 is true, so C2 is false. Answer: False')
+        self.assertEqual(answer, 'False')
+        self.assertLess(llm.read, len(llm.response.split(' ')))
+
+    def test_marker_asked(self):
+        # only the prompts of responses stopping at the marker ask for it
+        llm = StreamingModel('C1 is true. Answer: True')
+        cot_prompt('question', llm)
+        cot_prompt('question', llm, early_stop=True)
+        self.assertNotIn(ANSWER_INSTRUCTION, llm.messages[0])
+        self.assertTrue(llm.messages[1].endswith(ANSWER_INSTRUCTION))
+
+    def test_without_marker(self):
+        # the whole response when the answer is not marked
+        llm = StreamingModel('C1 is true, so C3 is true.')
+        response, answer = least_to_most_prompt('question', llm, early_stop=True)
+        self.assertTrue(response.endswith('=== Step 2: Solution ===\nC1 is true, so C3 is true. '))
+        self.assertEqual(answer, 'True')
@@ -0,0 +1,57 @@
+from typing import Dict
+from unittest import TestCase
+
+from src.models.base_model import BaseModel
+from src.strategies.self_consistency import self_consistency_prompt
+
+
+class ScriptedModel(BaseModel):
+    """
+    Answers with the next answer of a script
+    """
+
+    def __init__(self, script: str):
+        super().__init__()
+        self.script = list(script)
+        self.config = {}
+        self.waves = []
+
+    def chat(self, message: str) -> str:
+        return {'T': 'True', 'F': 'False', '?': 'Unknown'}[self.script.pop(0)]
+
+    def chat_samples(self, message: str, n: int) -> list[str]:
+        # (in the order of the script)
+        self.waves.append(n)
+        return [self.chat(message) for _ in range(n)]
+
+    def reconfig(self, config: Dict[str, any]):
+        self.config.update(config)
+
+    def get_model_name(self) -> str:
+        return 'scripted'
+
+
+class TestSelfConsistency(TestCase):
+    def test_early_stopping(self):
+        llm = ScriptedModel('TTTTT')
+        response, answer = self_consistency_prompt('question', llm, num_samples=5)
+        self.assertEqual(answer, 'True')
+        self.assertEqual(llm.waves, [3])
+        self.assertTrue(response.startswith('Generated 3 samples.'))
+
+    def test_waves(self):
+        llm = ScriptedModel('TFFTF')
+        self.assertEqual(self_consistency_prompt('question', llm, num_samples=5)[1], 'False')
+        # 3 samples, then 1 to break the tie, then 1 more
+        self.assertEqual(llm.waves, [3, 1, 1])
+
+    def test_same_answer_as_all_samples(self):
+        for script in ['TF?TF', 'T?F??', 'FTTF?', '?????', 'TTFFF', 'FFTTT']:
+            llm = ScriptedModel(script)
+            expected = {'True': script.count('T'), 'False': script.count('F')}
+            ranked = sorted((answer for answer in expected if expected[answer]), key=lambda a: -expected[a])
+            # (ties are won by the first answer drawn)
+            if len(ranked) == 2 and expected['True'] == expected['False']:
+                ranked = ['True' if script.find('T') < script.find('F') else 'False']
+            self.assertEqual(self_consistency_prompt('question', llm, num_samples=5)[1],
+                             ranked[0] if ranked else None, script)
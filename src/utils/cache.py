@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteLRUCache:
+    """
+    A persistent key-value cache in SQLite with size-bounded LRU eviction.
+    Several threads and processes can read and write the same file concurrently (WAL mode).
+    """
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int = 1_000_000, table: str = 'cache'):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.pid = os.getpid()
+        self.max_entries = max_entries
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                 f'(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                                 f'last_used REAL NOT NULL)')
+        self._connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)')
+
+    def get(self, key: str):
+        """
+        Get a value and mark it as recently used
+
+        :param key: key
+        :return: the value, None if the key is not cached
+        """
+        with self._lock:
+            row = self._connection.execute(f'SELECT value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute(f'UPDATE {self.table} SET last_used = ? WHERE key = ?', (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """
+        Store a JSON-serializable value
+
+        :param key: key
+        :param value: value
+        """
+        value = json.dumps(value)
+        with self._lock:
+            self._connection.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, size, last_used) '
+                                     f'VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+            self._puts += 1
+            if self._puts % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        # drop the least recently used entries beyond the limit
+        self._connection.execute(f'DELETE FROM {self.table} WHERE key IN '
+                                 f'(SELECT key FROM {self.table} ORDER BY last_used LIMIT '
+                                 f'max(0, (SELECT COUNT(*) FROM {self.table}) - ?))', (self.max_entries,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def counters(self) -> dict:
+        return {'cache_hits': self.hits, 'cache_misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._connection.close()
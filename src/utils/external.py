@@ -1,40 +1,296 @@
+import atexit
+import hashlib
+import os
 import re
+import shutil
 import subprocess
 import tempfile
+import threading
 
+from src.utils.cache import SqliteLRUCache
 
-def call_nusmv(code: str) -> bool:
+SPEC_PATTERN = r"specification.*?\sis\s(true|false)"
+
+
+def _parse_results(output: str) -> list[bool]:
     """
-    Call the NuSMV binary with the given code and return the result
-    :param code: NuSMV code
-    :return: LTL specification result
+    Parse the LTL specification results printed by NuSMV
+
+    :param output: NuSMV output
+    :return: list of LTL specification results, in the order they are printed
     """
-    with tempfile.NamedTemporaryFile() as temp:
-        temp.write(code.encode())
-        temp.seek(0)
-        tmp_path = temp.name
+    results = []
+    for result in re.findall(SPEC_PATTERN, output):
+        if result == "true":
+            results.append(True)
+        elif result == "false":
+            results.append(False)
+        else:
+            raise ValueError("Invalid specification value")
+    return results
+
 
-        process = subprocess.run(
-            ["nusmv", tmp_path],
+class NuSMVWorker:
+    """
+    A long-lived NuSMV process driven in interactive mode (`nusmv -int`).
+    A model is read once and any number of LTL specifications are checked against it.
+    """
+    MARKER = "__LTLBENCH_DONE__"
+
+    def __init__(self):
+        if shutil.which("nusmv") is None:
+            raise FileNotFoundError("nusmv binary not found in PATH")
+        # one model file per worker, overwritten for every model instead of one temp file per problem
+        fd, self.model_path = tempfile.mkstemp(suffix=".smv")
+        os.close(fd)
+        command = ["nusmv", "-int", "-dcx"]
+        # NuSMV uses stdio, so make sure its output is line buffered when talking through a pipe
+        if shutil.which("stdbuf"):
+            command = ["stdbuf", "-oL"] + command
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
         )
+        self.loaded = False
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _run(self, commands: list[str]) -> str:
+        """
+        Run commands and collect the output until the end marker is echoed
 
-        if process.returncode != 0:
-            print(process.stderr)
+        :param commands: NuSMV interactive commands
+        :return: output of the commands
+        """
+        self.process.stdin.write("\n".join(commands + [f"echo {self.MARKER}"]) + "\n")
+        self.process.stdin.flush()
+        lines = []
+        while True:
+            line = self.process.stdout.readline()
+            if line == "":
+                print("".join(lines))
+                raise ValueError("nusmv failed to execute")
+            if self.MARKER in line:
+                return "".join(lines)
+            lines.append(line)
+
+    def check_many(self, code: str, specs: list[str]) -> list[bool]:
+        """
+        Check many LTL specifications against one model
+
+        :param code: NuSMV model without specifications
+        :param specs: LTL specifications, e.g. ['(F (state=event1))']
+        :return: one LTL specification result per spec
+        """
+        with open(self.model_path, "w") as f:
+            f.write(code)
+        commands = ["reset"] if self.loaded else []
+        commands += [f"read_model -i {self.model_path}", "go"]
+        commands += [f'check_ltlspec -p "{spec}"' for spec in specs]
+        self.loaded = True
+        output = self._run(commands)
+
+        results = _parse_results(output)
+        if len(results) != len(specs):
+            print(output)
             raise ValueError("nusmv failed to execute")
+        return results
 
-        pattern = r"specification.*?\sis\s(true|false)"
-        results = re.findall(pattern, process.stdout)
-        if len(results) == 0:
-            raise ValueError("No specification found in the code")
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.write("quit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+        if os.path.exists(self.model_path):
+            os.remove(self.model_path)
 
-        output = str(results[0])
-        if output == "true":
-            output = True
-        elif output == "false":
-            output = False
-        else:
-            raise ValueError("Invalid specification value")
-        return output
+
+class NuSMVPool:
+    """
+    A thread-safe pool of NuSMV workers, workers are started lazily up to `size`
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size or os.cpu_count() or 1
+        self.pid = os.getpid()
+        self._idle = []
+        self._workers = []
+        # notified whenever a worker is returned or discarded
+        self._condition = threading.Condition()
+
+    def _acquire(self) -> NuSMVWorker:
+        with self._condition:
+            while not self._idle and len(self._workers) >= self.size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            worker = NuSMVWorker()
+            self._workers.append(worker)
+            return worker
+
+    def _release(self, worker: NuSMVWorker):
+        with self._condition:
+            self._idle.append(worker)
+            self._condition.notify()
+
+    def _discard(self, worker: NuSMVWorker):
+        worker.close()
+        with self._condition:
+            self._workers.remove(worker)
+            # (a waiting thread starts a new worker instead)
+            self._condition.notify()
+
+    def check_many(self, code: str, specs: list[str]) -> list[bool]:
+        worker = self._acquire()
+        if not worker.alive():
+            self._discard(worker)
+            worker = self._acquire()
+        try:
+            results = worker.check_many(code, specs)
+        except BaseException:
+            # the worker is in an unknown state after any failure (also an interrupt while it answers), start a
+            # fresh one next time
+            self._discard(worker)
+            raise
+        self._release(worker)
+        return results
+
+    def close(self):
+        with self._condition:
+            workers, self._workers, self._idle = self._workers, [], []
+        for worker in workers:
+            worker.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_nusmv_pool() -> NuSMVPool:
+    """
+    Get the process-wide NuSMV pool, its size is read from `NUSMV_POOL_SIZE` (default: number of CPUs)
+    :return: NuSMV pool
+    """
+    global _POOL
+    with _POOL_LOCK:
+        # a forked child must not share the NuSMV pipes of its parent
+        if _POOL is None or _POOL.pid != os.getpid():
+            size = int(os.getenv("NUSMV_POOL_SIZE", "0")) or None
+            _POOL = NuSMVPool(size)
+            atexit.register(_POOL.close)
+        return _POOL
+
+
+def split_specs(code: str) -> tuple[str, list[str]]:
+    """
+    Split NuSMV code into the model and its LTL specifications
+
+    :param code: NuSMV code
+    :return: model without LTLSPEC lines, list of LTL specifications
+    """
+    specs = re.findall(r"^\s*LTLSPEC\s+(.*?)\s*$", code, re.MULTILINE)
+    model = re.sub(r"^\s*LTLSPEC\s+.*$\n?", "", code, flags=re.MULTILINE)
+    return model, specs
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_verdict_cache() -> SqliteLRUCache | None:
+    """
+    Get the process-wide verdict cache, configured by `VERDICT_CACHE_PATH` (empty: disabled)
+    and `VERDICT_CACHE_SIZE` (maximum number of verdicts)
+    :return: verdict cache, None if disabled
+    """
+    global _CACHE
+    path = os.getenv("VERDICT_CACHE_PATH", "")
+    with _CACHE_LOCK:
+        if _CACHE is not None and (_CACHE.path != path or _CACHE.pid != os.getpid()):
+            _CACHE = None
+        if _CACHE is None and path:
+            _CACHE = SqliteLRUCache(path, max_entries=int(os.getenv("VERDICT_CACHE_SIZE", "1000000")),
+                                    table="verdicts")
+        return _CACHE
+
+
+def verdict_cache_counters() -> dict:
+    """
+    :return: hits and misses of the verdict cache of this process
+    """
+    cache = get_verdict_cache()
+    return cache.counters() if cache is not None else {"cache_hits": 0, "cache_misses": 0}
+
+
+def normalize_model(code: str) -> str:
+    """
+    Normalize a NuSMV model: drop specifications, sort the elements of sets and collapse whitespace
+
+    :param code: NuSMV code
+    :return: normalized model
+    """
+    model, _ = split_specs(code)
+    model = re.sub(r"\{([^{}]*)\}",
+                   lambda match: "{" + ", ".join(sorted(x.strip() for x in match.group(1).split(","))) + "}", model)
+    return "\n".join(" ".join(line.split()) for line in model.splitlines() if line.strip())
+
+
+def verdict_key(code: str, spec: str) -> str:
+    """
+    Content address of a (model, specification) pair
+
+    :param code: NuSMV model
+    :param spec: LTL specification
+    :return: hex digest
+    """
+    content = f"{normalize_model(code)}\nLTLSPEC {''.join(spec.split())}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def check_many(code: str, specs: list[str], keys: list[str] = None) -> list[bool]:
+    """
+    Check many LTL specifications against one NuSMV model with a pooled NuSMV process,
+    verdicts found in the verdict cache are not checked again
+    :param code: NuSMV model, LTLSPEC lines in it are ignored
+    :param specs: LTL specifications, with or without the leading 'LTLSPEC'
+    :param keys: verdict cache keys per spec, e.g. from `canonical_key`, default: `verdict_key` of the spec
+    :return: one LTL specification result per spec
+    """
+    model, _ = split_specs(code)
+    specs = [re.sub(r"^\s*LTLSPEC\s+", "", spec).strip() for spec in specs]
+    if len(specs) == 0:
+        return []
+    cache = get_verdict_cache()
+    if cache is None:
+        return get_nusmv_pool().check_many(model, specs)
+
+    if keys is None:
+        keys = [verdict_key(model, spec) for spec in specs]
+    results = [cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        verdicts = get_nusmv_pool().check_many(model, [specs[i] for i in missing])
+        for i, verdict in zip(missing, verdicts):
+            results[i] = verdict
+            cache.put(keys[i], verdict)
+    return results
+
+
+def call_nusmv(code: str) -> bool:
+    """
+    Call the NuSMV binary with the given code and return the result
+    :param code: NuSMV code
+    :return: LTL specification result
+    """
+    _, specs = split_specs(code)
+    if len(specs) == 0:
+        raise ValueError("No specification found in the code")
+    return check_many(code, specs[:1])[0]
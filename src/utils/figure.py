@@ -39,17 +39,21 @@ def plot_lines(
         legend_loc: str = "best",
         colors: Optional[list] = None,
         as_percentage: bool = False,
+        error_band: bool = True,
 ) -> None:
     _ALLOWED_METRICS = {"accuracy", "precision", "recall", "f1", "auc"}
     if y not in _ALLOWED_METRICS:
         raise ValueError(f"y must be one of {_ALLOWED_METRICS}, got '{y}'")
 
+    # Confidence intervals of the metric, e.g. from `aggregate_evaluations` with bootstrap resamples
+    bands = [f"{y}_low", f"{y}_high"] if error_band and {f"{y}_low", f"{y}_high"} <= set(df.columns) else []
+
     # Drop rows with missing essentials
-    data = df[[x, y, z]].dropna().copy()
+    data = df[[x, y, z] + bands].dropna(subset=[x, y, z]).copy()
 
     # Convert to percentage if requested
     if as_percentage:
-        data[y] = data[y] * 100
+        data[[y] + bands] = data[[y] + bands] * 100
 
     # Default colors if not provided
     if colors is None:
@@ -63,6 +67,8 @@ def plot_lines(
         group = group.sort_values(by=x)
         color = colors[idx % len(colors)]  # Cycle through colors if needed
         plt.plot(group[x], group[y], marker=marker, label=str(name), color=color)
+        if bands:
+            plt.fill_between(group[x], group[bands[0]], group[bands[1]], color=color, alpha=0.2, linewidth=0)
 
     # Labels & ticks
     plt.title(title or y.capitalize())
@@ -1,16 +1,78 @@
 import os
+import re
+from typing import Iterable
+
+import pandas as pd
 
 RESULT_FOLDER_PATH = './results'
 DATA_FOLDER_PATH = os.path.join(RESULT_FOLDER_PATH, 'data')
 EVALUATION_FOLDER_PATH = os.path.join(RESULT_FOLDER_PATH, 'evaluation')
+CACHE_FOLDER_PATH = os.path.join(RESULT_FOLDER_PATH, 'cache')
+VERDICT_CACHE_PATH = os.path.join(CACHE_FOLDER_PATH, 'verdicts.sqlite')
+RESPONSE_CACHE_PATH = os.path.join(CACHE_FOLDER_PATH, 'responses.sqlite')
+SPOOL_FOLDER_PATH = os.path.join(RESULT_FOLDER_PATH, 'spool')
+SUMMARY_FILE_PATH = os.path.join(RESULT_FOLDER_PATH, 'summary.csv')
+
+
+DATA_FORMATS = ('csv', 'parquet')
+
+
+def get_data_file_path(event_n: int, formula_n: int, count: int, data_format: str = 'csv'):
+    return os.path.join(DATA_FOLDER_PATH, f'{count}_{event_n}_events_{formula_n}_formula_len.{data_format}')
+
 
+def find_data_file_path(event_n: int, formula_n: int, count: int):
+    """
+    Locate a dataset in any of the data formats, CSV first
 
-def get_data_file_path(event_n: int, formula_n: int, count: int):
-    return os.path.join(DATA_FOLDER_PATH, f'{count}_{event_n}_events_{formula_n}_formula_len.csv')
+    :return: path of the dataset, the CSV path if there is none
+    """
+    for data_format in DATA_FORMATS:
+        path = get_data_file_path(event_n, formula_n, count, data_format)
+        if os.path.exists(path):
+            return path
+    return get_data_file_path(event_n, formula_n, count)
+
+
+def read_data_file(path: str, columns: list[str] = None) -> pd.DataFrame:
+    """
+    Read a dataset in CSV or Parquet format into the same DataFrame
+
+    :param path: path of the dataset
+    :param columns: columns to read, all by default; derived columns of the Parquet format are only
+        materialized when requested
+    :return: DataFrame
+    """
+    if path.endswith('.parquet'):
+        # (imported lazily, only the Parquet format needs the generator)
+        from src.generator.columnar import read_parquet
+        return read_parquet(path, columns)
+    return pd.read_csv(path, usecols=columns)
 
 
 def get_evaluation_file_path(event_n: int, formula_n: int, count: int, model: str, strategy: str):
     folder = os.path.join(EVALUATION_FOLDER_PATH, f'{count}_{event_n}_events_{formula_n}_formula_len')
     os.makedirs(folder, exist_ok=True)
-    path = os.path.join(folder, f'{model}_{strategy}.csv')
+    # (model names like 'local/qwen:7b-chat' contain a slash)
+    path = os.path.join(folder, f'{model.replace("/", "-")}_{strategy}.csv')
     return path
+
+
+def parse_evaluation_file_path(path: str, strategies: Iterable[str]) -> dict | None:
+    """
+    Parse the path of an evaluation file, the inverse of `get_evaluation_file_path`
+
+    :param path: path of the evaluation file
+    :param strategies: names of the strategies, with their variants (e.g. 'self_consistency_5') after an underscore
+    :return: 'count', 'number_of_events', 'number_of_operators', 'model' and 'strategy' of the evaluation, None if
+        the path is not an evaluation file
+    """
+    folder, file = os.path.split(path)
+    cell = re.fullmatch(r'(\d+)_(\d+)_events_(\d+)_formula_len', os.path.basename(folder))
+    names = '|'.join(re.escape(strategy) for strategy in strategies)
+    name = re.fullmatch(rf'(.+?)_((?:{names})(?:_\w+)?)\.csv', file)
+    if cell is None or name is None:
+        return None
+    count, event_n, formula_n = map(int, cell.groups())
+    return {'count': count, 'number_of_events': event_n, 'number_of_operators': formula_n,
+            'model': name.group(1), 'strategy': name.group(2)}
@@ -1,6 +1,18 @@
+import glob
+import os
+import warnings
+from typing import Dict, Iterable
+
+import numpy as np
 import pandas as pd
 from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_score, roc_auc_score
 
+from src.utils.file import parse_evaluation_file_path
+
+# how unanswered problems (prediction -1) count: as a False prediction (as in the analysis notebook), as a wrong
+# prediction, or not at all
+UNANSWERED = ('false', 'wrong', 'drop')
+
 
 def metrics(data: pd.DataFrame) -> dict:
     """
@@ -34,3 +46,134 @@ def metrics(data: pd.DataFrame) -> dict:
             'auc': f'{auc_raw:.2f}'
         }
     }
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # (0 where the denominator is 0, as `zero_division=0`)
+    return np.divide(numerator, denominator, out=np.zeros(np.shape(numerator)), where=denominator > 0)
+
+
+def _confusion_metrics(counts: np.ndarray) -> Dict[str, np.ndarray]:
+    # the metrics of confusion matrices, the last axis of `counts` being ('tn', 'fp', 'fn', 'tp')
+    tn, fp, fn, tp = np.moveaxis(counts, -1, 0)
+    n = counts.sum(axis=-1)
+    # per class, (negative, positive); the macro average is over the classes among the answers or predictions
+    precision = np.stack([_divide(tn, tn + fn), _divide(tp, tp + fp)])
+    recall = np.stack([_divide(tn, tn + fp), _divide(tp, tp + fn)])
+    f1 = np.stack([_divide(2 * tn, 2 * tn + fn + fp), _divide(2 * tp, 2 * tp + fp + fn)])
+    present = np.stack([tn + fn + fp > 0, tp + fp + fn > 0])
+    labels = present.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'accuracy': (tp + tn) / n,
+            'precision': (precision * present).sum(axis=0) / labels,
+            'recall': (recall * present).sum(axis=0) / labels,
+            'f1': (f1 * present).sum(axis=0) / labels,
+            # (of binary predictions: the mean of the true positive and true negative rates)
+            'auc': np.where((tp + fn > 0) & (tn + fp > 0), (recall[0] + recall[1]) / 2, np.nan),
+        }
+
+
+def grouped_metrics(answers: np.ndarray, predictions: np.ndarray, groups: np.ndarray, n_groups: int) -> pd.DataFrame:
+    """
+    Calculate the confusion matrix and the accuracy, precision, recall, f1 and auc score (as `metrics`) of many groups
+    of predictions at once
+
+    :param answers: answers, 0 or 1
+    :param predictions: predictions, 0 or 1
+    :param groups: group of every prediction, from 0 to `n_groups` - 1
+    :param n_groups: number of groups
+    :return: DataFrame with one row per group: 'tn', 'fp', 'fn', 'tp' and the metrics, NaN for groups without
+        predictions (and the auc of groups with a single answer)
+    """
+    counts = np.bincount(groups * 4 + answers * 2 + predictions, minlength=n_groups * 4).reshape(n_groups, 4)
+    return pd.DataFrame({**dict(zip(['tn', 'fp', 'fn', 'tp'], counts.T)), **_confusion_metrics(counts)})
+
+
+def bootstrap_metrics(counts: np.ndarray, n_resamples: int = 1000, confidence: float = 0.95,
+                      seed: int = 0) -> pd.DataFrame:
+    """
+    Calculate percentile bootstrap confidence intervals of the metrics of many groups of predictions at once.
+    Resampling the predictions of a group with replacement only changes its confusion matrix, so the confusion
+    matrices of all resamples of all groups are drawn at once from the multinomial distribution of the counts of
+    their group, and their metrics are computed together.
+
+    :param counts: confusion matrices of the groups, one row of 'tn', 'fp', 'fn', 'tp' per group
+    :param n_resamples: number of resamples per group
+    :param confidence: confidence level of the intervals
+    :param seed: seed of the resampling
+    :return: DataFrame with one row per group: '<metric>_low' and '<metric>_high' for the metrics of
+        `grouped_metrics`, NaN for groups without predictions
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    n = counts.sum(axis=1)
+    rng = np.random.default_rng(seed)
+    # (resamples, groups, 4)
+    resamples = rng.multinomial(n, counts / np.maximum(n, 1)[:, None], size=(n_resamples, len(counts)))
+    percentiles = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    intervals = {}
+    with warnings.catch_warnings():
+        # (groups without predictions, and the auc of resamples with a single answer, are NaN)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for name, values in _confusion_metrics(resamples).items():
+            intervals[f'{name}_low'], intervals[f'{name}_high'] = np.nanpercentile(values, percentiles, axis=0)
+    return pd.DataFrame(intervals)
+
+
+def aggregate_evaluations(paths: Iterable[str], strategies: Iterable[str], unanswered: str = 'false',
+                          bootstrap: int = 0, confidence: float = 0.95) -> pd.DataFrame:
+    """
+    Calculate the metrics of every evaluation file (every dataset, model and strategy) at once, reading only their
+    answers and predictions. Pending problems (no prediction yet) are not counted.
+
+    :param paths: evaluation files, or folders searched recursively for them
+    :param strategies: names of the strategies, to parse the names of the evaluation files
+    :param unanswered: how the unanswered problems count, see `UNANSWERED`
+    :param bootstrap: number of bootstrap resamples of the confidence intervals of the metrics, 0 for none
+    :param confidence: confidence level of the intervals
+    :return: DataFrame with one row per evaluation file: its dataset, model and strategy, the numbers of problems,
+        of 'unanswered' and of 'pending' ones, the confusion matrix and the metrics of `grouped_metrics`, with their
+        intervals of `bootstrap_metrics`
+    """
+    if unanswered not in UNANSWERED:
+        raise ValueError(f'unanswered must be one of {UNANSWERED}, got {unanswered!r}')
+    strategies = list(strategies)
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True))
+        else:
+            files.append(path)
+    rows, answers, predictions = [], [], []
+    for file in files:
+        evaluation = parse_evaluation_file_path(file, strategies)
+        if evaluation is None:
+            continue
+        data = pd.read_csv(file, usecols=['answer', 'prediction'])
+        rows.append(evaluation)
+        answers.append(data['answer'].astype(bool).to_numpy(dtype=np.int64))
+        predictions.append(data['prediction'].to_numpy(dtype=float))
+    if not rows:
+        return pd.DataFrame()
+    groups = np.repeat(np.arange(len(rows)), [len(answer) for answer in answers])
+    answer = np.concatenate(answers)
+    prediction = np.concatenate(predictions)
+    pending = np.isnan(prediction)
+    missing = prediction == -1
+    summary = pd.DataFrame(rows)
+    summary['problems'] = np.bincount(groups, minlength=len(rows))
+    summary['unanswered'] = np.bincount(groups[missing], minlength=len(rows))
+    summary['pending'] = np.bincount(groups[pending], minlength=len(rows))
+    if unanswered == 'false':
+        prediction = np.where(missing, 0, prediction)
+    elif unanswered == 'wrong':
+        prediction = np.where(missing, 1 - answer, prediction)
+    counted = ~pending & (prediction != -1)
+    metrics_of_groups = grouped_metrics(answer[counted], prediction[counted].astype(np.int64), groups[counted],
+                                        len(rows))
+    columns = [summary, metrics_of_groups]
+    if bootstrap:
+        columns.append(bootstrap_metrics(metrics_of_groups[['tn', 'fp', 'fn', 'tp']].to_numpy(), bootstrap,
+                                         confidence))
+    return pd.concat(columns, axis=1).sort_values(
+        ['count', 'number_of_events', 'number_of_operators', 'model', 'strategy'], ignore_index=True)
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase
+
+from src.utils.cache import SqliteLRUCache
+
+
+def _write(args):
+    path, worker = args
+    cache = SqliteLRUCache(path)
+    for i in range(50):
+        cache.put(f'{worker}-{i}', i)
+    cache.close()
+
+
+class TestSqliteLRUCache(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_get_put(self):
+        cache = SqliteLRUCache(self.path)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', True)
+        cache.put('b', {'x': [1, 2]})
+        self.assertEqual(cache.get('a'), True)
+        self.assertEqual(cache.get('b'), {'x': [1, 2]})
+        self.assertEqual(cache.counters(), {'cache_hits': 2, 'cache_misses': 1})
+        cache.close()
+        # persistent
+        self.assertEqual(SqliteLRUCache(self.path).get('a'), True)
+
+    def test_lru_eviction(self):
+        cache = SqliteLRUCache(self.path, max_entries=10)
+        cache.EVICT_EVERY = 1
+        for i in range(10):
+            cache.put(str(i), i)
+        cache.get('0')
+        cache.put('10', 10)
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.get('0'), 0)
+        self.assertIsNone(cache.get('1'))
+
+    def test_concurrent_writers(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(_write, [(self.path, worker) for worker in range(4)]))
+        self.assertEqual(len(SqliteLRUCache(self.path)), 200)
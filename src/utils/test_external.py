@@ -1,6 +1,35 @@
+import os
+import tempfile
+import threading
 from unittest import TestCase
+from unittest.mock import patch
 
-from src.utils.external import call_nusmv
+from src.utils import external
+from src.utils.external import call_nusmv, check_many, split_specs, verdict_key, get_verdict_cache, NuSMVPool
+
+
+class FakeWorker:
+    """
+    A stand-in for `NuSMVWorker` whose checks of the model 'fail' raise once `fail` is set
+    """
+    checking = threading.Event()
+    fail = threading.Event()
+
+    def __init__(self):
+        self.closed = False
+
+    def alive(self) -> bool:
+        return not self.closed
+
+    def check_many(self, code: str, specs: list[str]) -> list[bool]:
+        if code == "fail":
+            FakeWorker.checking.set()
+            FakeWorker.fail.wait(5)
+            raise RuntimeError("interrupted")
+        return [True] * len(specs)
+
+    def close(self):
+        self.closed = True
 
 
 class Test(TestCase):
@@ -41,3 +70,70 @@ LTLSPEC state = event3
         """
         output = call_nusmv(code)
         self.assertFalse(output)
+
+    def test_check_many(self):
+        code = """
+MODULE main
+VAR
+    state : {event1, event2};
+ASSIGN
+    init(state) := event1;
+    next(state) := case
+        state = event1 : event2;
+		state = event2 : event2;
+    esac;
+"""
+        output = check_many(code, ["(X (state=event2))", "LTLSPEC (state=event2)", "(G (F (state=event1)))"])
+        self.assertEqual(output, [True, False, False])
+        # the model is re-read for every call
+        output = check_many(code.replace("init(state) := event1", "init(state) := event2"), ["(state=event2)"])
+        self.assertEqual(output, [True])
+
+    def test_pool_failure(self):
+        with patch("src.utils.external.NuSMVWorker", FakeWorker):
+            pool = NuSMVPool(1)
+            results = []
+            failing = threading.Thread(target=lambda: self.assertRaises(RuntimeError, pool.check_many, "fail", ["a"]),
+                                       daemon=True)
+            failing.start()
+            FakeWorker.checking.wait(5)
+            # waits for the only worker, which fails
+            waiting = threading.Thread(target=lambda: results.append(pool.check_many("model", ["a", "b"])),
+                                       daemon=True)
+            waiting.start()
+            FakeWorker.fail.set()
+            failing.join(5)
+            waiting.join(5)
+            self.assertFalse(waiting.is_alive())
+            self.assertEqual(results, [[True, True]])
+            # the failed worker is replaced, the pool does not shrink
+            self.assertEqual(len(pool._workers), 1)
+            self.assertEqual(pool.check_many("model", ["a"]), [True])
+
+    def test_split_specs(self):
+        model, specs = split_specs("MODULE main\nLTLSPEC (F (state=event1))\nLTLSPEC state = event2\n")
+        self.assertEqual(model, "MODULE main\n")
+        self.assertEqual(specs, ["(F (state=event1))", "state = event2"])
+
+    def test_verdict_key(self):
+        code = "MODULE main\nVAR\n    state : {event1, event2};\nASSIGN\n    init(state) := event1;\n"
+        same = "MODULE main\nVAR\n  state : {event2,event1};\n\nASSIGN\n init(state) := event1;\nLTLSPEC (state=event2)\n"
+        self.assertEqual(verdict_key(code, "(F (state=event1))"), verdict_key(same, "(F  (state=event1) )"))
+        self.assertNotEqual(verdict_key(code, "(F (state=event1))"), verdict_key(code, "(G (state=event1))"))
+
+    def test_check_many_cached(self):
+        code = "MODULE main\nVAR\n    state : {event1, event2};\n"
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        environment = patch.dict(os.environ, {"VERDICT_CACHE_PATH": os.path.join(folder.name, "verdicts.sqlite")})
+        environment.start()
+        self.addCleanup(environment.stop)
+        # (the next tests start without this cache)
+        self.addCleanup(setattr, external, "_CACHE", None)
+        cache = get_verdict_cache()
+        self.addCleanup(cache.close)
+        cache.put(verdict_key(code, "(X (state=event2))"), True)
+        cache.put(verdict_key(code, "(state=event2)"), False)
+        # served from the cache, NuSMV is not called
+        self.assertEqual(check_many(code, ["(X (state=event2))", "LTLSPEC (state=event2)"]), [True, False])
+        self.assertEqual(cache.counters(), {"cache_hits": 2, "cache_misses": 0})
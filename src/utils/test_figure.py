@@ -42,3 +42,19 @@ class Test(TestCase):
 
         # just plot
         plot_lines(df, 'x', 'y', 'mode', title='Test', x_label='X', y_label='Y')
+
+    def test_plot_error_bands(self):
+        df = pd.DataFrame({
+            'number_of_operators': [1, 2, 3, 1, 2, 3],
+            'accuracy': [0.9, 0.8, 0.7, 0.6, 0.6, 0.5],
+            'accuracy_low': [0.85, 0.75, 0.65, 0.55, 0.55, 0.45],
+            'accuracy_high': [0.95, 0.85, 0.75, 0.65, 0.65, 0.55],
+            'model': ['a', 'a', 'a', 'b', 'b', 'b'],
+        })
+        plot_lines(df, as_percentage=True)
+        # (one band per line)
+        self.assertEqual(len(plt.gca().collections), 2)
+        plt.close()
+        plot_lines(df, error_band=False)
+        self.assertEqual(len(plt.gca().collections), 0)
+        plt.close()
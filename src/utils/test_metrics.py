@@ -0,0 +1,102 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from src.utils.file import parse_evaluation_file_path
+from src.utils.metrics import metrics, grouped_metrics, bootstrap_metrics, aggregate_evaluations
+
+STRATEGIES = ['direct', 'zero_shot_cot', 'few_shot_cot', 'self_consistency', 'least_to_most']
+
+
+class Test(TestCase):
+    def test_grouped_metrics(self):
+        rng = np.random.default_rng(0)
+        groups = rng.integers(0, 6, 500)
+        answers = rng.integers(0, 2, 500)
+        predictions = rng.integers(0, 2, 500)
+        # (a group with a single answer, one with a single prediction)
+        answers[groups == 4] = 1
+        predictions[groups == 5] = 0
+        result = grouped_metrics(answers, predictions, groups, 7)
+        for group in [0, 1, 2, 3, 5]:
+            expected = metrics(pd.DataFrame({'answer': answers[groups == group],
+                                             'prediction': predictions[groups == group]}))['raw']
+            for name in ['accuracy', 'precision', 'recall', 'f1', 'auc']:
+                self.assertAlmostEqual(result.at[group, name], expected[name])
+        # (roc_auc_score fails on a single answer)
+        self.assertTrue(np.isnan(result.at[4, 'auc']))
+        self.assertEqual(result.loc[0, ['tn', 'fp', 'fn', 'tp']].sum(), (groups == 0).sum())
+        # (no predictions)
+        self.assertTrue(np.isnan(result.at[6, 'accuracy']))
+
+    def test_bootstrap_metrics(self):
+        rng = np.random.default_rng(0)
+        answers = rng.integers(0, 2, 300)
+        predictions = np.where(rng.random(300) < 0.8, answers, 1 - answers)
+        counts = np.array([[len(answers) - answers.sum(), 0, 0, answers.sum()],
+                           grouped_metrics(answers, predictions, np.zeros(300, dtype=int), 1).loc[
+                               0, ['tn', 'fp', 'fn', 'tp']].tolist(),
+                           [0, 0, 0, 0]])
+        intervals = bootstrap_metrics(counts, 2000)
+        # (perfect predictions have no variance)
+        self.assertEqual(intervals.loc[0].tolist(), [1.0] * 10)
+        # the interval of the accuracy of 300 predictions is about 2 standard errors wide on each side
+        accuracy = (answers == predictions).mean()
+        error = np.sqrt(accuracy * (1 - accuracy) / 300)
+        self.assertAlmostEqual(intervals.at[1, 'accuracy_low'], accuracy - 1.96 * error, delta=0.01)
+        self.assertAlmostEqual(intervals.at[1, 'accuracy_high'], accuracy + 1.96 * error, delta=0.01)
+        self.assertLess(intervals.at[1, 'f1_low'], intervals.at[1, 'f1_high'])
+        self.assertTrue(intervals.loc[2].isna().all())
+        # (reproducible)
+        pd.testing.assert_frame_equal(intervals, bootstrap_metrics(counts, 2000))
+
+    def test_parse_evaluation_file_path(self):
+        for model, strategy in [('gpt-4o-mini', 'direct'), ('local/qwen3:8b', 'self_consistency_5'),
+                                ('deepseek-chat', 'least_to_most_early_stop')]:
+            path = os.path.join('results', 'evaluation', '300_2_events_3_formula_len',
+                                f'{model.replace("/", "-")}_{strategy}.csv')
+            self.assertEqual(parse_evaluation_file_path(path, STRATEGIES),
+                             {'count': 300, 'number_of_events': 2, 'number_of_operators': 3,
+                              'model': model.replace('/', '-'), 'strategy': strategy})
+        self.assertIsNone(parse_evaluation_file_path('results/data/300_2_events_3_formula_len.csv', STRATEGIES))
+
+    def test_aggregate_evaluations(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = {
+                'gpt-4o-mini_direct.csv': ([True, True, False, False], [1, 0, -1, 1]),
+                'gpt-4o-mini_zero_shot_cot.csv': ([True, False, False], [1, -1, None]),
+            }
+            os.makedirs(os.path.join(folder, '4_2_events_1_formula_len'))
+            for file, (answer, prediction) in files.items():
+                pd.DataFrame({'question': 'q', 'answer': answer, 'prediction': prediction}).to_csv(
+                    os.path.join(folder, '4_2_events_1_formula_len', file), index=False)
+            # (not an evaluation file)
+            pd.DataFrame({'a': [1]}).to_csv(os.path.join(folder, 'other.csv'), index=False)
+
+            summary = aggregate_evaluations([folder], STRATEGIES)
+            self.assertEqual(list(summary['strategy']), ['direct', 'zero_shot_cot'])
+            self.assertEqual(list(summary['problems']), [4, 3])
+            self.assertEqual(list(summary['unanswered']), [1, 1])
+            self.assertEqual(list(summary['pending']), [0, 1])
+            # unanswered as False: predictions 1, 0, 0, 1
+            self.assertEqual(summary.loc[0, ['tn', 'fp', 'fn', 'tp']].tolist(), [1, 1, 1, 1])
+            self.assertAlmostEqual(summary.at[0, 'accuracy'], 0.5)
+            self.assertAlmostEqual(summary.at[1, 'accuracy'], 1.0)
+
+            wrong = aggregate_evaluations([folder], STRATEGIES, 'wrong')
+            self.assertEqual(wrong.loc[0, ['tn', 'fp', 'fn', 'tp']].tolist(), [0, 2, 1, 1])
+            self.assertAlmostEqual(wrong.at[1, 'accuracy'], 0.5)
+
+            drop = aggregate_evaluations([folder], STRATEGIES, 'drop')
+            self.assertEqual(drop.loc[0, ['tn', 'fp', 'fn', 'tp']].tolist(), [0, 1, 1, 1])
+            self.assertTrue(np.isnan(drop.at[1, 'auc']))
+
+            intervals = aggregate_evaluations([folder], STRATEGIES, bootstrap=100)
+            self.assertTrue((intervals['accuracy_low'] <= intervals['accuracy']).all())
+            self.assertTrue((intervals['accuracy'] <= intervals['accuracy_high']).all())
+
+            with self.assertRaises(ValueError):
+                aggregate_evaluations([folder], STRATEGIES, 'ignore')